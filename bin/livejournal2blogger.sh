@@ -6,6 +6,14 @@
 # REQUIRES: Python installed and executable in the PATH list
 #
 # USAGE:    livejournal2blogger.sh -u <username> -p <password> [-s <server>]
+#                                [-c <concurrency>] [-n <connections>]
+#                                [-k <checkpoint file>] [-d <sync state file>]
+#                                [-r <record dir> | -R <replay dir>]
+#           livejournal2blogger.sh -m <manifest> -o <output dir>
+#                                [-a <accounts at once>]
+#                                [-l <requests per server>]
+#                                [-c <concurrency>] [-n <connections>]
+#                                [-r <record dir> | -R <replay dir>]
 #
 # AUTHOR:   JJ Lueck (jlueck@gmail.com)
 
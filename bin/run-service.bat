@@ -0,0 +1,13 @@
+@echo OFF
+:: FILE:     run-service.bat
+:: PURPOSE:  Batch script for serving all of the converters from one
+::           standalone web server
+:: REQUIRES: Python installed and executable in the PATH list
+::
+:: USAGE:    run-service.bat [-p <port>] [-j <job dir> [-w <workers>]]
+::
+:: AUTHOR:   JJ Lueck (jlueck@gmail.com)
+
+set BASEPATH=%~p0..
+set PYTHONPATH=%PYTHONPATH%;%BASEPATH%\lib
+python "%BASEPATH%\src\converterservice\service.py" %1 %2 %3 %4 %5 %6
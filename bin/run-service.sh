@@ -0,0 +1,13 @@
+#!/bin/sh
+
+# FILE:     run-service.sh
+# PURPOSE:  Shell script for serving all of the converters from one
+#           standalone web server
+# REQUIRES: Python installed and executable in the PATH list
+#
+# USAGE:    run-service.sh [-p <port>] [-j <job dir> [-w <workers>]]
+#
+# AUTHOR:   JJ Lueck (jlueck@gmail.com)
+
+PROJ_DIR=`dirname $0`/..
+PYTHONPATH=${PROJ_DIR}/lib python ${PROJ_DIR}/src/converterservice/service.py $*
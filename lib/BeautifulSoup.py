@@ -84,6 +84,7 @@ __copyright__ = "Copyright (c) 2004-2008 Leonard Richardson"
 __license__ = "New-style BSD"
 
 from sgmllib import SGMLParser, SGMLParseError
+import bisect
 import codecs
 import types
 import re
@@ -100,7 +101,7 @@ DEFAULT_OUTPUT_ENCODING = "utf-8"
 
 # First, the classes that represent markup elements.
 
-class PageElement:
+class PageElement(object):
     """Contains the navigational information for some part of the page
     (either a tag or a piece of text)"""
 
@@ -132,7 +133,12 @@ class PageElement:
 
     def extract(self):
         """Destructively rips this element out of the tree."""
+        tagIndex = getattr(self, 'tagIndex', None)
+        if tagIndex:
+            tagIndex.remove(self)
+
         if self.parent:
+            self.parent.clearRenderCache()
             try:
                 self.parent.contents.remove(self)
             except ValueError:
@@ -225,6 +231,12 @@ class PageElement:
         if newChildsLastElement.next:
             newChildsLastElement.next.previous = newChildsLastElement
         self.contents.insert(position, newChild)
+        self.clearRenderCache()
+
+        # Tags grafted into an indexed tree have no place in its
+        # index yet; have it rebuilt the next time it is used.
+        if self.tagIndex and isinstance(newChild, Tag):
+            self.tagIndex.invalidate()
 
     def append(self, tag):
         """Appends the given tag to the contents of this tag."""
@@ -432,6 +444,15 @@ class Declaration(NavigableString):
     def __str__(self, encoding=DEFAULT_OUTPUT_ENCODING):
         return "<!%s>" % NavigableString.__str__(self, encoding)
 
+class CompactNavigableString(NavigableString):
+    """A NavigableString that keeps its navigational information in
+    slots, so that no per-instance dictionary is ever allocated for
+    it. Created instead of NavigableString by parsers given
+    compactNodes=True."""
+
+    __slots__ = ('parent', 'previous', 'next', 'previousSibling',
+                 'nextSibling')
+
 class Tag(PageElement):
 
     """Represents a found HTML tag with its attributes and contents."""
@@ -492,6 +513,10 @@ class Tag(PageElement):
         self.setup(parent, previous)
         self.hidden = False
         self.containsSubstitutions = False
+        self.tagIndex = None
+        self.indexPosition = None
+        self.indexEnd = None
+        self.renderCache = None
         self.convertHTMLEntities = parser.convertHTMLEntities
         self.convertXMLEntities = parser.convertXMLEntities
         self.escapeUnrecognizedEntities = parser.escapeUnrecognizedEntities
@@ -545,6 +570,7 @@ class Tag(PageElement):
         if not found:
             self.attrs.append((key, value))
         self._getAttrMap()[key] = value
+        self.clearRenderCache()
 
     def __delitem__(self, key):
         "Deleting tag[key] deletes all 'key' attributes for the tag."
@@ -556,6 +582,7 @@ class Tag(PageElement):
             self._getAttrMap()
             if self.attrMap.has_key(key):
                 del self.attrMap[key]
+        self.clearRenderCache()
 
     def __call__(self, *args, **kwargs):
         """Calling a tag like a function is the same as calling its
@@ -610,10 +637,40 @@ class Tag(PageElement):
         """Returns a string or Unicode representation of this tag and
         its contents. To get Unicode, pass None for encoding.
 
+        The tree is walked without recursion, so deeply nested
+        documents render fine. The plain (not pretty-printed) result
+        is kept, and returned again until this tag or something
+        beneath it is changed through insert(), extract(),
+        replaceWith() or by setting or deleting an attribute. If you
+        change a tag's name, attrs or contents directly, call
+        clearRenderCache() on it. Only a repeated rendering of an
+        unchanged tree, or of a tag within it, is spared the walk;
+        the first rendering does all of the work.
+
         NOTE: since Python's HTML parser consumes whitespace, this
         method is not certain to reproduce the whitespace present in
         the original string."""
+        if not prettyPrint and self.renderCache \
+               and self.renderCache[0] == encoding:
+            return self.renderCache[1]
+        s = []
+        self._render(s, [(self, indentLevel)], encoding, prettyPrint)
+        s = ''.join(s)
+        if not prettyPrint:
+            self.renderCache = (encoding, s)
+        return s
 
+    def clearRenderCache(self):
+        """Discards the kept renderings of this element and of every
+        tag that contains it."""
+        element = self
+        while element is not None:
+            if isinstance(element, Tag):
+                element.renderCache = None
+            element = element.parent
+
+    def _renderStartTag(self, encoding):
+        """Returns the opening and closing markup for this tag."""
         encodedName = self.toEncoding(self.name, encoding)
 
         attrs = []
@@ -649,8 +706,11 @@ class Tag(PageElement):
                     # Now we're okay w/r/t quotes. But the attribute
                     # value might also contain angle brackets, or
                     # ampersands that aren't part of entities. We need
-                    # to escape those to XML entities too.
-                    val = self.BARE_AMPERSAND_OR_BRACKET.sub(self._sub_entity, val)
+                    # to escape those to XML entities too. Most values
+                    # contain none of them, so don't bother the regex.
+                    if '&' in val or '<' in val or '>' in val:
+                        val = self.BARE_AMPERSAND_OR_BRACKET.sub(
+                            self._sub_entity, val)
 
                 attrs.append(fmt % (self.toEncoding(key, encoding),
                                     self.toEncoding(val, encoding)))
@@ -661,34 +721,72 @@ class Tag(PageElement):
         else:
             closeTag = '</%s>' % encodedName
 
-        indentTag, indentContents = 0, 0
-        if prettyPrint:
-            indentTag = indentLevel
-            space = (' ' * (indentTag-1))
-            indentContents = indentTag + 1
-        contents = self.renderContents(encoding, prettyPrint, indentContents)
-        if self.hidden:
-            s = contents
-        else:
-            s = []
-            attributeString = ''
-            if attrs:
-                attributeString = ' ' + ' '.join(attrs)
-            if prettyPrint:
-                s.append(space)
-            s.append('<%s%s%s>' % (encodedName, attributeString, close))
+        attributeString = ''
+        if attrs:
+            attributeString = ' ' + ' '.join(attrs)
+        return '<%s%s%s>' % (encodedName, attributeString, close), closeTag
+
+    def _render(self, s, stack, encoding, prettyPrint):
+        """Renders the elements on the given stack into the list s.
+
+        Each entry on the stack is an (element, indentLevel) pair and
+        the last one is rendered first. Rendering a tag pushes an
+        entry for its closing markup, (None, tag, closeTag, space,
+        start), followed by entries for its contents, instead of
+        recursing into them."""
+        while stack:
+            entry = stack.pop()
+            if len(entry) > 2:
+                # Everything inside the tag has been rendered; close it.
+                tag, closeTag, space, start = entry[1:]
+                if prettyPrint:
+                    for i in range(len(s)-1, start-1, -1):
+                        if s[i]:
+                            if s[i][-1] != "\n":
+                                s.append("\n")
+                            break
+                    if closeTag:
+                        s.append(space)
+                s.append(closeTag)
+                if prettyPrint and closeTag and tag.nextSibling:
+                    s.append("\n")
+                continue
+
+            element, indentLevel = entry
+            if isinstance(element, NavigableString):
+                text = element.__str__(encoding)
+                if text and prettyPrint:
+                    text = text.strip()
+                if text:
+                    if prettyPrint:
+                        s.append(" " * (indentLevel-1))
+                    s.append(text)
+                    if prettyPrint:
+                        s.append("\n")
+                continue
+            elif not isinstance(element, Tag):
+                continue
+
+            if not prettyPrint and element.renderCache \
+                   and element.renderCache[0] == encoding:
+                s.append(element.renderCache[1])
+                continue
+
+            space = ''
+            indentContents = 0
             if prettyPrint:
-                s.append("\n")
-            s.append(contents)
-            if prettyPrint and contents and contents[-1] != "\n":
-                s.append("\n")
-            if prettyPrint and closeTag:
-                s.append(space)
-            s.append(closeTag)
-            if prettyPrint and closeTag and self.nextSibling:
-                s.append("\n")
-            s = ''.join(s)
-        return s
+                space = ' ' * (indentLevel-1)
+                indentContents = indentLevel + 1
+            if not element.hidden:
+                startTag, closeTag = element._renderStartTag(encoding)
+                if prettyPrint:
+                    s.append(space)
+                s.append(startTag)
+                if prettyPrint:
+                    s.append("\n")
+                stack.append((None, element, closeTag, space, len(s)))
+            for i in range(len(element.contents)-1, -1, -1):
+                stack.append((element.contents[i], indentContents))
 
     def decompose(self):
         """Recursively destroys the contents of this tree."""
@@ -707,21 +805,11 @@ class Tag(PageElement):
                        prettyPrint=False, indentLevel=0):
         """Renders the contents of this tag as a string in the given
         encoding. If encoding is None, returns a Unicode string.."""
-        s=[]
-        for c in self:
-            text = None
-            if isinstance(c, NavigableString):
-                text = c.__str__(encoding)
-            elif isinstance(c, Tag):
-                s.append(c.__str__(encoding, prettyPrint, indentLevel))
-            if text and prettyPrint:
-                text = text.strip()
-            if text:
-                if prettyPrint:
-                    s.append(" " * (indentLevel-1))
-                s.append(text)
-                if prettyPrint:
-                    s.append("\n")
+        s = []
+        stack = []
+        for i in range(len(self.contents)-1, -1, -1):
+            stack.append((self.contents[i], indentLevel))
+        self._render(s, stack, encoding, prettyPrint)
         return ''.join(s)
 
     #Soup methods
@@ -747,7 +835,13 @@ class Tag(PageElement):
         string, a list of strings, a regular expression object, or a
         callable that takes a string and returns whether or not the
         string matches for some custom definition of 'matches'. The
-        same is true of the tag name."""
+        same is true of the tag name.
+
+        If this tag belongs to a document parsed with indexTags=True,
+        a recursive search by a plain tag name is answered from the
+        document's tag index instead of walking every descendant."""
+        if self.tagIndex and recursive and text == None and isString(name):
+            return self.tagIndex.findAll(self, name, attrs, limit, **kwargs)
         generator = self.recursiveChildGenerator
         if not recursive:
             generator = self.childGenerator
@@ -796,6 +890,22 @@ class Tag(PageElement):
                         break
         raise StopIteration
 
+class CompactTag(Tag):
+    """A Tag that keeps everything the parser and the navigation code
+    set on it in slots, so that no per-instance dictionary is ever
+    allocated for it. Created instead of Tag by parsers given
+    compactNodes=True.
+
+    Setting an attribute that isn't listed below still works, but
+    allocates the dictionary and gives up the savings for that tag."""
+
+    __slots__ = ('parserClass', 'isSelfClosing', 'name', 'attrs',
+                 'attrMap', 'contents', 'string', 'parent', 'previous',
+                 'next', 'previousSibling', 'nextSibling', 'hidden',
+                 'containsSubstitutions', 'tagIndex', 'indexPosition',
+                 'indexEnd', 'renderCache', 'convertHTMLEntities',
+                 'convertXMLEntities', 'escapeUnrecognizedEntities')
+
 # Next, a couple classes to represent queries and their results.
 class SoupStrainer:
     """Encapsulates a number of ways of matching a markup element (tag or
@@ -923,6 +1033,92 @@ class ResultSet(list):
         list.__init__([])
         self.source = source
 
+class TagIndex:
+    """Maps tag names to the Tags of one document, in document order,
+    so that a search by tag name costs time proportional to the
+    number of tags with that name rather than the size of the tree.
+
+    Each indexed Tag knows its position in the document and the
+    position just past its last descendant, so the tags beneath any
+    Tag are one contiguous slice of the entries for a name."""
+
+    def __init__(self, root):
+        self.root = root
+        self.reset()
+
+    def reset(self):
+        self.entries = {}
+        self.count = 0
+        self.stale = False
+        self.root.tagIndex = self
+        self.root.indexPosition = -1
+        self.root.indexEnd = None
+
+    def add(self, tag):
+        """Records a Tag that was just created, in document order."""
+        tag.tagIndex = self
+        tag.indexPosition = self.count
+        self.count = self.count + 1
+        self.entries.setdefault(tag.name, []).append((tag.indexPosition, tag))
+
+    def close(self, tag):
+        """Records that every descendant of the given Tag is known."""
+        tag.indexEnd = self.count
+
+    def remove(self, element):
+        """Forgets the given element and everything beneath it."""
+        if not isinstance(element, Tag) or element is self.root:
+            return
+        tags = filter(self._isTag, element.recursiveChildGenerator())
+        for tag in [element] + tags:
+            if not self.stale:
+                entries = self.entries.get(tag.name, [])
+                i = bisect.bisect_left(entries, (tag.indexPosition,))
+                if i < len(entries) and entries[i][1] is tag:
+                    del entries[i]
+            tag.tagIndex = None
+            tag.indexPosition = tag.indexEnd = None
+
+    def invalidate(self):
+        self.stale = True
+
+    def rebuild(self):
+        """Renumbers the whole document after new tags were inserted."""
+        tags = filter(self._isTag, self.root.recursiveChildGenerator())
+        self.reset()
+        for tag in tags:
+            self.add(tag)
+        for i in range(len(tags)-1, -1, -1):
+            tag = tags[i]
+            tag.indexEnd = tag.indexPosition + 1
+            for j in range(len(tag.contents)-1, -1, -1):
+                if isinstance(tag.contents[j], Tag):
+                    tag.indexEnd = tag.contents[j].indexEnd
+                    break
+
+    def findAll(self, tag, name, attrs, limit, **kwargs):
+        """Returns the Tags beneath the given Tag with the given name
+        that also match the given attributes."""
+        if self.stale:
+            self.rebuild()
+        strainer = SoupStrainer(name, attrs, None, **kwargs)
+        results = ResultSet(strainer)
+        entries = self.entries.get(name, [])
+        start = bisect.bisect_left(entries, (tag.indexPosition + 1,))
+        end = len(entries)
+        if tag.indexEnd != None:
+            end = bisect.bisect_left(entries, (tag.indexEnd,))
+        for i in range(start, end):
+            found = strainer.search(entries[i][1])
+            if found:
+                results.append(found)
+                if limit and len(results) >= limit:
+                    break
+        return results
+
+    def _isTag(self, element):
+        return isinstance(element, Tag)
+
 # Now, some helper functions.
 
 def isList(l):
@@ -1005,7 +1201,8 @@ class BeautifulStoneSoup(Tag, SGMLParser):
 
     def __init__(self, markup="", parseOnlyThese=None, fromEncoding=None,
                  markupMassage=True, smartQuotesTo=XML_ENTITIES,
-                 convertEntities=None, selfClosingTags=None):
+                 convertEntities=None, selfClosingTags=None,
+                 indexTags=False, compactNodes=False):
         """The Soup object is initialized as the 'root tag', and the
         provided markup (which can be a string or a file-like object)
         is fed into the underlying parser.
@@ -1029,8 +1226,20 @@ class BeautifulStoneSoup(Tag, SGMLParser):
 
         You can pass in a custom list of (RE object, replace method)
         tuples to get Beautiful Soup to scrub your input the way you
-        want."""
+        want.
+
+        If you pass in True for indexTags, the soup keeps an index of
+        its tags by name while parsing, and findAll()/find() by tag
+        name no longer has to walk the entire tree. The index is kept
+        up to date as elements are extracted or replaced.
+
+        If you pass in True for compactNodes, the tree is built out of
+        CompactTag and CompactNavigableString objects, which store
+        their attributes in slots instead of a dictionary. They behave
+        like Tag and NavigableString but use much less memory."""
 
+        self.indexTags = indexTags
+        self.compactNodes = compactNodes
         self.parseOnlyThese = parseOnlyThese
         self.fromEncoding = fromEncoding
         self.smartQuotesTo = smartQuotesTo
@@ -1136,6 +1345,8 @@ class BeautifulStoneSoup(Tag, SGMLParser):
     def reset(self):
         Tag.__init__(self, self, self.ROOT_TAG_NAME)
         self.hidden = 1
+        if self.indexTags:
+            TagIndex(self)
         SGMLParser.reset(self)
         self.currentData = []
         self.currentTag = None
@@ -1145,6 +1356,8 @@ class BeautifulStoneSoup(Tag, SGMLParser):
 
     def popTag(self):
         tag = self.tagStack.pop()
+        if self.tagIndex:
+            self.tagIndex.close(tag)
         # Tags with just one string-owning child get the child as a
         # 'string' property, so that soup.tag.string is shorthand for
         # soup.tag.contents[0]
@@ -1173,6 +1386,8 @@ class BeautifulStoneSoup(Tag, SGMLParser):
                 else:
                     currentData = ' '
             self.currentData = []
+            if self.compactNodes and containerClass is NavigableString:
+                containerClass = CompactNavigableString
             if self.parseOnlyThese and len(self.tagStack) <= 1 and \
                    (not self.parseOnlyThese.text or \
                     not self.parseOnlyThese.search(currentData)):
@@ -1270,7 +1485,12 @@ class BeautifulStoneSoup(Tag, SGMLParser):
                and (self.parseOnlyThese.text or not self.parseOnlyThese.searchTag(name, attrs)):
             return
 
-        tag = Tag(self, name, attrs, self.currentTag, self.previous)
+        tagClass = Tag
+        if self.compactNodes:
+            tagClass = CompactTag
+        tag = tagClass(self, name, attrs, self.currentTag, self.previous)
+        if self.tagIndex:
+            self.tagIndex.add(tag)
         if self.previous:
             self.previous.next = tag
         self.previous = tag
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+# Copyright 2008 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import unittest
+
+import BeautifulSoup
+
+DOCUMENT = ('<div id="d1"><p id="p1"><b id="b1">1</b><i><b id="b2">2</b></i>'
+            '</p><p id="p2"><b id="b3">3</b></p></div>'
+            '<div id="d2"><b id="b4">4</b><p id="p3"><b id="b5">5</b></p>'
+            '</div><b id="b6">6</b>')
+NAMES = ['b', 'p', 'i', 'div']
+
+class TestTagIndex(unittest.TestCase):
+
+  def setUp(self):
+    self.indexed = BeautifulSoup.BeautifulSoup(DOCUMENT, indexTags=True)
+    self.plain = BeautifulSoup.BeautifulSoup(DOCUMENT)
+
+  def assertSameResults(self):
+    """Asserts that every search by name from every tag finds the same tags
+    in the indexed document as in the plain one.
+    """
+    # Searches for any tag walk the tree rather than use the index
+    indexed_tags = [self.indexed] + self.indexed.findAll(True)
+    plain_tags = [self.plain] + self.plain.findAll(True)
+    self.assertEquals(map(str, plain_tags), map(str, indexed_tags))
+    for indexed_tag, plain_tag in zip(indexed_tags, plain_tags):
+      for name in NAMES:
+        self.assertEquals(map(str, plain_tag.findAll(name)),
+                          map(str, indexed_tag.findAll(name)))
+        self.assertEquals(str(plain_tag.find(name)),
+                          str(indexed_tag.find(name)))
+
+  def mutate(self, mutation):
+    """Applies a mutation to both documents."""
+    for soup in [self.indexed, self.plain]:
+      mutation(soup)
+
+  def testParsedIndex(self):
+    self.assert_(self.indexed.tagIndex)
+    self.failIf(self.plain.tagIndex)
+    self.assertEquals(['b1', 'b2', 'b3', 'b4', 'b5', 'b6'],
+                      [tag['id'] for tag in self.indexed.findAll('b')])
+    # Only the tags beneath a tag are found from it, even though the ones
+    # after it share its list of tags by name
+    p1 = self.indexed.find(id='p1')
+    self.assertEquals(['b1', 'b2'], [tag['id'] for tag in p1.findAll('b')])
+    self.assertEquals(['b4', 'b5'],
+                      [tag['id'] for tag in
+                       self.indexed.find(id='d2').findAll('b')])
+    self.assertEquals([], self.indexed.find(id='b6').findAll('b'))
+    self.assertEquals(['b3'], [tag['id'] for tag in
+                               self.indexed.findAll('b', id='b3')])
+    self.assertEquals(2, len(self.indexed.findAll('b', limit=2)))
+    self.assertSameResults()
+
+  def testExtract(self):
+    p1 = self.indexed.find(id='p1')
+    self.mutate(lambda soup: soup.find(id='p1').extract())
+    self.assertSameResults()
+    # The extracted tags left the index
+    self.failIf(p1.tagIndex)
+    self.failIf(p1.find('b').tagIndex)
+    self.assertEquals(['b1', 'b2'], [tag['id'] for tag in p1.findAll('b')])
+
+  def testReplaceWith(self):
+    self.mutate(lambda soup: soup.find(id='b4').replaceWith('four'))
+    self.failIf(self.indexed.tagIndex.stale)
+    self.assertSameResults()
+
+    def ReplaceWithTag(soup):
+      soup.find(id='p2').replaceWith(
+          BeautifulSoup.Tag(soup, 'i', [('id', 'i2')]))
+    self.mutate(ReplaceWithTag)
+    self.assert_(self.indexed.tagIndex.stale)
+    self.assertSameResults()
+    self.failIf(self.indexed.tagIndex.stale)
+
+  def testInsert(self):
+    def Insert(soup):
+      fragment = BeautifulSoup.BeautifulSoup(
+          '<p id="p4"><b id="b7">7</b><b id="b8">8</b></p>')
+      soup.find(id='d2').insert(1, fragment.find(id='p4'))
+      soup.find(id='d1').append(BeautifulSoup.Tag(soup, 'b', [('id', 'b9')]))
+    self.mutate(Insert)
+    self.assert_(self.indexed.tagIndex.stale)
+    self.assertSameResults()
+    # The index was rebuilt with the inserted tags in document order
+    self.failIf(self.indexed.tagIndex.stale)
+    self.assertEquals(['b1', 'b2', 'b3', 'b9', 'b4', 'b7', 'b8', 'b5', 'b6'],
+                      [tag['id'] for tag in self.indexed.findAll('b')])
+    self.assertEquals(['b7', 'b8'],
+                      [tag['id'] for tag in
+                       self.indexed.find(id='p4').findAll('b')])
+
+    # Tags extracted after the rebuild leave the rebuilt index
+    self.mutate(lambda soup: soup.find(id='p4').extract())
+    self.failIf(self.indexed.tagIndex.stale)
+    self.assertSameResults()
+
+
+class TestRender(unittest.TestCase):
+
+  def render(self, *tags):
+    """Renders the given tags, leaving their renderings in their caches."""
+    for tag in tags:
+      str(tag)
+      self.assert_(tag.renderCache)
+
+  def testRenderCache(self):
+    soup = BeautifulSoup.BeautifulStoneSoup('<a><b id="1">x</b><c>y</c></a>')
+    a, b, c = soup.a, soup.b, soup.c
+    self.render(b, c, a, soup)
+    self.assertEquals('<a><b id="1">x</b><c>y</c></a>', str(soup))
+
+    b.extract()
+    self.failIf(soup.renderCache or a.renderCache)
+    self.assertEquals('<a><c>y</c></a>', str(soup))
+    self.assertEquals('<b id="1">x</b>', str(b))
+
+    self.render(c, a, soup)
+    c.insert(0, b)
+    self.assertEquals('<a><c><b id="1">x</b>y</c></a>', str(soup))
+    self.assertEquals('<c><b id="1">x</b>y</c>', str(c))
+
+    self.render(b, c, a, soup)
+    b.replaceWith('z')
+    self.assertEquals('<a><c>zy</c></a>', str(soup))
+
+    self.render(c, a, soup)
+    c['id'] = '2'
+    self.assertEquals('<a><c id="2">zy</c></a>', str(soup))
+    del c['id']
+    self.assertEquals('<a><c>zy</c></a>', str(soup))
+
+    # Direct edits are only seen once the cache is cleared
+    self.render(c, a, soup)
+    c.name = 'd'
+    self.assertEquals('<a><c>zy</c></a>', str(soup))
+    c.clearRenderCache()
+    self.assertEquals('<a><d>zy</d></a>', str(soup))
+
+    # The cached rendering is only reused for the same encoding
+    self.assertEquals(unicode, type(soup.__str__(None)))
+    self.assertEquals(str, type(str(soup)))
+
+  def testDeepNesting(self):
+    depth = sys.getrecursionlimit() * 2
+    markup = (''.join(['<t%d>' % i for i in range(depth)]) + 'x' +
+              ''.join(['</t%d>' % i for i in range(depth - 1, -1, -1)]))
+    soup = BeautifulSoup.BeautifulStoneSoup(markup)
+    self.assertEquals(markup, str(soup))
+    self.assertEquals(markup, soup.renderContents())
+    self.assertEquals(markup, str(soup.find('t0')))
+    # The same indented lines as the recursive rendering gave
+    pretty = (''.join(['%s<t%d>\n' % (' ' * i, i) for i in range(depth)]) +
+              ' ' * depth + 'x\n' +
+              '\n'.join(['%s</t%d>' % (' ' * i, i)
+                         for i in range(depth - 1, -1, -1)]))
+    self.assertEquals(pretty, soup.prettify())
+
+
+if __name__ == '__main__':
+  unittest.main()
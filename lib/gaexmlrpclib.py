@@ -12,6 +12,7 @@
 import sys
 import xmlrpclib
 import logging
+import zlib
 
 from google.appengine.api import urlfetch
 
@@ -19,16 +20,20 @@ class GAEXMLRPCTransport(object):
     """Handles an HTTP transaction to an XML-RPC server."""
 
     def __init__(self):
-        pass
+        # Extra headers sent with each request, such as session cookies
+        self.headers = {}
 
     def request(self, host, handler, request_body, verbose=0):
         result = None
         url = 'http://%s%s' % (host, handler)
+        headers = {'Content-Type': 'text/xml',
+                   'Accept-Encoding': 'gzip, deflate'}
+        headers.update(self.headers)
         try:
             response = urlfetch.fetch(url,
                                       payload=request_body,
                                       method=urlfetch.POST,
-                                      headers={'Content-Type': 'text/xml'})
+                                      headers=headers)
         except:
             msg = 'Failed to fetch %s' % url
             logging.error(msg)
@@ -42,11 +47,36 @@ class GAEXMLRPCTransport(object):
                                           "",
                                           response.headers)
         else:
-            result = self.__parse_response(response.content)
+            result = self.__parse_response(
+                self.__decompress(response.content,
+                                  response.headers.get('Content-Encoding')))
 
         return result
 
+    def __decompress(self, response_body, content_encoding):
+        """Decompresses a gzip or deflate response body.  urlfetch may
+        have done it already, in which case the body is returned as is.
+        """
+        content_encoding = (content_encoding or '').strip().lower()
+        try:
+            if content_encoding in ('gzip', 'x-gzip'):
+                return zlib.decompress(response_body, 16 + zlib.MAX_WBITS)
+            elif content_encoding == 'deflate':
+                try:
+                    return zlib.decompress(response_body)
+                except zlib.error:
+                    return zlib.decompress(response_body, -zlib.MAX_WBITS)
+        except zlib.error:
+            pass
+        return response_body
+
+    def getparser(self):
+        # Like xmlrpclib.Transport, parsers are made by a method that can be
+        # overridden
+        return xmlrpclib.getparser(use_datetime=False)
+
     def __parse_response(self, response_body):
-        p, u = xmlrpclib.getparser(use_datetime=False)
+        p, u = self.getparser()
         p.feed(response_body)
+        p.close()
         return u.close()
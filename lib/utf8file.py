@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+# Copyright 2008 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Reading of export files that are not quite valid UTF-8."""
+
+import codecs
+
+__author__ = 'JJ Lueck (jlueck@gmail.com)'
+
+# The bytes read from the file at a time when reading all of it
+READ_SIZE = 64 * 1024
+
+class Utf8File(object):
+  """Reads a file a chunk at a time, replacing the bytes that are not valid
+  UTF-8 the way doc.decode('utf-8', 'replace') does for a whole string.
+  """
+
+  def __init__(self, infile):
+    self.infile = infile
+    self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    self.pending = ''
+
+  def read(self, size=-1):
+    if size < 0:
+      chunks = []
+      chunk = self.read(READ_SIZE)
+      while chunk:
+        chunks.append(chunk)
+        chunk = self.read(READ_SIZE)
+      return ''.join(chunks)
+    # A chunk ending within a character decodes to nothing on its own, and
+    # a replaced byte grows to three, so more or less than the size read may
+    # be ready
+    while not self.pending:
+      data = self.infile.read(size)
+      self.pending = self.decoder.decode(data, not data).encode('utf-8')
+      if not data:
+        break
+    text = self.pending[:size]
+    self.pending = self.pending[size:]
+    return text
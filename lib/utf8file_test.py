@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+# Copyright 2008 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import StringIO
+import unittest
+
+import utf8file
+
+# Valid text around a stray Latin-1 byte and a truncated character
+DOCUMENT = ('caf\xc3\xa9 ' * 100 + 'na\xefve ' +
+            'r\xc3\xa9sum\xc3\xa9 ' * 100 + '\xe2\x82')
+
+class TestUtf8File(unittest.TestCase):
+
+  def setUp(self):
+    self.expected = DOCUMENT.decode('utf-8', 'replace').encode('utf-8')
+    self.read_size = utf8file.READ_SIZE
+
+  def tearDown(self):
+    utf8file.READ_SIZE = self.read_size
+
+  def testReadChunks(self):
+    for size in [1, 2, 7, len(DOCUMENT)]:
+      infile = utf8file.Utf8File(StringIO.StringIO(DOCUMENT))
+      chunks = []
+      chunk = infile.read(size)
+      while chunk:
+        self.assert_(len(chunk) <= size)
+        chunks.append(chunk)
+        chunk = infile.read(size)
+      self.assertEquals(self.expected, ''.join(chunks))
+
+  def testReadAll(self):
+    # The whole file is read, however many chunks it takes
+    utf8file.READ_SIZE = 10
+    infile = utf8file.Utf8File(StringIO.StringIO(DOCUMENT))
+    self.assertEquals(self.expected, infile.read())
+    self.assertEquals('', infile.read())
+
+    infile = utf8file.Utf8File(StringIO.StringIO(DOCUMENT))
+    start = infile.read(5)
+    self.assertEquals(self.expected, start + infile.read(-1))
+
+
+if __name__ == '__main__':
+  unittest.main()
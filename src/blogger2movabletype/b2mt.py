@@ -17,6 +17,7 @@
 import os.path
 import logging
 import re
+import StringIO
 import sys
 import time
 from xml.sax.saxutils import unescape
@@ -25,6 +26,7 @@ import gdata
 from gdata import atom
 import iso8601
 import movabletype
+import utf8file
 
 __author__ = 'JJ Lueck (jlueck@gmail.com)'
 
@@ -48,16 +50,24 @@ class Blogger2MovableType(object):
     """Constructs a translator for a Blogger export file.
 
     Args:
-      doc: The WXR file as a string
+      doc: The Blogger export file, as a file object or as a string
     """
-
-    # Ensure UTF8 chars get through correctly by ensuring we have a
-    # compliant UTF8 input doc.
-    self.doc = doc.decode('utf-8', 'replace').encode('utf-8')
+    if isinstance(doc, str):
+      doc = StringIO.StringIO(doc)
+    self.doc = doc
 
     # Read the incoming document as a GData Atom feed.
-    self.feed = atom.FeedFromString(self.doc)
+    tree = atom.ElementTree.parse(self._OpenDoc())
+    self.feed = atom._CreateClassFromElementTree(atom.Feed, tree.getroot())
     self.next_id = 1
+    self.num_entries = 0
+
+  def _OpenDoc(self):
+    """Returns the input document from its start, with the bytes that are
+    not valid UTF-8 replaced so that they get through the parser.
+    """
+    self.doc.seek(0)
+    return utf8file.Utf8File(self.doc)
 
   def Translate(self):
     """Performs the actual translation to WordPress WXR export format.
@@ -73,6 +83,7 @@ class Blogger2MovableType(object):
     mt = movabletype.MovableTypeExport()
     
     for entry in self.feed.entry:
+      self.num_entries += 1
 
       # Grab the information about the entry kind
       entry_kind = ""
@@ -185,7 +196,6 @@ if __name__ == '__main__':
     sys.exit(-1)
 
   wp_xml_file = open(sys.argv[1])
-  wp_xml_doc = wp_xml_file.read()
-  translator = Blogger2MovableType(wp_xml_doc)
+  translator = Blogger2MovableType(wp_xml_file)
   print translator.Translate()
   wp_xml_file.close()
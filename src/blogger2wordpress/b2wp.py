@@ -14,17 +14,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import bisect
 import os.path
 import logging
 import re
+import StringIO
 import sys
 import time
+from xml.parsers import expat
 from xml.sax.saxutils import unescape
 
 import BeautifulSoup
 import gdata
 from gdata import atom
 import iso8601
+import utf8file
 import wordpress
 
 __author__ = 'JJ Lueck (jlueck@gmail.com)'
@@ -37,6 +41,7 @@ __author__ = 'JJ Lueck (jlueck@gmail.com)'
 BLOGGER_URL = 'http://www.blogger.com/'
 BLOGGER_NS = 'http://www.blogger.com/atom/ns#'
 KIND_SCHEME = 'http://schemas.google.com/g/2005#kind'
+ATOM_NS = 'http://www.w3.org/2005/Atom'
 
 YOUTUBE_RE = re.compile('http://www.youtube.com/v/([^&]+)&?.*')
 YOUTUBE_FMT = r'[youtube=http://www.youtube.com/watch?v=\1]'
@@ -45,6 +50,138 @@ GOOGLEVIDEO_FMT = r'[googlevideo=\1]'
 DAILYMOTION_RE = re.compile('http://www.dailymotion.com/swf/(.*)')
 DAILYMOTION_FMT = r'[dailymotion id=\1]'
 
+# An ampersand that does not start an entity, which BeautifulSoup escapes in
+# the attribute values it renders
+BARE_AMPERSAND_RE = re.compile('&(?!#\d+;|#x[0-9a-fA-F]+;|\w+;)')
+# The tags that may be found within an object without the full parse of a
+# post possibly closing the object elsewhere
+OBJECT_TAGS = ['object', 'param', 'embed']
+
+# The massage BeautifulSoup applies to markup by default, rewritten so that
+# every substitution keeps the length of the markup and with it the offsets
+# of the tags that follow.
+OFFSET_PRESERVING_MASSAGE = [
+    (re.compile('(<[^<>]*)/>'), lambda x: x.group(1) + ' >'),
+    (re.compile('<!(\s+)([^<>]*)>'),
+     lambda x: '<!' + x.group(2) + x.group(1) + '>')]
+
+
+###########################
+# Video extraction
+###########################
+
+
+class ObjectSoup(BeautifulSoup.BeautifulSoup):
+  """Parses only the <object> subtrees of a post body.
+
+  Everything outside of the object tags (and the <param> and <embed> tags
+  within them) is skipped instead of being built into a tree.  For each
+  object tag, the offsets in the markup where it starts and ends are kept so
+  that it can be replaced in the original text.
+
+  Attributes:
+    misnested: Whether an object holds tags that a parse of the whole body
+        could nest differently, so that the object ends elsewhere.  The
+        offsets of such objects cannot be trusted.
+  """
+
+  def __init__(self, markup):
+    """Parses the given post body, which must be a unicode string."""
+    BeautifulSoup.BeautifulSoup.__init__(
+        self, markup, parseOnlyThese=BeautifulSoup.SoupStrainer('object'),
+        markupMassage=OFFSET_PRESERVING_MASSAGE, indexTags=True)
+    self.source = markup
+
+  def reset(self):
+    BeautifulSoup.BeautifulSoup.reset(self)
+    self.spans = {}
+    self.popped = []
+    self.misnested = False
+    # The offsets of the start tags holding ampersands
+    self.ampersand_starts = []
+    self.ampersand_ends = []
+
+  def GetSpan(self, tag):
+    """Returns the (start, end) offsets of a tag in the markup.
+
+    The end is None if the tag was still open at the end of the markup.
+    """
+    return self.spans[id(tag)]
+
+  def GetMarkup(self, start, end):
+    """Returns the markup between two offsets, as a tree of it would render.
+
+    The text is kept as it was written, except that the bare ampersands in
+    its start tags are escaped, as BeautifulSoup does for attribute values.
+    """
+    pieces = []
+    position = start
+    first = bisect.bisect_left(self.ampersand_starts, start)
+    last = bisect.bisect_right(self.ampersand_ends, end)
+    for i in range(first, last):
+      tag_start = self.ampersand_starts[i]
+      pieces.append(self.source[position:tag_start])
+      pieces.append(BARE_AMPERSAND_RE.sub(
+          '&amp;', self.source[tag_start:self.ampersand_ends[i]]))
+      position = self.ampersand_ends[i]
+    pieces.append(self.source[position:end])
+    return u''.join(pieces)
+
+  def parse_starttag(self, i):
+    self.tag_start = i
+    j = BeautifulSoup.BeautifulSoup.parse_starttag(self, i)
+    if j > i and '&' in self.rawdata[i:j]:
+      self.ampersand_starts.append(i)
+      self.ampersand_ends.append(j)
+    # Tags closed implicitly by this one end where it starts, unless this
+    # is a self-closing tag closing itself.
+    for tag in self.popped:
+      span = self.spans[id(tag)]
+      if span[0] == i:
+        span[1] = j
+      else:
+        span[1] = i
+    self.popped = []
+    return j
+
+  def parse_endtag(self, i):
+    j = BeautifulSoup.BeautifulSoup.parse_endtag(self, i)
+    for tag in self.popped:
+      self.spans[id(tag)][1] = j
+    self.popped = []
+    return j
+
+  def unknown_starttag(self, name, attrs, selfClosing=0):
+    quoting = len(self.quoteStack) > 0
+    # Any other tag within an object may close it in the full parse, as may
+    # a param or embed tag left open outside of the objects
+    in_object = len(self.tagStack) > 1
+    if (in_object and name not in OBJECT_TAGS or
+        not in_object and name in OBJECT_TAGS[1:]):
+      self.misnested = True
+    tag = BeautifulSoup.BeautifulSoup.unknown_starttag(self, name, attrs,
+                                                       selfClosing)
+    if tag:
+      self.spans[id(tag)] = [self.tag_start, None]
+    elif not quoting and name in self.QUOTE_TAGS:
+      # Skipped <script> tags must still hide their contents, which may
+      # hold markup that is only written out by the script.
+      self.quoteStack.append(name)
+      self.literal = 1
+    return tag
+
+  def unknown_endtag(self, name):
+    # An end tag within an object for a tag that is not open within it may
+    # close a tag outside of the object, and the object along with it
+    if (len(self.tagStack) > 1 and not self.quoteStack and
+        name not in [tag.name for tag in self.tagStack[1:]]):
+      self.misnested = True
+    BeautifulSoup.BeautifulSoup.unknown_endtag(self, name)
+
+  def popTag(self):
+    self.popped.append(self.tagStack[-1])
+    return BeautifulSoup.BeautifulSoup.popTag(self)
+
 
 ###########################
 # Translation class
@@ -58,16 +195,24 @@ class Blogger2Wordpress(object):
     """Constructs a translator for a Blogger export file.
 
     Args:
-      doc: The WXR file as a string
+      doc: The Blogger export file, as a file object or as a string
     """
-
-    # Ensure UTF8 chars get through correctly by ensuring we have a
-    # compliant UTF8 input doc.
-    self.doc = doc.decode('utf-8', 'replace').encode('utf-8')
+    if isinstance(doc, str):
+      doc = StringIO.StringIO(doc)
+    self.doc = doc
 
     # Read the incoming document as a GData Atom feed.
-    self.feed = atom.FeedFromString(self.doc)
+    tree = atom.ElementTree.parse(self._OpenDoc())
+    self.feed = atom._CreateClassFromElementTree(atom.Feed, tree.getroot())
     self.next_id = 1
+    self.num_entries = 0
+
+  def _OpenDoc(self):
+    """Returns the input document from its start, with the bytes that are
+    not valid UTF-8 replaced so that they get through the parser.
+    """
+    self.doc.seek(0)
+    return utf8file.Utf8File(self.doc)
 
   def Translate(self):
     """Performs the actual translation to WordPress WXR export format.
@@ -83,7 +228,12 @@ class Blogger2Wordpress(object):
         pubDate = self._ConvertPubDate(self.feed.updated.text))
     posts_map = {}
 
+    # Define every label up front so the importer can create all of the
+    # terms before it reads the posts using them.
+    channel.tags.extend(self._CollectLabels())
+
     for entry in self.feed.entry:
+      self.num_entries += 1
 
       # Grab the information about the entry kind
       entry_kind = ""
@@ -135,6 +285,43 @@ class Blogger2Wordpress(object):
     wxr = wordpress.WordPressWxr(channel=channel)
     return wxr.WriteXml()
 
+  def _CollectLabels(self):
+    """Returns the distinct labels of all posts and pages in the document.
+
+    The document is scanned with a streaming XML parser rather than walking
+    the Atom feed, so only the set of labels is held in memory.  Labels are
+    returned as UTF-8 strings in the order they first appear.
+    """
+    labels = []
+    seen = {}
+    # Labels of the entry being scanned, and that entry's kind
+    entry_labels = []
+    entry_kind = ['']
+
+    def StartElement(name, attrs):
+      if name == ATOM_NS + ' entry':
+        del entry_labels[:]
+        entry_kind[0] = ''
+      elif name == ATOM_NS + ' category':
+        if attrs.get('scheme') == KIND_SCHEME:
+          entry_kind[0] = attrs.get('term', '')
+        elif attrs.get('scheme') == BLOGGER_NS and attrs.get('term'):
+          entry_labels.append(attrs['term'])
+
+    def EndElement(name):
+      if name == ATOM_NS + ' entry' and (entry_kind[0].endswith('#post') or
+                                         entry_kind[0].endswith('#page')):
+        for label in entry_labels:
+          if label not in seen:
+            seen[label] = True
+            labels.append(label.encode('utf-8'))
+
+    parser = expat.ParserCreate(namespace_separator=' ')
+    parser.StartElementHandler = StartElement
+    parser.EndElementHandler = EndElement
+    parser.ParseFile(self._OpenDoc())
+    return labels
+
   def _ConvertEntry(self, entry, is_page):
     """Converts the contents of an Atom entry into a WXR post Item element."""
 
@@ -195,7 +382,8 @@ class Blogger2Wordpress(object):
     changed into the WordPress tags for embedding video,
     e.g. [youtube=http://www.youtube.com/...]
 
-    If no text is provided, the empty string is returned.
+    The rest of the body is passed through as it was written.  If no text is
+    provided, the empty string is returned.
     """
     if not text:
       return ''
@@ -203,32 +391,79 @@ class Blogger2Wordpress(object):
     # First unescape all XML tags as they'll be escaped by the XML emitter
     content = unescape(text)
 
-    # Use an HTML parser on the body to look for video content
-    content_tree = BeautifulSoup.BeautifulSoup(content)
+    # Most posts have no embedded objects, nor ampersands to escape, at all
+    if '<object' not in content.lower() and '&' not in content:
+      return content
+
+    # Only build the object tags into a tree, and splice the video tags that
+    # replace them into the original text.
+    markup = content
+    if isinstance(markup, str):
+      markup = markup.decode('utf-8', 'replace')
+    object_soup = ObjectSoup(markup)
+    if object_soup.misnested:
+      return self._ConvertContentTree(content)
+
+    pieces = []
+    position = 0
+    for obj_tag in object_soup.findAll('object'):
+      start, end = object_soup.GetSpan(obj_tag)
+      if end is None:
+        # The object is never closed, so it is not clear where it should end
+        # in the original text.  Leave it to the full HTML parser.
+        return self._ConvertContentTree(content)
+      if start < position:
+        # Contained in an object that has already been replaced
+        continue
+
+      video = self._GetVideo(obj_tag)
+      if video:
+        pieces.append(object_soup.GetMarkup(position, start))
+        pieces.append(video)
+        position = end
+
+    pieces.append(object_soup.GetMarkup(position, len(markup)))
+    return u''.join(pieces).encode('utf-8')
+
+  def _ConvertContentTree(self, content):
+    """Replaces video content by rewriting a parse tree of the whole body."""
+    # Use an HTML parser on the body to look for video content.  Index the
+    # tags by name so that finding the object and param tags does not walk
+    # the whole post each time, and use the compact node classes to keep
+    # the trees of long posts small.
+    content_tree = BeautifulSoup.BeautifulSoup(content, indexTags=True,
+                                               compactNodes=True)
 
     # Find the object tag
     objs = content_tree.findAll('object')
     for obj_tag in objs:
-      # Find the param tag within which contains the URL to the movie
-      param_tag = obj_tag.find('param', { 'name': 'movie' })
-      if not param_tag:
-        continue
-
-      # Get the video URL
-      video = param_tag.attrMap.get('value', None)
+      video = self._GetVideo(obj_tag)
       if not video:
         continue
 
-      # Convert the video URL if necessary
-      video = YOUTUBE_RE.subn(YOUTUBE_FMT, video)[0]
-      video = GOOGLEVIDEO_RE.subn(GOOGLEVIDEO_FMT, video)[0]
-      video = DAILYMOTION_RE.subn(DAILYMOTION_FMT, video)[0]
-
       # Replace the portion of the contents with the video
       obj_tag.replaceWith(video)
 
     return str(content_tree)
 
+  def _GetVideo(self, obj_tag):
+    """Returns the WordPress video tag for an <object> tag, or None."""
+    # Find the param tag within which contains the URL to the movie
+    param_tag = obj_tag.find('param', { 'name': 'movie' })
+    if not param_tag:
+      return None
+
+    # Get the video URL
+    video = param_tag.attrMap.get('value', None)
+    if not video:
+      return None
+
+    # Convert the video URL if necessary
+    video = YOUTUBE_RE.subn(YOUTUBE_FMT, video)[0]
+    video = GOOGLEVIDEO_RE.subn(GOOGLEVIDEO_FMT, video)[0]
+    video = DAILYMOTION_RE.subn(DAILYMOTION_FMT, video)[0]
+    return video
+
   def _ConvertPubDate(self, date):
     """Translates to a pubDate element's time/date format."""
     date_tuple = iso8601.parse_date(date)
@@ -265,7 +500,6 @@ if __name__ == '__main__':
     sys.exit(-1)
 
   wp_xml_file = open(sys.argv[1])
-  wp_xml_doc = wp_xml_file.read()
-  translator = Blogger2Wordpress(wp_xml_doc)
+  translator = Blogger2Wordpress(wp_xml_file)
   print translator.Translate()
   wp_xml_file.close()
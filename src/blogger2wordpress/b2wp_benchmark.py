@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+# Copyright 2008 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures how BeautifulSoup options affect the parsing done by b2wp.
+
+Every post and comment body of the given Blogger export files (by default,
+the Blogger samples shipped with the project) is unescaped and parsed the
+same way Blogger2Wordpress._ConvertContent does it.  Requires Python 2.6
+or later for sys.getsizeof.
+"""
+
+import gc
+import glob
+import os.path
+import sys
+import time
+import xml.dom.minidom
+from xml.sax.saxutils import unescape
+
+import BeautifulSoup
+
+__author__ = 'JJ Lueck (jlueck@gmail.com)'
+
+
+def GetPostBodies(filenames):
+  """Returns the unescaped content of every entry in the export files."""
+  bodies = []
+  for filename in filenames:
+    doc = xml.dom.minidom.parse(filename)
+    for content in doc.getElementsByTagName('content'):
+      text = ''.join([node.nodeValue for node in content.childNodes
+                      if node.nodeType == node.TEXT_NODE])
+      if text:
+        bodies.append(unescape(text))
+    doc.unlink()
+  return bodies
+
+
+def NodeSize(node):
+  """Returns the bytes used by a tree node and its attribute dictionary.
+
+  The attribute values themselves are not counted, as they are the same
+  whichever node representation is used.
+  """
+  size = sys.getsizeof(node)
+  for referent in gc.get_referents(node):
+    # The instance dictionary is the one holding the navigation pointers.
+    if isinstance(referent, dict) and 'previousSibling' in referent:
+      size += sys.getsizeof(referent)
+  return size
+
+
+def MeasureParse(bodies, **kwargs):
+  """Parses all bodies with the given options.
+
+  Returns:
+    A tuple of the number of nodes, the bytes they use, the seconds spent
+    parsing and the seconds spent rendering the trees back to strings.
+  """
+  trees = []
+  start_time = time.time()
+  for body in bodies:
+    trees.append(BeautifulSoup.BeautifulSoup(body, **kwargs))
+  parse_time = time.time() - start_time
+
+  start_time = time.time()
+  for tree in trees:
+    str(tree)
+  render_time = time.time() - start_time
+
+  num_nodes = 0
+  num_bytes = 0
+  for tree in trees:
+    for node in tree.recursiveChildGenerator():
+      num_nodes += 1
+      num_bytes += NodeSize(node)
+  return num_nodes, num_bytes, parse_time, render_time
+
+
+def main(filenames):
+  bodies = GetPostBodies(filenames)
+  print 'Parsed %d bodies from %d files' % (len(bodies), len(filenames))
+  print '%-14s %8s %12s %12s %10s %10s' % (
+      'nodes', 'count', 'bytes', 'bytes/node', 'parse ms', 'render ms')
+  for label, options in [('dict', {}), ('compact', {'compactNodes': True})]:
+    num_nodes, num_bytes, parse_time, render_time = MeasureParse(bodies,
+                                                                 **options)
+    print '%-14s %8d %12d %12.1f %10d %10d' % (
+        label, num_nodes, num_bytes, float(num_bytes) / max(num_nodes, 1),
+        parse_time * 1000, render_time * 1000)
+
+
+if __name__ == '__main__':
+  if len(sys.argv) > 1:
+    main(sys.argv[1:])
+  else:
+    samples_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '..', '..', 'samples')
+    main(glob.glob(os.path.join(samples_dir, 'blogger-sample*.xml')))
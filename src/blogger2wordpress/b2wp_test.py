@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+# Copyright 2008 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import b2wp
+import wordpress
+
+FEED = '<feed xmlns="http://www.w3.org/2005/Atom"><title>Blog</title></feed>'
+OBJECT = ('<object width="425"><param name="movie" '
+          'value="http://www.youtube.com/v/abc&amp;hl=en"></param>'
+          '<embed src="http://www.youtube.com/v/abc&amp;hl=en"></embed>'
+          '</object>')
+VIDEO = '[youtube=http://www.youtube.com/watch?v=abc]'
+
+class TestObjectSoup(unittest.TestCase):
+
+  def testSpans(self):
+    markup = u'<p>Watch <b>this</b>: %s</p>%s' % (OBJECT, OBJECT)
+    soup = b2wp.ObjectSoup(markup)
+    self.failIf(soup.misnested)
+    objects = soup.findAll('object')
+    self.assertEquals(2, len(objects))
+    first = markup.index('<object')
+    second = markup.index('<object', first + 1)
+    self.assertEquals([first, first + len(OBJECT)],
+                      soup.GetSpan(objects[0]))
+    self.assertEquals([second, second + len(OBJECT)],
+                      soup.GetSpan(objects[1]))
+    # Only the objects were built into the tree
+    self.assertEquals(None, soup.find('p'))
+    self.assertEquals('movie', objects[0].find('param')['name'])
+
+  def testUnclosedObject(self):
+    soup = b2wp.ObjectSoup(u'<div><object><param name="movie" value="v">')
+    self.assertEquals(None, soup.GetSpan(soup.find('object'))[1])
+
+  def testMisnested(self):
+    for markup in [
+        # The end tag of the paragraph ends the object in a full parse
+        u'<p><object><param name="movie" value="v"></p></object>x',
+        # The paragraph within the object closes it below the div
+        u'<div><object><param name="movie" value="v"><p>x</p></object></div>',
+        # The param tag within the object closes the one before it
+        u'<param name="a"><object><param name="movie" value="v"></object>']:
+      self.assert_(b2wp.ObjectSoup(markup).misnested, markup)
+    self.failIf(b2wp.ObjectSoup(u'<b>%s</b>' % OBJECT).misnested)
+
+  def testGetMarkup(self):
+    markup = u'<a href="a?b=1&c=2&amp;d=3" title=x&y>a & b</a>'
+    soup = b2wp.ObjectSoup(markup)
+    # Only the ampersands of the start tags are escaped, and only the bare
+    # ones among them
+    self.assertEquals(
+        u'<a href="a?b=1&amp;c=2&amp;d=3" title=x&amp;y>a & b</a>',
+        soup.GetMarkup(0, len(markup)))
+    self.assertEquals(u'a & b</a>',
+                      soup.GetMarkup(markup.index('>') + 1, len(markup)))
+
+
+class TestConvertContent(unittest.TestCase):
+
+  def setUp(self):
+    self.translator = b2wp.Blogger2Wordpress(FEED)
+
+  def assertConverted(self, expected, text):
+    """Asserts a post is converted as expected, and the same as by rewriting
+    a tree of the whole post.
+    """
+    self.assertEquals(expected, self.translator._ConvertContent(text))
+    self.assertEquals(expected, self.translator._ConvertContentTree(
+        b2wp.unescape(text)))
+
+  def testNoObject(self):
+    text = '<p>Nothing to see <br> here</p>'
+    self.assert_(self.translator._ConvertContent(text) is text)
+    # The text is kept as written, where a tree would close the link
+    self.assertEquals('<a href="x">link',
+                      self.translator._ConvertContent('<a href="x">link'))
+    self.assertEquals('', self.translator._ConvertContent(None))
+
+  def testVideo(self):
+    self.assertConverted('<p>Watch: %s</p>' % VIDEO,
+                         '<p>Watch: %s</p>' % OBJECT)
+    # An object that is not a video is kept
+    text = '<object><param name="other" value="v"></param></object>'
+    self.assertEquals(text, self.translator._ConvertContent(text))
+
+  def testEntitiesInAttributes(self):
+    link = '<a href="http://example.com/?brd=1142&amp;amp;nav_sec=3">a</a>'
+    self.assertConverted(
+        '<a href="http://example.com/?brd=1142&amp;nav_sec=3">a</a>' + VIDEO,
+        link + OBJECT)
+    self.assertConverted(
+        '<a href="http://example.com/?a=1&amp;b=2">a &amp; b</a>',
+        '<a href="http://example.com/?a=1&amp;b=2">a &amp;amp; b</a>')
+
+  def testMisnestedObject(self):
+    self.assertConverted(
+        '<p>%s</p>x' % VIDEO,
+        '<p><object><param name="movie" '
+        'value="http://www.youtube.com/v/abc"></p></object>x')
+
+  def testUnclosedObject(self):
+    self.assertConverted(
+        '<div>%s</div>' % VIDEO,
+        '<div><object><param name="movie" '
+        'value="http://www.youtube.com/v/abc"></param>')
+
+
+class TestCollectLabels(unittest.TestCase):
+
+  def entry(self, kind, *labels):
+    """Returns a Blogger export entry of a kind with the given labels."""
+    categories = ['<category scheme="%s" term="%s#%s"/>' %
+                  (b2wp.KIND_SCHEME, 'http://schemas.google.com/blogger/2008/'
+                   'kind', kind)]
+    for label in labels:
+      categories.append('<category scheme="%s" term="%s"/>' %
+                        (b2wp.BLOGGER_NS, label))
+    return '<entry><id>%s</id>%s</entry>' % (kind, ''.join(categories))
+
+  def testLabels(self):
+    doc = ('<feed xmlns="http://www.w3.org/2005/Atom"><title>Blog</title>' +
+           self.entry('settings', 'setting') +
+           self.entry('template', 'template') +
+           self.entry('post', 'travel', 'food') +
+           self.entry('comment', 'comment') +
+           self.entry('page', 'about', 'food') +
+           self.entry('post', 'caf\xc3\xa9', 'travel', 'about', 'travel') +
+           self.entry('post') +
+           '</feed>')
+    translator = b2wp.Blogger2Wordpress(doc)
+    labels = translator._CollectLabels()
+    # Each label once, in the order first used by a post or page, leaving
+    # out the labels of the other entries
+    self.assertEquals(['travel', 'food', 'about', 'caf\xc3\xa9'], labels)
+
+    # The channel defines each of them as a tag
+    channel = wordpress.Channel()
+    channel.tags.extend(labels)
+    tag_names = []
+    for element in channel._ToElementTree():
+      if element.tag == '%s:tag' % wordpress.WORDPRESS_NS_TAG:
+        for child in element:
+          if child.tag == '%s:tag_name' % wordpress.WORDPRESS_NS_TAG:
+            tag_names.append(child.text)
+    self.assertEquals(labels, tag_names)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -15,6 +15,7 @@
 # limitations under the License.
 
 import cgi
+import StringIO
 import gdata.service
 import gdata.urlfetch
 from google.appengine.ext import webapp
@@ -30,8 +31,10 @@ gdata.service.http_request_handler = gdata.urlfetch
 
 class TransformPage(webapp.RequestHandler):
   def post(self):
-    # Parse the mulit-part form-data part out of the POST
-    input = self.request.get('input-file', allow_multiple=False)
+    # The form parser spools the uploaded file to a temporary file, so hand
+    # that to the translator rather than reading the export into a string
+    input = self.request.POST.get('input-file')
+    input = getattr(input, 'file', None) or StringIO.StringIO(input or '')
 
     # Run the blogger import processor
     translator = b2wp.Blogger2Wordpress(input)
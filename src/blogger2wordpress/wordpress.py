@@ -191,11 +191,11 @@ class Channel(WordPressObject):
     # Write out the categories assigned to the blog
     for category in self.categories:
       cat_elem = ElementTree.Element('%s:category' % WORDPRESS_NS_TAG)
-      self._SubElmement(cat_elem, '%s:category_name' % WORDPRESS_NS_TAG,
-                        category)
-      self._SubElmement(cat_elem, '%s:category_nicename' % WORDPRESS_NS_TAG,
-                        category)
-      self._SubElmement(cat_elem, '%s:category_parent' % WORDPRESS_NS_TAG)
+      self._SubElement(cat_elem, '%s:category_name' % WORDPRESS_NS_TAG,
+                       category)
+      self._SubElement(cat_elem, '%s:category_nicename' % WORDPRESS_NS_TAG,
+                       category)
+      self._SubElement(cat_elem, '%s:category_parent' % WORDPRESS_NS_TAG)
       root.append(cat_elem)
 
     # Write out the tags assigned to the blog.
@@ -0,0 +1,933 @@
+#!/usr/bin/env python
+
+# Copyright 2008 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Serves all of the converters from one WSGI application.
+
+The converters are mounted under /wp2b/, /b2wp/, /mt2b/, /b2mt/ and
+/lj2b/, the same paths their App Engine versions use.  A POST to one of
+them runs the conversion, streaming the converted document back as the
+converter writes it, and a GET serves the converter's upload page.  The
+application runs under any WSGI server, or on its own with wsgiref.
+
+Given a job directory, the application also queues conversions to run in
+worker processes, for exports too large to convert within one request:
+
+  POST /jobs/<converter>/  queues a conversion of the same form, and
+                           redirects to the status of the job
+  GET /jobs/<id>/          shows the status of the job, including the
+                           entries converted and the bytes read and written
+  GET /jobs/<id>/output    downloads the output of the finished job, with
+                           support for Range requests to resume downloads
+"""
+
+import binascii
+import cgi
+import cPickle
+import getopt
+import logging
+import mimetypes
+import os
+import os.path
+import Queue
+import re
+import shutil
+import SocketServer
+import StringIO
+import sys
+import threading
+import time
+import traceback
+import xmlrpclib
+from wsgiref import simple_server
+try:
+  import multiprocessing
+except ImportError:
+  multiprocessing = None
+
+# The converters and their libraries live in sibling directories
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in [os.path.join(SRC_DIR, '..', 'lib'),
+             os.path.join(SRC_DIR, 'wordpress2blogger'),
+             os.path.join(SRC_DIR, 'blogger2wordpress'),
+             os.path.join(SRC_DIR, 'movabletype2blogger'),
+             os.path.join(SRC_DIR, 'blogger2movabletype'),
+             os.path.join(SRC_DIR, 'livejournal2blogger')]:
+  if path not in sys.path:
+    sys.path.append(path)
+
+__author__ = 'JJ Lueck (jlueck@gmail.com)'
+
+########################
+# Constants
+########################
+
+ATOM_CONTENT_TYPE = 'application/atom+xml; charset=utf-8'
+TEXT_CONTENT_TYPE = 'text/plain; charset=utf-8'
+# The number of written chunks a conversion may get ahead of the client
+MAX_PENDING_CHUNKS = 16
+# The bytes of output held back before the response starts, long enough for
+# the header a converter writes before it can fail on its input
+START_SIZE = 8 * 1024
+# The bytes read from a file at a time
+READ_SIZE = 64 * 1024
+
+# The states of a job
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+# The fields of the status of a job, in the order they are shown
+STATUS_FIELDS = ['id', 'converter', 'state', 'entries', 'input_bytes',
+                 'bytes_read', 'bytes_written', 'message', 'submitted',
+                 'updated']
+# The seconds between updates of the status of a running job
+STATUS_INTERVAL = 1
+JOB_ID_RE = re.compile('^[0-9a-f]{32}$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# The seconds a conversion waits at a time for the client to catch up
+WRITE_TIMEOUT = 1
+
+
+###########################
+# Converters
+###########################
+
+def UploadedFile(form):
+  """Returns the uploaded input-file as a file object.
+
+  The form parser spools an uploaded file to a temporary file as it reads
+  the request, so the export is never held in memory as a whole.
+  """
+  field = form['input-file']
+  if isinstance(field, list):
+    field = field[0]
+  if field.file:
+    field.file.seek(0)
+    return field.file
+  return StringIO.StringIO(field.value)
+
+
+# Each converter imports its module when it is first used, so that a module
+# that cannot be imported on this version of Python only fails its own
+# conversions.  b2wp, for one, patches ElementTree internals that only exist
+# up to Python 2.6.
+
+def ConvertWordpress2Blogger(fields, outfile, options, progress):
+  import wp2b
+  translator = wp2b.Wordpress2Blogger()
+  progress.translator = translator
+  translator.Translate(fields['input-file'], outfile)
+
+
+def ConvertBlogger2Wordpress(fields, outfile, options, progress):
+  import b2wp
+  translator = b2wp.Blogger2Wordpress(fields['input-file'])
+  progress.translator = translator
+  output = translator.Translate()
+  if output:
+    outfile.write(str(output))
+
+
+def ConvertMovableType2Blogger(fields, outfile, options, progress):
+  import mt2b
+  translator = mt2b.MovableType2Blogger()
+  progress.translator = translator
+  translator.Translate(fields['input-file'], outfile)
+
+
+def ConvertBlogger2MovableType(fields, outfile, options, progress):
+  import b2mt
+  translator = b2mt.Blogger2MovableType(fields['input-file'])
+  progress.translator = translator
+  output = translator.Translate()
+  if output:
+    outfile.write(output)
+
+
+def ConvertLiveJournal2Blogger(fields, outfile, options, progress):
+  import lj2b
+  translator = lj2b.LiveJournal2Blogger(fields['username'],
+                                        fields['password'],
+                                        options['lj_server'])
+  progress.translator = translator
+  translator.Translate(outfile)
+
+
+class Progress(object):
+  """The progress of a conversion, as far as its translator counts it.
+
+  Attributes:
+    translator: The translator running the conversion, once it is created.
+  """
+
+  def __init__(self):
+    self.translator = None
+
+  def GetEntries(self):
+    """Returns the number of entries translated so far."""
+    return getattr(self.translator, 'num_entries', 0)
+
+
+# The converters by mount point, along with the directory of their upload
+# page, and the type and file name of what they output
+CONVERTERS = {
+    'wp2b': (ConvertWordpress2Blogger, 'wordpress2blogger',
+             ATOM_CONTENT_TYPE, 'blogger-export.xml'),
+    'b2wp': (ConvertBlogger2Wordpress, 'blogger2wordpress',
+             ATOM_CONTENT_TYPE, 'wordpress-wxr.xml'),
+    'mt2b': (ConvertMovableType2Blogger, 'movabletype2blogger',
+             ATOM_CONTENT_TYPE, 'blogger-export.xml'),
+    'b2mt': (ConvertBlogger2MovableType, 'blogger2movabletype',
+             TEXT_CONTENT_TYPE, 'movabletype-export.txt'),
+    'lj2b': (ConvertLiveJournal2Blogger, 'livejournal2blogger',
+             ATOM_CONTENT_TYPE, 'blogger-export.xml'),
+    }
+
+
+###########################
+# Streaming
+###########################
+
+class ClientGone(IOError):
+  """Raised in a conversion whose client stopped reading the output."""
+
+
+class OutputStream(object):
+  """A file receiving the output of a conversion in one thread, read as a
+  sequence of chunks in another.
+
+  At most MAX_PENDING_CHUNKS chunks are held, so a conversion faster than
+  its client waits rather than buffering the whole output.
+  """
+
+  # Queued after the last chunk, or with the exception stopping the
+  # conversion
+  DONE = 'done'
+  FAILED = 'failed'
+
+  def __init__(self):
+    self.queue = Queue.Queue(MAX_PENDING_CHUNKS)
+    self.cancelled = False
+
+  def write(self, data):
+    if data:
+      self._Put((None, data))
+
+  def Finish(self, exc_info=None):
+    """Marks the end of the output, or its failure with an exception."""
+    if exc_info:
+      self._Put((self.FAILED, exc_info))
+    else:
+      self._Put((self.DONE, None))
+
+  def Cancel(self):
+    """Makes further writes raise ClientGone."""
+    self.cancelled = True
+
+  def Get(self):
+    """Returns the next (marker, chunk or exc_info) pair, waiting for it."""
+    return self.queue.get()
+
+  def _Put(self, item):
+    while True:
+      if self.cancelled:
+        raise ClientGone('The client stopped reading the output')
+      try:
+        self.queue.put(item, True, WRITE_TIMEOUT)
+        return
+      except Queue.Full:
+        pass
+
+
+def StreamConversion(convert, start_response, content_type, filename):
+  """Runs a conversion in a thread of its own, generating the chunks of its
+  output as they are written.
+
+  The response starts once START_SIZE bytes are written, so a conversion
+  failing before that gets an error response instead.  A failure after
+  that can only cut the response short.
+
+  Args:
+    convert: The function running the conversion, given the file to write
+        the output to.
+    start_response: The start_response function of the WSGI request.
+    content_type: The content type of the output.
+    filename: The file name suggested for downloading the output.
+  """
+  stream = OutputStream()
+
+  def Work():
+    try:
+      convert(stream)
+    except ClientGone:
+      return
+    except:
+      try:
+        stream.Finish(sys.exc_info())
+      except ClientGone:
+        pass
+      return
+    try:
+      stream.Finish()
+    except ClientGone:
+      pass
+
+  worker = threading.Thread(target=Work)
+  worker.setDaemon(True)
+  worker.start()
+
+  started = False
+  held = []
+  held_size = 0
+  try:
+    while True:
+      marker, value = stream.Get()
+      if marker == stream.DONE:
+        break
+      elif marker == stream.FAILED:
+        if started:
+          raise value[0], value[1], value[2]
+        for chunk in ErrorResponse(start_response, value):
+          yield chunk
+        return
+      if started:
+        yield value
+        continue
+      held.append(value)
+      held_size += len(value)
+      if held_size >= START_SIZE:
+        StartOutput(start_response, content_type, filename)
+        started = True
+        yield ''.join(held)
+        held = None
+    if started:
+      return
+    if not held:
+      # Converters that fail to parse their input may write nothing
+      for chunk in ErrorResponse(start_response, None):
+        yield chunk
+      return
+    StartOutput(start_response, content_type, filename)
+    yield ''.join(held)
+  finally:
+    stream.Cancel()
+
+
+def StartOutput(start_response, content_type, filename):
+  """Starts the response carrying the output of a conversion."""
+  start_response('200 OK', [
+      ('Content-Type', content_type),
+      ('Content-Disposition', 'attachment;filename=%s' % filename)])
+
+
+def DescribeError(exc_info):
+  """Describes the error that stopped a conversion, logging unexpected ones.
+
+  Args:
+    exc_info: The exception raised by the conversion, as returned by
+        sys.exc_info(), or None if the conversion wrote nothing.
+  Returns:
+    A tuple of the HTTP status and the message for the error.
+  """
+  if exc_info is None:
+    return '400 Bad Request', 'Error encountered during conversion.'
+  elif isinstance(exc_info[1], (xmlrpclib.Fault, RuntimeWarning)):
+    # The fault message is usually "password incorrect", and the warning
+    # says where the input could not be parsed
+    return ('400 Bad Request',
+            'Error encountered during conversion.\n\n%s' % exc_info[1])
+  exc = ''.join(traceback.format_exception(*exc_info))
+  logging.error(exc)
+  return ('500 Internal Server Error',
+          'Error encountered during conversion.\n\n%s' % exc)
+
+
+def ErrorResponse(start_response, exc_info):
+  """Responds with the error that stopped a conversion."""
+  status, message = DescribeError(exc_info)
+  start_response(status, [('Content-Type', TEXT_CONTENT_TYPE)])
+  return [message]
+
+
+###########################
+# Jobs
+###########################
+
+class ProgressFile(object):
+  """Counts the bytes read from or written to a file.
+
+  Attributes:
+    bytes: The furthest position in the file read or written so far.
+  """
+
+  def __init__(self, file):
+    self.file = file
+    self.position = 0
+    self.bytes = 0
+
+  def read(self, size=-1):
+    return self._Count(self.file.read(size))
+
+  def readline(self, size=-1):
+    return self._Count(self.file.readline(size))
+
+  def __iter__(self):
+    return self
+
+  def next(self):
+    line = self.readline()
+    if not line:
+      raise StopIteration
+    return line
+
+  def write(self, data):
+    self.file.write(data)
+    self._Count(data)
+
+  def seek(self, offset, whence=0):
+    self.file.seek(offset, whence)
+    self.position = self.file.tell()
+
+  def tell(self):
+    return self.position
+
+  def close(self):
+    self.file.close()
+
+  def _Count(self, data):
+    self.position += len(data)
+    self.bytes = max(self.bytes, self.position)
+    return data
+
+
+def ReadStatus(job_path):
+  """Returns the status of the job in the directory, or None if there is
+  no such job.
+  """
+  filename = os.path.join(job_path, 'status')
+  if not os.path.exists(filename):
+    return None
+  infile = open(filename, 'rb')
+  try:
+    return cPickle.load(infile)
+  finally:
+    infile.close()
+
+
+def WriteStatus(job_path, status):
+  """Replaces the status of the job in the directory."""
+  filename = os.path.join(job_path, 'status')
+  # Replace the file only once the new status is completely written, as
+  # it is read from other processes
+  temp_filename = filename + '.tmp'
+  outfile = open(temp_filename, 'wb')
+  try:
+    cPickle.dump(status, outfile, cPickle.HIGHEST_PROTOCOL)
+  finally:
+    outfile.close()
+  if os.name != 'posix' and os.path.exists(filename):
+    os.remove(filename)
+  os.rename(temp_filename, filename)
+
+
+def FormatStatus(status):
+  """Returns the status of a job as text, one "name: value" line per field."""
+  lines = []
+  for name in STATUS_FIELDS:
+    value = status.get(name, '')
+    if name in ['submitted', 'updated'] and value:
+      value = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(value))
+    lines.append('%s: %s\n' % (name, str(value).replace('\n', ' ')))
+  return ''.join(lines)
+
+
+def RunJobs(queue, job_dir, options):
+  """Runs the jobs taken from the queue, until it yields None or the
+  process that started the worker goes away.
+
+  This is the body of the worker processes of a JobQueue.
+  """
+  # Python 2 has no getppid on Windows
+  GetParentId = getattr(os, 'getppid', lambda: None)
+  parent_id = GetParentId()
+  while True:
+    try:
+      job = queue.get(True, STATUS_INTERVAL)
+    except Queue.Empty:
+      # A service killed without stopping its queue leaves the workers
+      # to the init process
+      if GetParentId() != parent_id:
+        return
+      continue
+    if job is None:
+      return
+    job_id, name, fields = job
+    try:
+      RunJob(os.path.join(job_dir, job_id), name, fields, options)
+    except:
+      logging.error('Job %s failed: %s', job_id, traceback.format_exc())
+
+
+def RunJob(job_path, name, fields, options):
+  """Runs a conversion, writing its progress to the status of the job.
+
+  Args:
+    job_path: The directory of the job.
+    name: The mount point of the converter to run.
+    fields: The form fields the converter reads, except for the input-file
+        which is read from the job directory.
+    options: The options of the application.
+  """
+  status = ReadStatus(job_path)
+  input_filename = os.path.join(job_path, 'input')
+  output_filename = os.path.join(job_path, 'output')
+  infile = None
+  if os.path.exists(input_filename):
+    infile = ProgressFile(open(input_filename, 'rb'))
+    fields['input-file'] = infile
+  outfile = ProgressFile(open(output_filename + '.tmp', 'wb'))
+  progress = Progress()
+
+  def Update(**changes):
+    status.update(changes)
+    status['entries'] = progress.GetEntries()
+    if infile:
+      status['bytes_read'] = infile.bytes
+    status['bytes_written'] = outfile.bytes
+    status['updated'] = time.time()
+    WriteStatus(job_path, status)
+
+  finished = threading.Event()
+  def Report():
+    while True:
+      finished.wait(STATUS_INTERVAL)
+      if finished.isSet():
+        return
+      Update()
+
+  Update(state=RUNNING)
+  reporter = threading.Thread(target=Report)
+  reporter.setDaemon(True)
+  reporter.start()
+  exc_info = None
+  try:
+    try:
+      CONVERTERS[name][0](fields, outfile, options, progress)
+    except:
+      exc_info = sys.exc_info()
+  finally:
+    finished.set()
+    reporter.join()
+    outfile.close()
+    if infile:
+      infile.close()
+      os.remove(input_filename)
+
+  if exc_info or not outfile.bytes:
+    # Converters that fail to parse their input may write nothing
+    os.remove(output_filename + '.tmp')
+    Update(state=FAILED, message=DescribeError(exc_info)[1])
+  else:
+    os.rename(output_filename + '.tmp', output_filename)
+    Update(state=DONE)
+
+
+class JobQueue(object):
+  """Runs conversions in a pool of worker processes.
+
+  Each job has a directory of its own under the job directory, named after
+  its ID.  It holds the uploaded input until the conversion finishes, the
+  output and the status of the job, which the workers update as the
+  conversion progresses.  Requires Python 2.6 or later.
+  """
+
+  def __init__(self, job_dir, num_workers=2, options=None,
+               max_age=24 * 60 * 60):
+    """Constructs a queue without starting its workers.
+
+    Args:
+      job_dir: The directory to keep the jobs in.
+      num_workers: The number of conversions to run at once.
+      options: The options of the application, passed to the converters.
+      max_age: The seconds a finished job is kept for its output to be
+          downloaded.
+    """
+    if multiprocessing is None:
+      raise RuntimeError('The job queue requires Python 2.6 or later')
+    self.job_dir = job_dir
+    self.num_workers = num_workers
+    self.options = options or {}
+    self.max_age = max_age
+    self.queue = multiprocessing.Queue()
+    self.workers = []
+
+  def Start(self):
+    """Starts the worker processes."""
+    if not os.path.isdir(self.job_dir):
+      os.makedirs(self.job_dir)
+    # The jobs queued by an earlier run went with it, along with the
+    # credentials some of them needed
+    for job_id in os.listdir(self.job_dir):
+      status = self.GetStatus(job_id)
+      if status and status['state'] in [QUEUED, RUNNING]:
+        status['state'] = FAILED
+        status['message'] = 'The service stopped before the job finished.'
+        status['updated'] = time.time()
+        WriteStatus(self._JobPath(job_id), status)
+    for i in xrange(self.num_workers):
+      worker = multiprocessing.Process(
+          target=RunJobs, args=(self.queue, self.job_dir, self.options))
+      worker.daemon = True
+      worker.start()
+      self.workers.append(worker)
+
+  def Stop(self):
+    """Stops the worker processes once they have run the queued jobs."""
+    for worker in self.workers:
+      self.queue.put(None)
+    for worker in self.workers:
+      worker.join()
+    self.workers = []
+
+  def Submit(self, name, fields):
+    """Queues a conversion.
+
+    Args:
+      name: The mount point of the converter to run.
+      fields: The form fields the converter reads.  The input-file is
+          copied into the job directory, while the others (such as a
+          LiveJournal password) are only ever passed to the worker.
+    Returns:
+      The ID of the job.
+    """
+    self._RemoveExpired()
+    job_id = binascii.hexlify(os.urandom(16))
+    job_path = self._JobPath(job_id)
+    os.mkdir(job_path)
+
+    fields = fields.copy()
+    input_bytes = 0
+    if fields.has_key('input-file'):
+      input_filename = os.path.join(job_path, 'input')
+      outfile = open(input_filename, 'wb')
+      try:
+        shutil.copyfileobj(fields.pop('input-file'), outfile, READ_SIZE)
+      finally:
+        outfile.close()
+      input_bytes = os.path.getsize(input_filename)
+
+    now = time.time()
+    WriteStatus(job_path, {'id': job_id, 'converter': name, 'state': QUEUED,
+                           'entries': 0, 'input_bytes': input_bytes,
+                           'bytes_read': 0, 'bytes_written': 0,
+                           'message': '', 'submitted': now, 'updated': now})
+    self.queue.put((job_id, name, fields))
+    return job_id
+
+  def GetStatus(self, job_id):
+    """Returns the status of a job as a dictionary, or None if there is no
+    such job.
+    """
+    if not JOB_ID_RE.match(job_id):
+      return None
+    return ReadStatus(self._JobPath(job_id))
+
+  def GetOutputFilename(self, job_id):
+    """Returns the name of the file holding the output of a finished job."""
+    return os.path.join(self._JobPath(job_id), 'output')
+
+  def _JobPath(self, job_id):
+    return os.path.join(self.job_dir, job_id)
+
+  def _RemoveExpired(self):
+    """Removes the finished jobs older than max_age."""
+    expiry_time = time.time() - self.max_age
+    for job_id in os.listdir(self.job_dir):
+      status = self.GetStatus(job_id)
+      if (status and status['state'] in [DONE, FAILED] and
+          status['updated'] < expiry_time):
+        shutil.rmtree(self._JobPath(job_id), True)
+
+
+def ParseRange(header, size):
+  """Parses the Range header of a request for a file.
+
+  Only a single range of bytes is supported; any other header is ignored,
+  and the whole file is sent.
+
+  Args:
+    header: The value of the Range header, or None.
+    size: The size of the file.
+  Returns:
+    The first and last positions of the range, None if the whole file should
+    be sent, or () if the range lies beyond the end of the file.
+  """
+  match = RANGE_RE.match(header or '')
+  if not match or match.groups() == ('', ''):
+    return None
+  first, last = match.groups()
+  if not first:
+    # A suffix range asks for the last bytes of the file
+    if not int(last):
+      return ()
+    return max(size - int(last), 0), size - 1
+  first = int(first)
+  if last and int(last) < first:
+    return None
+  if first >= size:
+    return ()
+  if last:
+    return first, min(int(last), size - 1)
+  return first, size - 1
+
+
+def ReadFile(filename, first, length):
+  """Generates the chunks of a part of a file."""
+  infile = open(filename, 'rb')
+  try:
+    infile.seek(first)
+    while length > 0:
+      data = infile.read(min(length, READ_SIZE))
+      if not data:
+        break
+      length -= len(data)
+      yield data
+  finally:
+    infile.close()
+
+
+###########################
+# Application
+###########################
+
+class ConverterService(object):
+  """The WSGI application serving the converters."""
+
+  def __init__(self, lj_server='www.livejournal.com', job_queue=None):
+    """Constructs the application.
+
+    Args:
+      lj_server: The LiveJournal server lj2b exports from.
+      job_queue: The JobQueue running the conversions posted to /jobs/, or
+          None to serve only conversions within their requests.
+    """
+    self.options = {'lj_server': lj_server}
+    self.job_queue = job_queue
+
+  def __call__(self, environ, start_response):
+    parts = environ.get('PATH_INFO', '/').strip('/').split('/')
+    name = parts[0]
+    if not name:
+      return self._Index(start_response)
+    if name == 'jobs' and self.job_queue:
+      return self._Jobs(parts[1:], environ, start_response)
+    if not CONVERTERS.has_key(name) and len(parts) == 1:
+      # The upload pages refer to their images from the root
+      for other in self._ConverterNames():
+        if os.path.isfile(self._StaticPath(other, name)):
+          return self._Static(other, name, start_response)
+    if not CONVERTERS.has_key(name) or len(parts) > 2:
+      return self._NotFound(start_response)
+
+    method = environ['REQUEST_METHOD']
+    if method == 'POST' and len(parts) == 1:
+      return self._Convert(name, environ, start_response)
+    elif method in ['GET', 'HEAD']:
+      if len(parts) == 1:
+        return self._Static(name, 'index.html', start_response)
+      return self._Static(name, parts[1], start_response)
+    start_response('405 Method Not Allowed',
+                   [('Content-Type', TEXT_CONTENT_TYPE),
+                    ('Allow', 'GET, HEAD, POST')])
+    return ['Method not allowed.']
+
+  def _Convert(self, name, environ, start_response):
+    convert, directory, content_type, filename = CONVERTERS[name]
+    fields = self._GetFields(name, environ)
+    if fields is None:
+      return self._MissingInput(start_response)
+    def Convert(outfile):
+      convert(fields, outfile, self.options, Progress())
+    return StreamConversion(Convert, start_response, content_type, filename)
+
+  def _GetFields(self, name, environ):
+    """Returns the fields of the posted form that the converter reads, or
+    None if its input-file is missing.
+    """
+    form = cgi.FieldStorage(fp=environ['wsgi.input'], environ=environ)
+    if name == 'lj2b':
+      return {'username': form.getfirst('username', ''),
+              'password': form.getfirst('password', '')}
+    if not form.has_key('input-file'):
+      return None
+    return {'input-file': UploadedFile(form)}
+
+  def _MissingInput(self, start_response):
+    start_response('400 Bad Request', [('Content-Type', TEXT_CONTENT_TYPE)])
+    return ['No input-file was uploaded.']
+
+  def _Jobs(self, parts, environ, start_response):
+    """Serves the requests under /jobs/."""
+    method = environ['REQUEST_METHOD']
+    if method == 'POST' and len(parts) == 1 and CONVERTERS.has_key(parts[0]):
+      return self._SubmitJob(parts[0], environ, start_response)
+    if method in ['GET', 'HEAD'] and len(parts) in [1, 2]:
+      status = self.job_queue.GetStatus(parts[0])
+      if status and len(parts) == 1:
+        start_response('200 OK', [('Content-Type', TEXT_CONTENT_TYPE),
+                                  ('Cache-Control', 'no-cache')])
+        return [FormatStatus(status)]
+      elif status and parts[1] == 'output':
+        return self._JobOutput(status, environ, start_response)
+    return self._NotFound(start_response)
+
+  def _SubmitJob(self, name, environ, start_response):
+    fields = self._GetFields(name, environ)
+    if fields is None:
+      return self._MissingInput(start_response)
+    job_id = self.job_queue.Submit(name, fields)
+    start_response('303 See Other', [('Content-Type', TEXT_CONTENT_TYPE),
+                                     ('Location', '/jobs/%s/' % job_id)])
+    return [FormatStatus(self.job_queue.GetStatus(job_id))]
+
+  def _JobOutput(self, status, environ, start_response):
+    """Serves the output of a job, or the range of it asked for."""
+    if status['state'] != DONE:
+      start_response('404 Not Found', [('Content-Type', TEXT_CONTENT_TYPE)])
+      return ['The job has no output.']
+    content_type, filename = CONVERTERS[status['converter']][2:]
+    output_filename = self.job_queue.GetOutputFilename(status['id'])
+    size = os.path.getsize(output_filename)
+
+    # The output of a job never changes, so its ID serves as its entity tag
+    etag = '"%s"' % status['id']
+    byte_range = None
+    if environ.get('HTTP_IF_RANGE', etag) == etag:
+      byte_range = ParseRange(environ.get('HTTP_RANGE'), size)
+    if byte_range == ():
+      start_response('416 Requested Range Not Satisfiable',
+                     [('Content-Type', TEXT_CONTENT_TYPE),
+                      ('Content-Range', 'bytes */%d' % size)])
+      return ['The range lies beyond the end of the output.']
+
+    headers = [('Content-Type', content_type),
+               ('Content-Disposition', 'attachment;filename=%s' % filename),
+               ('Accept-Ranges', 'bytes'),
+               ('ETag', etag)]
+    if byte_range:
+      first, last = byte_range
+      headers.append(('Content-Range', 'bytes %d-%d/%d' % (first, last, size)))
+      http_status = '206 Partial Content'
+    else:
+      first, last = 0, size - 1
+      http_status = '200 OK'
+    headers.append(('Content-Length', str(last - first + 1)))
+    start_response(http_status, headers)
+    if environ['REQUEST_METHOD'] == 'HEAD':
+      return []
+    return ReadFile(output_filename, first, last - first + 1)
+
+  def _Static(self, name, filename, start_response):
+    """Serves a file of the static directory of a converter."""
+    path = self._StaticPath(name, filename)
+    if not os.path.isfile(path):
+      return self._NotFound(start_response)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    infile = open(path, 'rb')
+    try:
+      data = infile.read()
+    finally:
+      infile.close()
+    start_response('200 OK', [('Content-Type', content_type),
+                              ('Content-Length', str(len(data)))])
+    return [data]
+
+  def _StaticPath(self, name, filename):
+    """Returns the path of a file of the static directory of a converter,
+    or of no file if the name would lead out of the directory.
+    """
+    if filename.startswith('.') or os.path.dirname(filename):
+      return ''
+    return os.path.join(SRC_DIR, CONVERTERS[name][1], 'static', filename)
+
+  def _ConverterNames(self):
+    names = CONVERTERS.keys()
+    names.sort()
+    return names
+
+  def _Index(self, start_response):
+    links = ['<li><a href="/%s/">%s</a></li>' % (name, CONVERTERS[name][1])
+             for name in self._ConverterNames()]
+    start_response('200 OK', [('Content-Type', 'text/html; charset=utf-8')])
+    return ['<html><body><h1>Blog converters</h1><ul>%s</ul></body></html>' %
+            ''.join(links)]
+
+  def _NotFound(self, start_response):
+    start_response('404 Not Found', [('Content-Type', TEXT_CONTENT_TYPE)])
+    return ['Not found.']
+
+
+application = ConverterService()
+
+
+class ThreadingWSGIServer(SocketServer.ThreadingMixIn,
+                          simple_server.WSGIServer):
+  """A wsgiref server handling each request in a thread of its own."""
+
+  daemon_threads = True
+
+
+def usage():
+  return ('Usage: %s [-p <port>] [-j <job dir> [-w <workers>]]\n\n'
+          ' Serves all of the converters on the port, 8080 by default.\n'
+          ' With a job directory, conversions posted to /jobs/ are also\n'
+          ' queued for the given number of worker processes, 2 by default.' %
+          os.path.basename(sys.argv[0]))
+
+if __name__ == '__main__':
+
+  # parse command line options
+  try:
+    opts, args = getopt.getopt(sys.argv[1:], 'p:j:w:',
+                               ['port=', 'job-dir=', 'workers='])
+  except getopt.error, msg:
+    print usage()
+    sys.exit(2)
+
+  port = 8080
+  job_dir = None
+  num_workers = 2
+  for opt, arg in opts:
+    if opt in ['-p', '--port']:
+      port = int(arg)
+    elif opt in ['-j', '--job-dir']:
+      job_dir = arg
+    elif opt in ['-w', '--workers']:
+      num_workers = int(arg)
+
+  job_queue = None
+  if job_dir:
+    job_queue = JobQueue(job_dir, num_workers, application.options)
+    job_queue.Start()
+    application.job_queue = job_queue
+  server = simple_server.make_server('', port, application,
+                                     server_class=ThreadingWSGIServer)
+  print 'Serving the converters on port %d' % port
+  try:
+    server.serve_forever()
+  finally:
+    if job_queue:
+      job_queue.Stop()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+
+# Copyright 2008 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cgi
+import os
+import os.path
+import shutil
+import StringIO
+import tempfile
+import time
+import unittest
+import urllib
+import xml.dom.minidom
+from wsgiref import util
+
+import service
+import fakelivejournal
+import lj2b
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           '..', '..', 'samples')
+BOUNDARY = 'converterservicetestboundary'
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+
+class ServiceTestCase(unittest.TestCase):
+  """Runs requests through the application."""
+
+  def setUp(self):
+    self.server = None
+
+  def tearDown(self):
+    if self.server:
+      self.server.Stop()
+
+  def request(self, path, method='GET', body='', content_type=None,
+              application=service.application, headers={}):
+    """Runs a request through the application.
+
+    Returns:
+      A tuple of the status, the headers as a dictionary and the list of
+      chunks of the body.
+    """
+    environ = {'REQUEST_METHOD': method, 'PATH_INFO': path,
+               'CONTENT_LENGTH': str(len(body)),
+               'wsgi.input': StringIO.StringIO(body)}
+    if content_type:
+      environ['CONTENT_TYPE'] = content_type
+    for name, value in headers.items():
+      environ['HTTP_' + name.upper().replace('-', '_')] = value
+    util.setup_testing_defaults(environ)
+    response = {}
+    def StartResponse(status, headers):
+      response['status'] = status
+      response['headers'] = dict(headers)
+    chunks = list(application(environ, StartResponse))
+    return response['status'], response['headers'], chunks
+
+  def readSample(self, sample):
+    infile = open(os.path.join(SAMPLES_DIR, sample), 'rb')
+    try:
+      return infile.read()
+    finally:
+      infile.close()
+
+  def multipartBody(self, sample, data=None):
+    """Returns a form body uploading a sample file as the input-file."""
+    if data is None:
+      data = self.readSample(sample)
+    return ('--%s\r\n'
+            'Content-Disposition: form-data; name="input-file"; '
+            'filename="%s"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'
+            '%s\r\n'
+            '--%s--\r\n' % (BOUNDARY, sample, data, BOUNDARY))
+
+  def upload(self, path, sample, data=None, **kwargs):
+    """Posts a sample file as the input-file of a converter."""
+    return self.request(path, 'POST', self.multipartBody(sample, data),
+                        'multipart/form-data; boundary=%s' % BOUNDARY,
+                        **kwargs)
+
+
+class TestConverterService(ServiceTestCase):
+
+  def testWordpress2Blogger(self):
+    status, headers, chunks = self.upload('/wp2b/', 'wordpress-sample.wxr')
+    self.assertEquals('200 OK', status)
+    self.assertEquals('attachment;filename=blogger-export.xml',
+                      headers['Content-Disposition'])
+    xml.dom.minidom.parseString(''.join(chunks))
+
+  def testBlogger2Wordpress(self):
+    status, headers, chunks = self.upload('/b2wp/', 'blogger-sample.xml')
+    self.assertEquals('200 OK', status)
+    self.assertEquals('attachment;filename=wordpress-wxr.xml',
+                      headers['Content-Disposition'])
+    self.assert_('<rss' in ''.join(chunks))
+
+  def testMovableType2Blogger(self):
+    status, headers, chunks = self.upload('/mt2b/', 'movabletype-sample.txt')
+    self.assertEquals('200 OK', status)
+    xml.dom.minidom.parseString(''.join(chunks))
+
+  def testBlogger2MovableType(self):
+    status, headers, chunks = self.upload('/b2mt/', 'blogger-sample.xml')
+    self.assertEquals('200 OK', status)
+    self.assert_('--------' in ''.join(chunks))
+
+  def testLiveJournal2Blogger(self):
+    journal = fakelivejournal.SyntheticJournal(num_posts=100,
+                                               num_comments=500)
+    self.server = fakelivejournal.FakeLiveJournalServer(journal)
+    self.server.Start()
+    application = service.ConverterService(lj_server=self.server.GetHost())
+    body = urllib.urlencode({'username': journal.username,
+                             'password': journal.password})
+    status, headers, chunks = self.request(
+        '/lj2b/', 'POST', body, 'application/x-www-form-urlencoded',
+        application)
+    self.assertEquals('200 OK', status)
+    # The entries were streamed rather than sent as one document
+    self.assert_(len(chunks) > 100)
+    # The same entries were exported as by lj2b on its own
+    translator = lj2b.LiveJournal2Blogger(journal.username, journal.password,
+                                          self.server.GetHost())
+    translator.Translate(StringIO.StringIO())
+    doc = xml.dom.minidom.parseString(''.join(chunks))
+    self.assertEquals(translator.num_entries,
+                      len(doc.getElementsByTagNameNS(ATOM_NS, 'entry')))
+
+    body = urllib.urlencode({'username': journal.username,
+                             'password': 'wrong'})
+    status, headers, chunks = self.request(
+        '/lj2b/', 'POST', body, 'application/x-www-form-urlencoded',
+        application)
+    self.assertEquals('400 Bad Request', status)
+
+  def testUploadedFile(self):
+    body = self.multipartBody('wordpress-sample.wxr')
+    environ = {'REQUEST_METHOD': 'POST', 'CONTENT_LENGTH': str(len(body)),
+               'CONTENT_TYPE': 'multipart/form-data; boundary=%s' % BOUNDARY}
+    form = cgi.FieldStorage(fp=StringIO.StringIO(body), environ=environ)
+    infile = service.UploadedFile(form)
+    # The upload was spooled to a temporary file rather than kept in memory
+    self.assert_(not isinstance(infile, StringIO.StringIO))
+    self.assertEquals(self.readSample('wordpress-sample.wxr'), infile.read())
+
+  def testMissingInput(self):
+    status, headers, chunks = self.request(
+        '/wp2b/', 'POST', '', 'application/x-www-form-urlencoded')
+    self.assertEquals('400 Bad Request', status)
+
+  def testStaticFiles(self):
+    status, headers, chunks = self.request('/wp2b/')
+    self.assertEquals('200 OK', status)
+    self.assert_('action="/wp2b/"' in ''.join(chunks))
+    status, headers, chunks = self.request('/b2wp.png')
+    self.assertEquals('image/png', headers['Content-Type'])
+    self.assertEquals('404 Not Found', self.request('/wp2b/../app.yaml')[0])
+    self.assertEquals('404 Not Found', self.request('/nothing/')[0])
+
+
+class TestJobs(ServiceTestCase):
+
+  def setUp(self):
+    ServiceTestCase.setUp(self)
+    self.job_dir = tempfile.mkdtemp()
+    self.application = service.ConverterService()
+    self.job_queue = service.JobQueue(self.job_dir, 2,
+                                      self.application.options)
+    self.application.job_queue = self.job_queue
+    self.job_queue.Start()
+
+  def tearDown(self):
+    self.job_queue.Stop()
+    shutil.rmtree(self.job_dir)
+    ServiceTestCase.tearDown(self)
+
+  def waitForJob(self, location):
+    """Polls the status of a job until it finishes, returning the status as
+    a dictionary.
+    """
+    deadline = time.time() + 60
+    while True:
+      status, headers, chunks = self.request(
+          location, application=self.application)
+      self.assertEquals('200 OK', status)
+      fields = dict([line.split(': ', 1)
+                     for line in ''.join(chunks).splitlines()])
+      if fields['state'] in [service.DONE, service.FAILED]:
+        return fields
+      self.assert_(time.time() < deadline)
+      time.sleep(0.1)
+
+  def download(self, location, **headers):
+    return self.request(location + 'output', application=self.application,
+                        headers=headers)
+
+  def testJob(self):
+    status, headers, chunks = self.upload(
+        '/jobs/mt2b/', 'movabletype-sample.txt', application=self.application)
+    self.assertEquals('303 See Other', status)
+    location = headers['Location']
+    fields = self.waitForJob(location)
+    self.assertEquals(service.DONE, fields['state'])
+    size = len(self.readSample('movabletype-sample.txt'))
+    self.assertEquals(str(size), fields['input_bytes'])
+    self.assertEquals(str(size), fields['bytes_read'])
+    self.assert_(int(fields['entries']) > 0)
+
+    status, headers, chunks = self.download(location)
+    self.assertEquals('200 OK', status)
+    self.assertEquals('bytes', headers['Accept-Ranges'])
+    output = ''.join(chunks)
+    self.assertEquals(fields['bytes_written'], str(len(output)))
+    doc = xml.dom.minidom.parseString(output)
+    self.assertEquals(int(fields['entries']),
+                      len(doc.getElementsByTagNameNS(ATOM_NS, 'entry')))
+
+    # An interrupted download resumes from where it stopped
+    status, headers, chunks = self.download(location, Range='bytes=100-')
+    self.assertEquals('206 Partial Content', status)
+    self.assertEquals('bytes 100-%d/%d' % (len(output) - 1, len(output)),
+                      headers['Content-Range'])
+    self.assertEquals(output[100:], ''.join(chunks))
+    status, headers, chunks = self.download(location, Range='bytes=10-19')
+    self.assertEquals(output[10:20], ''.join(chunks))
+    status, headers, chunks = self.download(location, Range='bytes=-50')
+    self.assertEquals(output[-50:], ''.join(chunks))
+    status, headers, chunks = self.download(
+        location, Range='bytes=%d-' % len(output))
+    self.assertEquals('416 Requested Range Not Satisfiable', status)
+
+    # A range of another version of the output is not sent
+    status, headers, chunks = self.download(
+        location, Range='bytes=100-', **{'If-Range': '"other"'})
+    self.assertEquals('200 OK', status)
+    self.assertEquals(output, ''.join(chunks))
+
+  def testLiveJournalJob(self):
+    journal = fakelivejournal.SyntheticJournal(num_posts=50,
+                                               num_comments=200)
+    self.server = fakelivejournal.FakeLiveJournalServer(journal)
+    self.server.Start()
+    self.application.options['lj_server'] = self.server.GetHost()
+    # The workers were given the options when they started
+    self.job_queue.Stop()
+    self.job_queue.Start()
+    body = urllib.urlencode({'username': journal.username,
+                             'password': journal.password})
+    status, headers, chunks = self.request(
+        '/jobs/lj2b/', 'POST', body, 'application/x-www-form-urlencoded',
+        self.application)
+    fields = self.waitForJob(headers['Location'])
+    self.assertEquals(service.DONE, fields['state'])
+    translator = lj2b.LiveJournal2Blogger(journal.username, journal.password,
+                                          self.server.GetHost())
+    translator.Translate(StringIO.StringIO())
+    self.assertEquals(str(translator.num_entries), fields['entries'])
+    # The password was never written to the job directory
+    for dirpath, dirnames, filenames in os.walk(self.job_dir):
+      for filename in filenames:
+        infile = open(os.path.join(dirpath, filename), 'rb')
+        self.assert_(journal.password not in infile.read())
+        infile.close()
+
+  def testFailedJob(self):
+    status, headers, chunks = self.upload(
+        '/jobs/b2mt/', 'broken.xml', 'not an export',
+        application=self.application)
+    location = headers['Location']
+    fields = self.waitForJob(location)
+    self.assertEquals(service.FAILED, fields['state'])
+    self.assert_(fields['message'].startswith('Error encountered'))
+    self.assertEquals('404 Not Found', self.download(location)[0])
+
+  def testUnknownJob(self):
+    for path in ['/jobs/%s/' % ('0' * 32), '/jobs/../', '/jobs/mt2b/']:
+      status, headers, chunks = self.request(path,
+                                             application=self.application)
+      self.assertEquals('404 Not Found', status)
+
+
+if __name__ == '__main__':
+  unittest.main()
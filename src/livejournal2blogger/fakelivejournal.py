@@ -0,0 +1,668 @@
+#!/usr/bin/env python
+
+# Copyright 2008 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A local stand-in for the parts of a LiveJournal server used by lj2b.
+
+The server serves a synthetic journal through the LJ.XMLRPC getchallenge,
+syncitems and getevents methods and system.multicall, the getchallenge and
+sessiongenerate modes of the flat protocol, and the comment export of
+export_comments.bml.  It can add latency to its responses, fail a share of
+the requests, throttle clients making too many requests at once and gzip
+its responses, so that lj2b can be tested and benchmarked without the
+network.  Stopping the server requires Python 2.6 or later.
+"""
+
+import BaseHTTPServer
+import cgi
+import getopt
+import md5
+import os.path
+import random
+import SocketServer
+import sys
+import threading
+import time
+import xmlrpclib
+import zlib
+from xml.sax.saxutils import escape, quoteattr
+
+__author__ = 'JJ Lueck (jlueck@gmail.com)'
+
+########################
+# Constants
+########################
+
+LJ_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+COMMENT_TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# The time of the first journal entry
+START_TIME = 1199145600
+
+# The most items a syncitems response and events a getevents response hold
+SYNCITEMS_PER_RESPONSE = 500
+EVENTS_PER_RESPONSE = 100
+# The most comments a comment_meta and comment_body page hold
+COMMENT_META_PER_PAGE = 10000
+COMMENT_BODY_PER_PAGE = 1000
+
+# The LiveJournal fault code for an invalid password
+INVALID_PASSWORD_FAULT = 101
+
+WORDS = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing',
+         'elit', 'sed', 'do', 'eiusmod', 'tempor', 'incididunt', 'ut',
+         'labore', 'et', 'dolore', 'magna', 'aliqua', u'caf\xe9', u'na\xefve']
+
+
+###########################
+# Synthetic journal
+###########################
+
+class SyntheticJournal(object):
+  """A journal of generated entries and comments.
+
+  Attributes:
+    username: The name of the journal's user.
+    password: The password of the user.
+    events: The entries, by item ID, each a dictionary as returned by
+        getevents.
+    sync_times: The time each entry was last changed, by item ID.
+    comments: The comments in ID order, each a dictionary of the attributes
+        and elements of the comment export.
+    users: The names of the comment authors, by user ID.
+  """
+
+  def __init__(self, username='testuser', password='testpassword',
+               num_posts=100, num_comments=500, num_users=20, seed=0):
+    self.username = username
+    self.password = password
+    self.events = {}
+    self.sync_times = {}
+    self.comments = []
+    self.users = {}
+    self.last_sync_time = START_TIME
+    self.lock = threading.Lock()
+    self.random = random.Random(seed)
+
+    for user_id in range(1, num_users + 1):
+      self.users[user_id] = 'user%d' % user_id
+    for item_id in range(1, num_posts + 1):
+      self._AddEvent(item_id)
+    for comment_id in range(1, num_comments + 1):
+      self._AddComment(comment_id, num_posts)
+
+  def AddPosts(self, num_posts):
+    """Adds entries after the existing ones."""
+    self.lock.acquire()
+    try:
+      first_id = max([0] + self.events.keys()) + 1
+      for item_id in range(first_id, first_id + num_posts):
+        self._AddEvent(item_id)
+    finally:
+      self.lock.release()
+
+  def AddComments(self, num_comments):
+    """Adds comments after the existing ones."""
+    self.lock.acquire()
+    try:
+      first_id = len(self.comments) + 1
+      for comment_id in range(first_id, first_id + num_comments):
+        self._AddComment(comment_id, len(self.events))
+    finally:
+      self.lock.release()
+
+  def EditPost(self, item_id):
+    """Changes the subject of an entry, making it the last one changed."""
+    self.lock.acquire()
+    try:
+      self.events[item_id]['subject'] += ' (edited)'
+      self.sync_times[item_id] = self._NextSyncTime()
+    finally:
+      self.lock.release()
+
+  def GetMaxCommentId(self):
+    return len(self.comments)
+
+  def _AddEvent(self, item_id):
+    event_time = START_TIME + item_id * 3600
+    event = {'itemid': item_id,
+             'anum': item_id % 256,
+             'eventtime': time.strftime(LJ_TIME_FORMAT,
+                                        time.gmtime(event_time)),
+             'url': 'http://%s.livejournal.com/%d.html' % (self.username,
+                                                            item_id),
+             'subject': 'Post %d' % item_id,
+             'event': self._Text(40, item_id),
+             'props': {}}
+    if item_id % 3:
+      event['props']['taglist'] = ', '.join(self.random.sample(WORDS[:10], 2))
+    if item_id % 10 == 0:
+      # Deleted entries have a sync item, but no event
+      event = None
+    self.events[item_id] = event
+    self.sync_times[item_id] = self._NextSyncTime()
+
+  def _AddComment(self, comment_id, num_posts):
+    comment = {'id': comment_id,
+               'jitemid': self.random.randint(1, num_posts),
+               'posterid': self.random.randint(0, len(self.users)),
+               'state': 'A',
+               'subject': '',
+               'body': self._Text(15, comment_id),
+               'date': time.strftime(COMMENT_TIME_FORMAT,
+                                     time.gmtime(START_TIME + comment_id))}
+    if comment_id % 4 == 0:
+      comment['subject'] = 'Re: comment %d' % (comment_id - 1)
+    if comment_id % 25 == 0:
+      comment['state'] = 'D'
+    self.comments.append(comment)
+
+  def _NextSyncTime(self):
+    # Every change gets its own second, after all earlier changes
+    self.last_sync_time += 1
+    return self.last_sync_time
+
+  def _Text(self, num_words, number):
+    words = [self.random.choice(WORDS) for i in range(num_words)]
+    return (u'<p>%s</p>\r\n<b>%d</b> &amp; more' %
+            (' '.join(words), number)).encode('utf-8')
+
+
+###########################
+# Request handling
+###########################
+
+class FakeLiveJournalHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Answers the requests lj2b makes to a LiveJournal server."""
+
+  protocol_version = 'HTTP/1.1'
+
+  def do_GET(self):
+    self._Handle()
+
+  def do_POST(self):
+    self._Handle()
+
+  def log_message(self, format, *args):
+    if self.server.verbose:
+      BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+  def _Handle(self):
+    path, query = (self.path.split('?', 1) + [''])[:2]
+    body = ''
+    if self.headers.has_key('content-length'):
+      body = self.rfile.read(int(self.headers['content-length']))
+
+    server = self.server
+    if not server.StartRequest(path):
+      self._Respond(503, 'Too many requests', 'text/plain')
+      return
+    try:
+      if server.latency:
+        time.sleep(server.latency * (0.5 + server.Random()))
+      if server.error_rate and server.Random() < server.error_rate:
+        server.Count('errors')
+        self._Respond(500, 'Injected error', 'text/plain')
+        return
+
+      if path == '/interface/xmlrpc':
+        self._HandleXmlRpc(body)
+      elif path == '/interface/flat':
+        self._HandleFlat(body)
+      elif path == '/export_comments.bml':
+        self._HandleExportComments(query)
+      else:
+        self._Respond(404, 'Not found', 'text/plain')
+    finally:
+      server.EndRequest()
+
+  def _Respond(self, status, content, content_type):
+    self.send_response(status)
+    self.send_header('Content-Type', content_type)
+    if (status == 200 and self.server.compress and
+        'gzip' in self.headers.get('Accept-Encoding', '')):
+      compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+      content = compressor.compress(content) + compressor.flush()
+      self.send_header('Content-Encoding', 'gzip')
+      self.server.Count('compressed')
+    self.server.Count('bytes', len(content))
+    self.send_header('Content-Length', str(len(content)))
+    if status == 503:
+      self.send_header('Retry-After', '1')
+    self.end_headers()
+    self.wfile.write(content)
+
+  ###########################
+  # XML-RPC protocol
+  ###########################
+
+  def _HandleXmlRpc(self, body):
+    params, method_name = xmlrpclib.loads(body)
+    try:
+      result = self._Dispatch(method_name, params)
+      response = xmlrpclib.dumps((result,), methodresponse=True)
+    except xmlrpclib.Fault, fault:
+      response = xmlrpclib.dumps(fault, methodresponse=True)
+    self._Respond(200, response, 'text/xml')
+
+  def _Dispatch(self, method_name, params, prefix=''):
+    self.server.Count(prefix + method_name)
+    if method_name == 'system.multicall' and self.server.multicall:
+      method = self._Multicall
+    elif method_name.startswith('LJ.XMLRPC.'):
+      method = getattr(self, '_Lj%s' % method_name.split('.')[-1], None)
+    else:
+      method = None
+    if method is None:
+      raise xmlrpclib.Fault(1, 'Unknown method %s' % method_name)
+    return method(*params)
+
+  def _Multicall(self, calls):
+    results = []
+    for call in calls:
+      try:
+        results.append([self._Dispatch(call['methodName'], call['params'],
+                                       'multicall.')])
+      except xmlrpclib.Fault, fault:
+        results.append({'faultCode': fault.faultCode,
+                        'faultString': fault.faultString})
+    return results
+
+  def _Ljgetchallenge(self):
+    challenge = self.server.NewChallenge()
+    now = int(time.time())
+    return {'challenge': challenge,
+            'server_time': now,
+            'expire_time': now + 60,
+            'auth_scheme': 'c0'}
+
+  def _Ljsyncitems(self, request):
+    self._CheckAuth(request)
+    journal = self.server.journal
+    last_sync = request.get('lastsync', '')
+    journal.lock.acquire()
+    try:
+      changes = [(sync_time, item_id)
+                 for item_id, sync_time in journal.sync_times.items()
+                 if self._LjTime(sync_time) > last_sync]
+    finally:
+      journal.lock.release()
+    changes.sort()
+    items = [{'item': 'L-%d' % item_id,
+              'action': 'update',
+              'time': self._LjTime(sync_time)}
+             for sync_time, item_id in changes[:SYNCITEMS_PER_RESPONSE]]
+    return {'syncitems': items, 'count': len(items), 'total': len(changes)}
+
+  def _Ljgetevents(self, request):
+    self._CheckAuth(request)
+    journal = self.server.journal
+    journal.lock.acquire()
+    try:
+      if request.get('selecttype') == 'one':
+        item_ids = [int(request['itemid'])]
+      elif request.get('selecttype') == 'syncitems':
+        last_sync = request.get('lastsync', '')
+        changes = [(sync_time, item_id)
+                   for item_id, sync_time in journal.sync_times.items()
+                   if self._LjTime(sync_time) > last_sync]
+        changes.sort()
+        item_ids = [item_id for sync_time, item_id in changes]
+      else:
+        raise xmlrpclib.Fault(203, 'Invalid selecttype')
+      events = []
+      for item_id in item_ids:
+        event = journal.events.get(item_id, None)
+        if event:
+          events.append(self._EncodeEvent(event))
+        if len(events) == EVENTS_PER_RESPONSE:
+          break
+    finally:
+      journal.lock.release()
+    return {'events': events}
+
+  def _EncodeEvent(self, event):
+    # Like LiveJournal, send text that is not ASCII as binary
+    encoded = event.copy()
+    encoded['props'] = event['props'].copy()
+    for name in ['event', 'subject']:
+      encoded[name] = self._Encode(event[name])
+    if encoded['props'].has_key('taglist'):
+      encoded['props']['taglist'] = self._Encode(event['props']['taglist'])
+    return encoded
+
+  def _Encode(self, text):
+    try:
+      text.decode('ascii')
+      return text
+    except UnicodeError:
+      return xmlrpclib.Binary(text)
+
+  def _CheckAuth(self, request):
+    """Raises a fault unless the request is authenticated by a challenge
+    response or a session cookie.
+    """
+    journal = self.server.journal
+    if request.get('username') != journal.username:
+      raise xmlrpclib.Fault(100, 'Invalid username')
+    if request.get('auth_method') == 'challenge':
+      challenge = request.get('auth_challenge', '')
+      if not self.server.UseChallenge(challenge):
+        raise xmlrpclib.Fault(105, 'Challenge expired')
+      if request.get('auth_response') != self.server.HashChallenge(challenge):
+        raise xmlrpclib.Fault(INVALID_PASSWORD_FAULT, 'Invalid password')
+    elif request.get('auth_method') == 'cookie':
+      if (self.headers.get('X-LJ-Auth', None) != 'cookie' or
+          not self.server.IsSession(self._GetSession())):
+        raise xmlrpclib.Fault(INVALID_PASSWORD_FAULT, 'Invalid password')
+    else:
+      raise xmlrpclib.Fault(INVALID_PASSWORD_FAULT, 'Invalid password')
+
+  def _GetSession(self):
+    for cookie in self.headers.get('Cookie', '').split(';'):
+      name, value = (cookie.strip().split('=', 1) + [''])[:2]
+      if name == 'ljsession':
+        return value
+    return None
+
+  def _LjTime(self, seconds):
+    return time.strftime(LJ_TIME_FORMAT, time.gmtime(seconds))
+
+  ###########################
+  # Flat protocol
+  ###########################
+
+  def _HandleFlat(self, body):
+    form = dict([(name, values[0])
+                 for name, values in cgi.parse_qs(body).items()])
+    mode = form.get('mode', '')
+    self.server.Count('flat.%s' % mode)
+    if mode == 'getchallenge':
+      result = {'challenge': self.server.NewChallenge(),
+                'success': 'OK'}
+    elif mode == 'sessiongenerate':
+      challenge = form.get('auth_challenge', '')
+      if (form.get('user') == self.server.journal.username and
+          self.server.UseChallenge(challenge) and
+          form.get('auth_response') == self.server.HashChallenge(challenge)):
+        result = {'ljsession': self.server.NewSession(),
+                  'success': 'OK'}
+      else:
+        result = {'success': 'FAIL', 'errmsg': 'Invalid password'}
+    else:
+      result = {'success': 'FAIL', 'errmsg': 'Unknown mode'}
+
+    lines = []
+    for name, value in result.items():
+      lines.extend([name, value])
+    self._Respond(200, '\n'.join(lines) + '\n', 'text/plain')
+
+  ###########################
+  # Comment export
+  ###########################
+
+  def _HandleExportComments(self, query):
+    form = dict([(name, values[0])
+                 for name, values in cgi.parse_qs(query).items()])
+    get = form.get('get', '')
+    self.server.Count(get)
+    if not self.server.IsSession(self._GetSession()):
+      # Like LiveJournal, answer with a login page
+      self._Respond(200, '<html><body>Please log in<br></body></html>',
+                    'text/html')
+      return
+
+    journal = self.server.journal
+    start_id = max(int(form.get('startid', '0')), 1)
+    journal.lock.acquire()
+    try:
+      comments = journal.comments[start_id - 1:]
+      max_id = journal.GetMaxCommentId()
+    finally:
+      journal.lock.release()
+
+    lines = ['<?xml version="1.0" encoding="utf-8"?>', '<livejournal>']
+    if get == 'comment_meta':
+      lines.append('<maxid>%d</maxid>' % max_id)
+      lines.append('<comments>')
+      for comment in comments[:COMMENT_META_PER_PAGE]:
+        lines.append('<comment %s />' % self._CommentAttributes(comment))
+      lines.append('</comments>')
+      lines.append('<usermaps>')
+      user_ids = journal.users.keys()
+      user_ids.sort()
+      for user_id in user_ids:
+        lines.append('<usermap id="%d" user=%s />' %
+                     (user_id, quoteattr(journal.users[user_id])))
+      lines.append('</usermaps>')
+    elif get == 'comment_body':
+      lines.append('<comments>')
+      for comment in comments[:COMMENT_BODY_PER_PAGE]:
+        lines.append('<comment %s>' % self._CommentAttributes(comment))
+        if comment['subject']:
+          lines.append('<subject>%s</subject>' % escape(comment['subject']))
+        lines.append('<body>%s</body>' % escape(comment['body']))
+        lines.append('<date>%s</date>' % comment['date'])
+        lines.append('</comment>')
+      lines.append('</comments>')
+    lines.append('</livejournal>')
+    self._Respond(200, '\n'.join(lines), 'text/xml; charset=utf-8')
+
+  def _CommentAttributes(self, comment):
+    attrs = 'id="%d" jitemid="%d"' % (comment['id'], comment['jitemid'])
+    if comment['posterid']:
+      attrs += ' posterid="%d"' % comment['posterid']
+    if comment['state'] != 'A':
+      attrs += ' state="%s"' % comment['state']
+    return attrs
+
+
+###########################
+# Server
+###########################
+
+class FakeLiveJournalServer(SocketServer.ThreadingMixIn,
+                            BaseHTTPServer.HTTPServer):
+  """Serves a SyntheticJournal, each request in its own thread.
+
+  Attributes:
+    stats: The number of requests by method or page, and of calls packed
+        into system.multicall requests by 'multicall.' and method, along
+        with the number of injected 'errors', of 'throttled' and
+        'compressed' responses, the 'bytes' of response bodies sent, and
+        the 'peak' number of requests handled at once.
+  """
+
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def __init__(self, journal, port=0, latency=0, error_rate=0,
+               max_concurrent=None, session_lifetime=None, compress=False,
+               multicall=True, seed=0, verbose=False):
+    """Starts listening on localhost.
+
+    Args:
+      journal: The SyntheticJournal to serve.
+      port: The port to listen on, or 0 for any free port.
+      latency: The average seconds added to each response.
+      error_rate: The share of requests failed with a 500 status.
+      max_concurrent: The number of requests handled at once, beyond which
+          requests are throttled with a 503 status.  None for no limit.
+      session_lifetime: The seconds after which a session stops being
+          accepted.  None for sessions that never expire.
+      compress: Whether to gzip the responses to clients accepting it.
+      multicall: Whether to support system.multicall.
+      seed: The seed of the random latencies and errors.
+      verbose: Whether to log every request.
+    """
+    BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', port),
+                                       FakeLiveJournalHandler)
+    self.journal = journal
+    self.latency = latency
+    self.error_rate = error_rate
+    self.max_concurrent = max_concurrent
+    self.session_lifetime = session_lifetime
+    self.compress = compress
+    self.multicall = multicall
+    self.verbose = verbose
+    self.random = random.Random(seed)
+    self.challenges = {}
+    self.sessions = {}
+    self.num_active = 0
+    self.stats = {}
+    self.lock = threading.Lock()
+    self.thread = None
+
+  def GetHost(self):
+    """Returns the host name and port to give lj2b as the server."""
+    return '%s:%d' % self.server_address
+
+  def Start(self):
+    """Serves requests in a background thread."""
+    self.thread = threading.Thread(target=self.serve_forever)
+    self.thread.setDaemon(True)
+    self.thread.start()
+
+  def Stop(self):
+    """Stops serving requests and closes the socket."""
+    self.shutdown()
+    self.server_close()
+
+  def StartRequest(self, path):
+    """Counts a request, returning False if it should be throttled."""
+    self.lock.acquire()
+    try:
+      if (self.max_concurrent is not None and
+          self.num_active >= self.max_concurrent):
+        self.stats['throttled'] = self.stats.get('throttled', 0) + 1
+        return False
+      self.num_active += 1
+      self.stats['peak'] = max(self.stats.get('peak', 0), self.num_active)
+      return True
+    finally:
+      self.lock.release()
+
+  def EndRequest(self):
+    self.lock.acquire()
+    self.num_active -= 1
+    self.lock.release()
+
+  def Count(self, name, amount=1):
+    self.lock.acquire()
+    self.stats[name] = self.stats.get(name, 0) + amount
+    self.lock.release()
+
+  def Random(self):
+    self.lock.acquire()
+    try:
+      return self.random.random()
+    finally:
+      self.lock.release()
+
+  def NewChallenge(self):
+    self.lock.acquire()
+    try:
+      challenge = 'c0:%d:%d' % (time.time(), self.random.getrandbits(64))
+      self.challenges[challenge] = True
+      return challenge
+    finally:
+      self.lock.release()
+
+  def UseChallenge(self, challenge):
+    """Returns whether the challenge was issued and not used before."""
+    self.lock.acquire()
+    try:
+      return self.challenges.pop(challenge, False)
+    finally:
+      self.lock.release()
+
+  def HashChallenge(self, challenge):
+    password_hash = md5.new(self.journal.password).hexdigest()
+    return md5.new(challenge + password_hash).hexdigest()
+
+  def NewSession(self):
+    self.lock.acquire()
+    try:
+      session = 'v1:u%d:s%d:a%x' % (len(self.sessions) + 1,
+                                    len(self.sessions) + 1,
+                                    self.random.getrandbits(64))
+      self.sessions[session] = time.time()
+      return session
+    finally:
+      self.lock.release()
+
+  def IsSession(self, session):
+    """Returns whether the session exists and has not expired."""
+    self.lock.acquire()
+    try:
+      created = self.sessions.get(session, None)
+    finally:
+      self.lock.release()
+    if created is None:
+      return False
+    return (self.session_lifetime is None or
+            time.time() < created + self.session_lifetime)
+
+  def ExpireSessions(self):
+    """Makes every session given out so far invalid."""
+    self.lock.acquire()
+    self.sessions.clear()
+    self.lock.release()
+
+
+def usage():
+  return ('Usage: %s [-p <port>] [--posts <count>] [--comments <count>]\n'
+          '       [--latency <seconds>] [--error-rate <fraction>]\n'
+          '       [--max-concurrent <requests>] [--compress]\n\n'
+          ' Serves a synthetic journal for the user testuser, with the\n'
+          ' password testpassword, until interrupted.' %
+          os.path.basename(sys.argv[0]))
+
+if __name__ == '__main__':
+
+  # parse command line options
+  try:
+    opts, args = getopt.getopt(
+        sys.argv[1:], 'p:',
+        ['port=', 'posts=', 'comments=', 'latency=', 'error-rate=',
+         'max-concurrent=', 'compress'])
+  except getopt.error, msg:
+    print usage()
+    sys.exit(2)
+
+  port = 8080
+  num_posts = 100
+  num_comments = 500
+  options = {'verbose': True}
+  for opt, arg in opts:
+    if opt in ['-p', '--port']:
+      port = int(arg)
+    elif opt == '--posts':
+      num_posts = int(arg)
+    elif opt == '--comments':
+      num_comments = int(arg)
+    elif opt == '--latency':
+      options['latency'] = float(arg)
+    elif opt == '--error-rate':
+      options['error_rate'] = float(arg)
+    elif opt == '--max-concurrent':
+      options['max_concurrent'] = int(arg)
+    elif opt == '--compress':
+      options['compress'] = True
+
+  journal = SyntheticJournal(num_posts=num_posts, num_comments=num_comments)
+  server = FakeLiveJournalServer(journal, port, **options)
+  print 'Serving on %s' % server.GetHost()
+  server.serve_forever()
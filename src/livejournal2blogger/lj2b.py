@@ -14,18 +14,28 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import array
+import base64
+import calendar
+import cPickle
 import getopt
+import httplib
 import logging
 import md5
 import os
 import os.path
+import random
 import re
+import socket
 import sys
+import threading
 import time
 import traceback
 import urllib2
+import urlparse
 import xmlrpclib
-import xml.dom.minidom
+import zlib
+from xml.parsers import expat
 
 import gdata
 from gdata import atom
@@ -36,6 +46,10 @@ try:
 except ImportError:
   ON_GAE = False
 
+# The first call of time.strptime imports a module, which is not safe to do
+# from several worker threads at once
+time.strptime('2008', '%Y')
+
 
 __author__ = 'JJ Lueck (jlueck@gmail.com)'
 
@@ -51,6 +65,35 @@ ATOM_TYPE = 'application/atom+xml'
 HTML_TYPE = 'text/html'
 ATOM_THREADING_NS = 'http://purl.org/syndication/thread/1.0'
 DUMMY_URI = 'http://www.blogger.com/'
+LJ_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# The number of journal entries requested with one getevents call, and the
+# number of single-entry getevents calls packed into one system.multicall
+EVENTS_PER_REQUEST = 100
+# The number of times a request fails, or is throttled, before the
+# translation gives up
+MAX_FAILURES = 8
+# The seconds to wait before retrying a request the first time, doubled for
+# every further retry up to the maximum
+INITIAL_BACKOFF = 0.5
+MAX_BACKOFF = 30
+# How many times slower than the fastest request seen a request has to be
+# to count as a sign of an overloaded server
+SLOW_REQUEST_FACTOR = 4
+# The compressed encodings asked for, and the bytes of a response body read
+# and decompressed at a time
+ACCEPT_ENCODING = 'gzip, deflate'
+READ_SIZE = 64 * 1024
+# The number of comments the server returns per comment_meta and
+# comment_body page of the comment export
+COMMENT_META_PAGE_SIZE = 10000
+COMMENT_BODY_PAGE_SIZE = 1000
+# The seconds a session is used for.  Sessions generated with the default
+# short expiration last a day on the server; they are renewed an hour early.
+SESSION_LIFETIME = 23 * 60 * 60
+# The LiveJournal fault codes for an invalid password and for an expired
+# challenge, which are also returned when a session is no longer valid.
+AUTH_FAULT_CODES = (101, 105)
 
 
 ###########################
@@ -93,51 +136,494 @@ class InReplyTo(atom.ExtensionElement):
 ###########################
 
 class UserMap(object):
+  """Maps comment IDs to the names of their authors.
+
+  A busy journal has millions of comments by far fewer users, so each name
+  is kept once in a table, and the comments only hold the index of their
+  author's name in an array indexed by comment ID.  Comment IDs are mostly
+  consecutive, so the array takes about four bytes per comment.
+  """
+
+  # The index of comments without an author
+  NO_USER = -1
 
   def __init__(self):
-    self.comment2user = {}
+    self.names = []
+    self.name_indexes = {}
+    self.first_id = None
+    self.user_indexes = array.array('i')
     self.max_id = -1
 
-  def Add(self, xml_map):
-    self._ReadMap(xml_map)
+  def Add(self, page):
+    self._ReadMap(page)
 
   def GetUser(self, comment_id):
-    return self.comment2user.get(comment_id, None)
+    if self.first_id is None:
+      return None
+    offset = int(comment_id) - self.first_id
+    if offset < 0 or offset >= len(self.user_indexes):
+      return None
+    name_index = self.user_indexes[offset]
+    if name_index == self.NO_USER:
+      return None
+    return self.names[name_index]
 
   def GetLargestId(self):
     return self.max_id
 
-  def _ReadMap(self, xml_map):
-    # One half of the XML document contains a map between user ID and
-    # the user's name.  Build a user_map with this mapping
-    users = xml_map.getElementsByTagName('usermap')
-    user_map = dict([(user.getAttribute('id'),
-                      user.getAttribute('user')) for user in users])
-
-    # The other half of the XML document contains a map between the
-    # comment ID and comment authors
-    comments = xml_map.getElementsByTagName('comment')
-    for comment in comments:
-      comment_id = comment.getAttribute('id')
-      user_id = comment.getAttribute('posterid')
+  def _ReadMap(self, page):
+    # One half of the page contains a map between user ID and the user's
+    # name, which the page collected into its users dictionary
+    user_map = page.users
+
+    # The other half of the page contains a map between the comment ID and
+    # comment authors
+    for comment in page.comments:
+      comment_id = int(comment['id'])
+      user_id = comment.get('posterid', None)
       if user_id:
-        self.comment2user[comment_id] = user_map[user_id]
+        self._SetUser(comment_id, user_map[user_id])
       else:
-        self.comment2user[comment_id] = 'Anonymous'
-      self.max_id = max(int(comment_id), self.max_id)
+        self._SetUser(comment_id, 'Anonymous')
+      self.max_id = max(comment_id, self.max_id)
+
+  def _SetUser(self, comment_id, name):
+    name_index = self.name_indexes.get(name, None)
+    if name_index is None:
+      name_index = len(self.names)
+      self.names.append(name)
+      self.name_indexes[name] = name_index
+
+    if self.first_id is None:
+      self.first_id = comment_id
+    elif comment_id < self.first_id:
+      # Pages normally come in order, so this is rare
+      self.user_indexes = (
+          array.array('i', [self.NO_USER] * (self.first_id - comment_id)) +
+          self.user_indexes)
+      self.first_id = comment_id
+    offset = comment_id - self.first_id
+    if offset >= len(self.user_indexes):
+      self.user_indexes.extend(
+          [self.NO_USER] * (offset + 1 - len(self.user_indexes)))
+    self.user_indexes[offset] = name_index
+
+
+###########################
+# Helper CommentPage class
+###########################
+
+class CommentPage(object):
+  """A page of the comment export, read with expat rather than into a DOM.
+
+  Attributes:
+    max_id: The largest comment ID of the journal, if the page gives it.
+    users: A dictionary of user names by user ID.
+    comments: The comments of the page, in order, each a dictionary of the
+        attributes of its comment element and of the text of its subject,
+        body and date elements.
+  """
+
+  # The elements whose text is kept
+  TEXT_ELEMENTS = ['maxid', 'subject', 'body', 'date']
+
+  def __init__(self, data):
+    """Parses the page, raising expat.ExpatError if it is not XML."""
+    self.max_id = None
+    self.users = {}
+    self.comments = []
+    self.comment = None
+    self.text = None
+
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.StartElementHandler = self._StartElement
+    parser.EndElementHandler = self._EndElement
+    parser.CharacterDataHandler = self._CharacterData
+    parser.Parse(data, True)
+    del self.comment, self.text
+
+  def _StartElement(self, name, attrs):
+    if name == 'comment':
+      self.comment = attrs
+    elif name == 'usermap':
+      self.users[attrs.get('id')] = attrs.get('user')
+    elif name in self.TEXT_ELEMENTS:
+      self.text = []
+
+  def _EndElement(self, name):
+    if name == 'comment':
+      self.comments.append(self.comment)
+      self.comment = None
+    elif name == 'maxid':
+      self.max_id = int(''.join(self.text))
+      self.text = None
+    elif name in self.TEXT_ELEMENTS:
+      if self.comment is not None:
+        self.comment[name] = ''.join(self.text)
+      self.text = None
+
+  def _CharacterData(self, data):
+    if self.text is not None:
+      self.text.append(data)
+
+
+###########################
+# Helper XML-RPC parsing
+###########################
+
+class LazyBinary(xmlrpclib.Binary):
+  """A base64 value of an XML-RPC response, decoded when its data is first
+  read rather than when the response is parsed.
+  """
+
+  def __init__(self, encoded):
+    self.encoded = encoded
+
+  def __getattr__(self, name):
+    if name != 'data':
+      raise AttributeError(name)
+    self.data = base64.decodestring(self.encoded)
+    del self.encoded
+    return self.data
+
+
+class LazyUnmarshaller(xmlrpclib.Unmarshaller):
+  """Unmarshals XML-RPC responses, keeping base64 values as LazyBinary."""
+
+  dispatch = xmlrpclib.Unmarshaller.dispatch.copy()
+
+  def end_base64(self, data):
+    self.append(LazyBinary(data))
+    self._value = 0
+  dispatch['base64'] = end_base64
+
+
+class ResponseParser(object):
+  """Feeds an XML-RPC response to an unmarshaller piece by piece, as it is
+  read from the connection.  Like xmlrpclib.ExpatParser, but with the text
+  of each element handed over at once rather than a line at a time.
+  """
+
+  def __init__(self, target):
+    self.parser = expat.ParserCreate()
+    self.parser.buffer_text = True
+    self.parser.StartElementHandler = target.start
+    self.parser.EndElementHandler = target.end
+    self.parser.CharacterDataHandler = target.data
+    encoding = None
+    if not self.parser.returns_unicode:
+      encoding = 'utf-8'
+    target.xml(encoding, None)
+
+  def feed(self, data):
+    self.parser.Parse(data, False)
+
+  def close(self):
+    self.parser.Parse('', True)
+
+
+def GetResponseParser():
+  """Returns a parser and unmarshaller pair, like xmlrpclib.getparser."""
+  unmarshaller = LazyUnmarshaller()
+  return ResponseParser(unmarshaller), unmarshaller
 
 
 ###########################
 # Helper URL fetching
 ###########################
 
+class ContentDecoder(object):
+  """Decompresses a response body piece by piece, according to its
+  Content-Encoding.
+  """
+
+  def __init__(self, content_encoding):
+    content_encoding = (content_encoding or '').strip().lower()
+    if content_encoding in ['gzip', 'x-gzip']:
+      # The window bits of zlib for a gzip header and trailer
+      self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif content_encoding == 'deflate':
+      self.decompressor = zlib.decompressobj()
+    else:
+      self.decompressor = None
+    self.deflate = content_encoding == 'deflate'
+    self.started = False
+
+  def Decode(self, data):
+    """Returns the decompressed data of the next piece of the body."""
+    if self.decompressor is None or not data:
+      return data
+    if not self.started:
+      self.started = True
+      try:
+        return self.decompressor.decompress(data)
+      except zlib.error:
+        if not self.deflate:
+          raise
+        # Some servers send deflate data without the zlib header
+        self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    return self.decompressor.decompress(data)
+
+  def Flush(self):
+    """Returns the rest of the decompressed data, once the body is read."""
+    if self.decompressor is None:
+      return ''
+    return self.decompressor.flush()
+
+
+class ConnectionPool(object):
+  """Keeps persistent HTTP/1.1 connections open for reuse by later requests.
+
+  Each host gets at most max_connections connections.  A request made while
+  all of them are busy waits for one of them to be done.  Compressed
+  responses are asked for, and decompressed as they are read.
+  """
+
+  def __init__(self, max_connections=1):
+    self.max_connections = max_connections
+    # The idle connections and the number of open connections, by the
+    # scheme and host they connect to
+    self.idle = {}
+    self.num_open = {}
+    self.condition = threading.Condition()
+
+  def Request(self, method, url, body=None, headers={}, parser=None):
+    """Makes an HTTP request over a pooled connection.
+
+    A request failing on a reused connection, which the server may have
+    closed while it was idle, is retried once on a new connection.
+
+    Args:
+      parser: An object whose feed method is given the decompressed data of
+          a successful response as it arrives, rather than collecting it.
+    Returns:
+      A tuple of the httplib response and the decompressed data it
+      contained, or None if the data was fed to the parser.
+    """
+    scheme, host, path, query, fragment = urlparse.urlsplit(url)
+    if query:
+      path = '%s?%s' % (path, query)
+    key = (scheme, host)
+    headers = headers.copy()
+    headers.setdefault('Accept-Encoding', ACCEPT_ENCODING)
+
+    connection, reused = self._Acquire(key)
+    try:
+      try:
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+      except (httplib.HTTPException, socket.error):
+        if not reused:
+          raise
+        connection.close()
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+      if parser is not None and response.status == 200:
+        data = self._ReadBody(response, parser)
+      else:
+        data = self._ReadBody(response)
+    except:
+      self._Release(key, connection, False)
+      raise
+    self._Release(key, connection, not response.will_close)
+    return response, data
+
+  def _ReadBody(self, response, parser=None):
+    """Reads the body of a response, decompressing it as it arrives.  The
+    pieces are fed to the parser if there is one, or else returned joined.
+    """
+    decoder = ContentDecoder(response.getheader('Content-Encoding', None))
+    if parser is None:
+      pieces = []
+      feed = pieces.append
+    else:
+      feed = parser.feed
+    while True:
+      data = response.read(READ_SIZE)
+      if not data:
+        break
+      feed(decoder.Decode(data))
+    feed(decoder.Flush())
+    if parser is None:
+      return ''.join(pieces)
+    return None
+
+  def _Acquire(self, key):
+    """Returns an idle or new connection to a host, waiting for one if the
+    host has max_connections busy connections.  Also returns whether the
+    connection was used before.
+    """
+    self.condition.acquire()
+    try:
+      while True:
+        idle = self.idle.get(key, None)
+        if idle:
+          return idle.pop(), True
+        if self.num_open.get(key, 0) < self.max_connections:
+          self.num_open[key] = self.num_open.get(key, 0) + 1
+          break
+        self.condition.wait()
+    finally:
+      self.condition.release()
+
+    scheme, host = key
+    if scheme == 'https':
+      return httplib.HTTPSConnection(host), False
+    return httplib.HTTPConnection(host), False
+
+  def _Release(self, key, connection, keep_alive):
+    """Puts a connection back into the pool, or closes it."""
+    self.condition.acquire()
+    try:
+      if keep_alive:
+        self.idle.setdefault(key, []).append(connection)
+      else:
+        connection.close()
+        self.num_open[key] -= 1
+      self.condition.notify()
+    finally:
+      self.condition.release()
+
+
+class ReplayMiss(Exception):
+  """Raised when a replayed request was not recorded."""
+
+
+class TooManyFailures(Exception):
+  """Raised when a request failed too many times to be retried again.
+
+  Attributes:
+    error: The exception of the last failure.
+  """
+
+  def __init__(self, name, error):
+    Exception.__init__(self, '%s failed %d times, last with: %s' %
+                       (name, MAX_FAILURES, error))
+    self.error = error
+
+
+class CachedConnectionPool(ConnectionPool):
+  """A ConnectionPool that records its traffic, or replays recorded traffic
+  without any network.
+
+  Successful responses are stored in a directory, each in a file named by
+  the MD5 hash of its content, so that identical responses are stored once.
+  An index file lists the hash of each request, of its method, URL and
+  body, along with the hash of its response.  A request made several times
+  is replayed with its responses in the order they were recorded, the last
+  one repeating.  Recording again starts a new index.
+  """
+
+  INDEX_FILE = 'index'
+
+  def __init__(self, directory, replay=False, max_connections=1):
+    """Opens the traffic directory.
+
+    Args:
+      directory: The directory holding the recorded traffic.
+      replay: Whether to replay the recorded traffic rather than record it.
+      max_connections: The connections kept per host when recording.
+    """
+    ConnectionPool.__init__(self, max_connections)
+    self.directory = directory
+    self.replay = replay
+    self.lock = threading.Lock()
+    index_filename = os.path.join(directory, self.INDEX_FILE)
+    # The hashes of the responses by request hash, and the number of times
+    # each request was replayed
+    self.responses = {}
+    self.num_replayed = {}
+    if replay:
+      for line in open(index_filename):
+        request_hash, response_hash = line.split()
+        self.responses.setdefault(request_hash, []).append(response_hash)
+    else:
+      if not os.path.isdir(directory):
+        os.makedirs(directory)
+      self.index = open(index_filename, 'w')
+
+  def Request(self, method, url, body=None, headers={}, parser=None):
+    request_hash = md5.new('%s\n%s\n%s' % (method, url, body or '')).hexdigest()
+    if self.replay:
+      response = self._Replay(request_hash, url)
+      data = response.data
+    else:
+      response, data = ConnectionPool.Request(self, method, url, body, headers)
+      if response.status == 200:
+        self._Record(request_hash, response, data)
+    if parser is not None and response.status == 200:
+      parser.feed(data)
+      return response, None
+    return response, data
+
+  def _Record(self, request_hash, response, data):
+    content = '%s\n%s\n%s' % (response.status, response.reason,
+                               response.getheader('Content-Type', ''))
+    content = '%s\n\n%s' % (content, data)
+    response_hash = md5.new(content).hexdigest()
+    filename = os.path.join(self.directory, response_hash)
+    if not os.path.exists(filename):
+      # Written under another name first, so that a file under its hash is
+      # always complete
+      temp_filename = '%s.%s.tmp' % (filename,
+                                     threading.currentThread().getName())
+      outfile = open(temp_filename, 'wb')
+      outfile.write(content)
+      outfile.close()
+      os.rename(temp_filename, filename)
+    self.lock.acquire()
+    try:
+      self.index.write('%s %s\n' % (request_hash, response_hash))
+      self.index.flush()
+    finally:
+      self.lock.release()
+
+  def _Replay(self, request_hash, url):
+    self.lock.acquire()
+    try:
+      response_hashes = self.responses.get(request_hash, None)
+      if not response_hashes:
+        raise ReplayMiss('No recorded response for %s' % url)
+      count = self.num_replayed.get(request_hash, 0)
+      self.num_replayed[request_hash] = count + 1
+      response_hash = response_hashes[min(count, len(response_hashes) - 1)]
+    finally:
+      self.lock.release()
+    infile = open(os.path.join(self.directory, response_hash), 'rb')
+    try:
+      content = infile.read()
+    finally:
+      infile.close()
+    return RecordedResponse(content)
+
+
+class RecordedResponse(object):
+  """A response replayed by a CachedConnectionPool, standing in for an
+  httplib response.
+  """
+
+  def __init__(self, content):
+    header, self.data = content.split('\n\n', 1)
+    status, self.reason, content_type = header.split('\n')
+    self.status = int(status)
+    self.msg = {'Content-Type': content_type}
+    self.will_close = False
+
+  def getheader(self, name, default=None):
+    return self.msg.get(name, default)
+
+
 class UrlFetcherFactory(object):
 
+  def __init__(self, connection_pool=None):
+    self.connection_pool = connection_pool
+
   def newUrlFetcher(self):
     if ON_GAE:
       return GaeUrlFetcher()
     else:
-      return NativeUrlFetcher()
+      return NativeUrlFetcher(self.connection_pool or ConnectionPool())
 
   def fetch(url, payload, headers={}):
     pass
@@ -146,19 +632,579 @@ class UrlFetcherFactory(object):
 class GaeUrlFetcher(object):
 
   def fetch(self, url, payload, headers={}):
+    headers = headers.copy()
+    headers.setdefault('Accept-Encoding', ACCEPT_ENCODING)
     response = urlfetch.fetch(url, payload, 'POST', headers)
-    return response.content
+    # urlfetch returns the whole body at once, and may have decompressed it
+    # already
+    decoder = ContentDecoder(response.headers.get('Content-Encoding', None))
+    try:
+      return decoder.Decode(response.content) + decoder.Flush()
+    except zlib.error:
+      return response.content
 
 
 class NativeUrlFetcher(object):
 
+  def __init__(self, connection_pool):
+    self.connection_pool = connection_pool
+
   def fetch(self, url, payload, headers={}):
-    response = urllib2.urlopen(urllib2.Request(url, payload, headers=headers))
-    data = response.read()
-    response.close()
+    headers = headers.copy()
+    if payload is None:
+      method = 'GET'
+    else:
+      method = 'POST'
+      headers.setdefault('Content-Type', 'application/x-www-form-urlencoded')
+    response, data = self.connection_pool.Request(method, url, payload,
+                                                  headers)
+    if response.status != 200:
+      raise urllib2.HTTPError(url, response.status, response.reason,
+                              response.msg, None)
     return data
 
 
+class PooledTransport(xmlrpclib.Transport):
+  """An XML-RPC transport sending its requests over pooled connections.
+
+  Extra headers, such as session cookies, can be set for the requests.
+  Responses are parsed as they are read, with base64 values left encoded
+  until they are used.
+  """
+
+  headers = {}
+
+  def __init__(self, connection_pool):
+    self.connection_pool = connection_pool
+
+  def request(self, host, handler, request_body, verbose=0):
+    headers = {'Content-Type': 'text/xml', 'User-Agent': self.user_agent}
+    headers.update(self.headers)
+    parser, unmarshaller = self.getparser()
+    response, data = self.connection_pool.Request(
+        'POST', 'http://%s%s' % (host, handler), request_body, headers,
+        parser)
+    if response.status != 200:
+      raise xmlrpclib.ProtocolError(host + handler, response.status,
+                                    response.reason, response.msg)
+    parser.close()
+    return unmarshaller.close()
+
+  def getparser(self):
+    return GetResponseParser()
+
+
+###########################
+# Helper authentication
+###########################
+
+class LjCredentials(object):
+  """Authenticates requests to a LiveJournal server.
+
+  A session is generated once, through the flat protocol, and its ljsession
+  cookie authenticates all further HTTP and XML-RPC requests until it
+  expires or the server refuses it.  Challenges are thus only needed to
+  generate sessions, rather than one for every request.
+  """
+
+  def __init__(self, username, password, server_name, url_fetcher):
+    self.username = username
+    self.password = password
+    self.server_name = server_name
+    self.url_fetcher = url_fetcher
+    self.session = None
+    self.session_expiry = 0
+    self.lock = threading.Lock()
+
+  def GetSession(self):
+    """Returns the current session, generating a new one if needed."""
+    self.lock.acquire()
+    try:
+      if self.session is None or time.time() >= self.session_expiry:
+        self.session = self._GenerateSession()
+        self.session_expiry = time.time() + SESSION_LIFETIME
+      return self.session
+    finally:
+      self.lock.release()
+
+  def ExpireSession(self, session):
+    """Forgets a session refused by the server.
+
+    Threads that were refused the same session at the same time expire it
+    only once, so a single new session gets generated.
+    """
+    self.lock.acquire()
+    try:
+      if self.session == session:
+        self.session = None
+    finally:
+      self.lock.release()
+
+  def GetSessionHeaders(self, session):
+    """Returns the HTTP headers authenticating a request with a session."""
+    return {'Cookie': 'ljsession=%s' % session, 'X-LJ-Auth': 'cookie'}
+
+  def _GenerateSession(self):
+    """Returns a new session, generated with the flat protocol."""
+    request_url = 'http://%s/interface/flat' % self.server_name
+
+    # The first request is used to obtain the challenge token
+    start_time = time.time()
+    response = self.url_fetcher.fetch(request_url, 'mode=getchallenge')
+    challenge = self._ResponseToDict(response)['challenge']
+
+    # The second request is to actually generate the session cookie by
+    # responding to the challenge
+    challenge_response = self._HashChallenge(challenge)
+    response = self.url_fetcher.fetch(
+        request_url, ('mode=sessiongenerate&auth_method=challenge&'
+                      'user=%s&auth_challenge=%s&auth_response=%s' %
+                      (self.username, challenge, challenge_response)))
+    result = self._ResponseToDict(response)
+
+    if result.get('errmsg', None):
+      # Report the refused login the way the XML-RPC protocol would, which
+      # is usually an incorrect password
+      raise xmlrpclib.Fault(AUTH_FAULT_CODES[0], result['errmsg'])
+    logging.info('Generating session: %d ms' %
+                 ((time.time() - start_time) * 1000))
+    return result['ljsession']
+
+  def _ResponseToDict(self, contents):
+    """Takes the result of a request to the LiveJournal flat XML-RPC
+    protocol and transforms the key/value pairs into a dictionary.
+    """
+    elems = contents.split('\n')
+    # This little bit of Python wizardry turns a list of elements into
+    # key value pairs.
+    return dict(zip(elems[::2], elems[1::2]))
+
+  def _HashChallenge(self, challenge):
+    """Hashes the challege with the password to produce the challenge
+    response.
+    """
+    return md5.new(challenge + md5.new(self.password).hexdigest()).hexdigest()
+
+
+###########################
+# Helper checkpointing
+###########################
+
+class Checkpoint(object):
+  """Records the progress of an export in a file, so that an interrupted
+  export can resume without fetching again what it already has.
+
+  The file starts with the account the export is for, followed by pickled
+  (kind, [(key, value), ...]) records appended as the export progresses.
+  A record cut short by a crash is dropped.  Without a file name, nothing
+  is recorded.
+  """
+
+  def __init__(self, filename, account):
+    """Opens the checkpoint file, reading the records of an earlier export
+    of the same account.
+
+    Args:
+      filename: The name of the checkpoint file, or None.
+      account: A picklable value identifying the exported account.
+    """
+    self.filename = filename
+    self.records = {}
+    self.file = None
+    self.lock = threading.Lock()
+    if not filename:
+      return
+
+    valid_length = 0
+    if os.path.exists(filename):
+      valid_length = self._Load(account)
+      self.file = open(filename, 'r+b')
+      self.file.truncate(valid_length)
+      self.file.seek(0, 2)
+    else:
+      self.file = open(filename, 'wb')
+    if valid_length == 0:
+      cPickle.dump(account, self.file, cPickle.HIGHEST_PROTOCOL)
+      self.file.flush()
+
+  def Get(self, kind, key, default=None):
+    """Returns the value an earlier export recorded for a key."""
+    return self.records.get(kind, {}).get(key, default)
+
+  def Has(self, kind, key):
+    """Returns whether an earlier export recorded a value for a key."""
+    return self.records.get(kind, {}).has_key(key)
+
+  def Add(self, kind, pairs):
+    """Records (key, value) pairs for a later export to resume from."""
+    if self.file is None:
+      return
+    self.lock.acquire()
+    try:
+      cPickle.dump((kind, pairs), self.file, cPickle.HIGHEST_PROTOCOL)
+      self.file.flush()
+    finally:
+      self.lock.release()
+
+  def Remove(self):
+    """Deletes the checkpoint file, once the export is complete."""
+    if self.file is None:
+      return
+    self.file.close()
+    self.file = None
+    os.remove(self.filename)
+
+  def _Load(self, account):
+    """Reads the records of the checkpoint file, if it is for the account.
+
+    Returns:
+      The length of the file up to the end of its last complete record, or
+      0 if the file is for another account.
+    """
+    infile = open(self.filename, 'rb')
+    try:
+      try:
+        if cPickle.load(infile) != account:
+          return 0
+        valid_length = infile.tell()
+        while True:
+          kind, pairs = cPickle.load(infile)
+          self.records.setdefault(kind, {}).update(dict(pairs))
+          valid_length = infile.tell()
+      except:
+        # The end of the file, which may be a truncated record
+        return valid_length
+    finally:
+      infile.close()
+
+
+class SyncState(object):
+  """Remembers how far the last export of an account got, so that the next
+  export only fetches the entries and comments changed since.
+
+  Attributes:
+    sync_time: The time of the last change the export covered, or '' if
+        there was no earlier export.
+    max_comment_id: The largest comment ID the export covered, or -1.
+  """
+
+  def __init__(self, filename, account):
+    """Reads the state saved by an earlier export of the same account.
+
+    Args:
+      filename: The name of the file holding the state, or None.
+      account: A picklable value identifying the exported account.
+    """
+    self.filename = filename
+    self.account = account
+    self.sync_time = ''
+    self.max_comment_id = -1
+    if filename and os.path.exists(filename):
+      infile = open(filename, 'rb')
+      try:
+        state = cPickle.load(infile)
+      finally:
+        infile.close()
+      if state['account'] == account:
+        self.sync_time = state['sync_time']
+        self.max_comment_id = state['max_comment_id']
+
+  def Save(self, sync_time, max_comment_id):
+    """Saves the state reached by a completed export."""
+    self.sync_time = sync_time
+    self.max_comment_id = max_comment_id
+    if not self.filename:
+      return
+    # Replace the file only once the new state is completely written
+    temp_filename = self.filename + '.tmp'
+    outfile = open(temp_filename, 'wb')
+    try:
+      cPickle.dump({'account': self.account,
+                    'sync_time': sync_time,
+                    'max_comment_id': max_comment_id},
+                   outfile, cPickle.HIGHEST_PROTOCOL)
+    finally:
+      outfile.close()
+    if os.path.exists(self.filename):
+      os.remove(self.filename)
+    os.rename(temp_filename, self.filename)
+
+
+###########################
+# Helper concurrency
+###########################
+
+def IterConcurrently(function, items, num_workers, max_ahead=None):
+  """Calls a function for each item in worker threads, while the caller
+  goes through the results.
+
+  Args:
+    function: The function to call with each item.
+    items: The list of items.
+    num_workers: The number of threads making the calls.  With no workers,
+        each call is made in the calling thread when its result is needed.
+    max_ahead: The number of results that may be ready or in progress ahead
+        of the one the caller waits for.  Defaults to twice the number of
+        workers.
+  Returns:
+    A generator of the results, in the order of the items.  If any call
+    raises an exception, no further calls are started and the exception is
+    re-raised by the generator once the running calls are done.  Closing
+    the generator early likewise stops the workers once their running calls
+    are done.
+  """
+  if num_workers < 1:
+    for item in items:
+      yield function(item)
+    return
+
+  if max_ahead is None:
+    max_ahead = 2 * num_workers
+  results = {}
+  errors = []
+  stopped = []
+  next_index = [0]
+  next_result = [0]
+  condition = threading.Condition()
+
+  def Work():
+    while True:
+      condition.acquire()
+      try:
+        while (not errors and not stopped and next_index[0] < len(items) and
+               next_index[0] >= next_result[0] + max_ahead):
+          condition.wait()
+        if errors or stopped or next_index[0] >= len(items):
+          return
+        index = next_index[0]
+        next_index[0] += 1
+      finally:
+        condition.release()
+      error = None
+      try:
+        result = function(items[index])
+      except:
+        error = sys.exc_info()
+      condition.acquire()
+      if error:
+        errors.append(error)
+      else:
+        results[index] = result
+      condition.notifyAll()
+      condition.release()
+
+  workers = [threading.Thread(target=Work)
+             for i in range(min(num_workers, len(items)))]
+  for worker in workers:
+    worker.setDaemon(True)
+    worker.start()
+
+  try:
+    for index in range(len(items)):
+      condition.acquire()
+      try:
+        while not results.has_key(index) and not errors:
+          condition.wait()
+        ready = results.has_key(index)
+        if ready:
+          result = results.pop(index)
+          next_result[0] = index + 1
+          condition.notifyAll()
+      finally:
+        condition.release()
+      if not ready:
+        # Let the running calls finish first
+        for worker in workers:
+          worker.join()
+        raise errors[0][0], errors[0][1], errors[0][2]
+      yield result
+  finally:
+    # Release the workers waiting to get ahead of a caller that has stopped
+    # going through the results
+    condition.acquire()
+    stopped.append(True)
+    condition.notifyAll()
+    condition.release()
+    for worker in workers:
+      worker.join()
+
+
+###########################
+# Helper rate control
+###########################
+
+class RateController(object):
+  """Paces the requests to the LiveJournal server.
+
+  Up to a limit of requests are in flight at once.  The limit grows by one
+  for every limit requests that succeed, up to the number of workers, and
+  is halved when a request fails, is throttled or is much slower than the
+  fastest one, so that it settles around what the server tolerates.  Failed
+  requests are retried after an exponential backoff with random jitter.
+  """
+
+  def __init__(self, max_limit):
+    self.max_limit = max(max_limit, 1)
+    self.limit = float(self.max_limit)
+    self.num_in_flight = 0
+    self.num_successes = 0
+    self.last_decrease = 0
+    self.min_latency = None
+    self.condition = threading.Condition()
+    self.random = random.Random()
+    # Statistics for the report
+    self.start_time = time.time()
+    self.num_requests = 0
+    self.num_failures = 0
+    self.num_throttled = 0
+    self.backoff_time = 0
+    self.limit_sum = 0
+    self.min_limit = self.max_limit
+
+  def Call(self, name, function, *args):
+    """Calls a function making a request, retrying it if it fails.
+
+    Args:
+      name: The name of the request, for logging.
+      function: The function making the request.
+      args: The arguments of the function.
+    Returns:
+      The result of the function.
+    Raises:
+      TooManyFailures: The request failed MAX_FAILURES times.
+    """
+    num_failures = 0
+    while True:
+      self._Acquire()
+      start_time = time.time()
+      try:
+        result = function(*args)
+      except (xmlrpclib.Fault, ReplayMiss):
+        # The server understood and refused the request, e.g. because of a
+        # wrong password, or the request was never recorded.  Asking again
+        # will not help.
+        self._Release(start_time, True)
+        raise
+      except:
+        error = sys.exc_info()[1]
+        throttled = self._IsThrottled(error)
+        self._Release(start_time, False, throttled)
+        logging.error('Failure of %s after %d ms' %
+                      (name, (time.time() - start_time) * 1000))
+        logging.error(traceback.format_exc())
+        num_failures += 1
+        if num_failures >= MAX_FAILURES:
+          raise TooManyFailures(name, error)
+        time.sleep(self._GetBackoff(num_failures, error))
+        continue
+      self._Release(start_time, True)
+      logging.info('Calling %s: %d ms' %
+                   (name, (time.time() - start_time) * 1000))
+      return result
+
+  def Report(self):
+    """Returns a summary of the requests made and the limits chosen."""
+    self.condition.acquire()
+    try:
+      seconds = max(time.time() - self.start_time, 0.001)
+      average_limit = self.limit_sum / max(self.num_requests, 1)
+      return ('%d requests in %.1f s (%.1f/s), %d failed, %d throttled, '
+              '%.1f s of backoff; concurrency limit %d to %d, average %.1f, '
+              'final %d' %
+              (self.num_requests, seconds, self.num_requests / seconds,
+               self.num_failures, self.num_throttled, self.backoff_time,
+               self.min_limit, self.max_limit, average_limit,
+               int(self.limit)))
+    finally:
+      self.condition.release()
+
+  def _Acquire(self):
+    """Waits until fewer requests than the limit are in flight."""
+    self.condition.acquire()
+    try:
+      while self.num_in_flight >= int(self.limit):
+        self.condition.wait()
+      self.num_in_flight += 1
+      self.num_requests += 1
+      self.limit_sum += int(self.limit)
+    finally:
+      self.condition.release()
+
+  def _Release(self, start_time, succeeded, throttled=False):
+    """Adjusts the limit to the outcome of a request."""
+    latency = time.time() - start_time
+    self.condition.acquire()
+    try:
+      self.num_in_flight -= 1
+      if not succeeded:
+        self.num_failures += 1
+      if throttled:
+        self.num_throttled += 1
+
+      slow = False
+      if succeeded:
+        if self.min_latency is None or latency < self.min_latency:
+          self.min_latency = latency
+        slow = latency > SLOW_REQUEST_FACTOR * max(self.min_latency, 0.01)
+
+      if not succeeded or slow:
+        # Requests sent before the last decrease saw the old limit, and
+        # should not halve the limit again
+        if start_time >= self.last_decrease:
+          self.limit = max(1.0, self.limit / 2)
+          self.min_limit = min(self.min_limit, int(self.limit))
+          self.last_decrease = time.time()
+          self.num_successes = 0
+          logging.info('Concurrency limit lowered to %d' % int(self.limit))
+      else:
+        self.num_successes += 1
+        if self.num_successes >= int(self.limit):
+          self.limit = min(float(self.max_limit), self.limit + 1)
+          self.num_successes = 0
+      self.condition.notifyAll()
+    finally:
+      self.condition.release()
+
+  def _GetBackoff(self, num_failures, error):
+    """Returns the seconds to wait before retrying a failed request."""
+    backoff = min(INITIAL_BACKOFF * 2 ** (num_failures - 1), MAX_BACKOFF)
+    # Waiting a random part of the backoff keeps the workers from retrying
+    # all at once
+    backoff = backoff * (0.5 + self.random.random() / 2)
+
+    # A throttling server may say how long to wait
+    headers = getattr(error, 'hdrs', None) or getattr(error, 'headers', None)
+    if headers:
+      try:
+        backoff = max(backoff, min(float(headers.get('Retry-After')),
+                                   MAX_BACKOFF))
+      except (TypeError, ValueError):
+        pass
+
+    self.condition.acquire()
+    self.backoff_time += backoff
+    self.condition.release()
+    return backoff
+
+  def _IsThrottled(self, error):
+    """Returns whether a request failed because the server throttled it."""
+    status = getattr(error, 'code', None) or getattr(error, 'errcode', None)
+    return status == 503
+
+
+class RateControlledUrlFetcher(object):
+  """Makes the requests of a URL fetcher through a RateController."""
+
+  def __init__(self, url_fetcher, rate_controller):
+    self.url_fetcher = url_fetcher
+    self.rate_controller = rate_controller
+
+  def fetch(self, url, payload, headers={}):
+    name = url.split('/')[-1]
+    return self.rate_controller.Call(name, self.url_fetcher.fetch,
+                                     url, payload, headers)
+
+
 ###########################
 # Translation class
 ###########################
@@ -168,20 +1214,74 @@ class LiveJournal2Blogger(object):
      export format.
   """
 
-  def __init__(self, username, password, server='www.livejournal.com'):
+  def __init__(self, username, password, server='www.livejournal.com',
+               num_workers=1, num_connections=None, checkpoint_file=None,
+               sync_state_file=None, use_multicall=True, traffic_dir=None,
+               replay=False, connection_pool=None, rate_controller=None):
+    """Constructs a translator for a LiveJournal account.
+
+    Args:
+      username: The LiveJournal user name.
+      password: The password of the user.
+      server: The host name of the LiveJournal server.
+      num_workers: The number of getevents requests to keep in flight at
+          once.  Must be 1 on App Engine, which does not allow threads.
+      num_connections: The number of persistent connections kept open to
+          the server.  Defaults to one per worker.  Not used on App Engine,
+          where urlfetch manages the connections.
+      checkpoint_file: The file recording the progress of the export, so
+          that an interrupted export run again with the same file resumes
+          where it stopped.  The file is deleted once the export completes.
+      sync_state_file: The file remembering how far the last export got.
+          If given, only the entries changed and the comments added since
+          the last export with the same file are exported.
+      use_multicall: Whether to pack calls into system.multicall requests
+          when the server supports them.
+      traffic_dir: The directory in which to record the responses of the
+          server, or from which to replay them.  Not used on App Engine.
+      replay: Whether to replay the responses recorded in traffic_dir rather
+          than make any request to the server.
+      connection_pool: A ConnectionPool shared with other translators, used
+          instead of one of the translator's own.
+      rate_controller: A RateController shared with other translators of
+          the same server, used instead of one of the translator's own.
+    """
     self.username = username
     self.password = password
     self.server_name = server
-    if ON_GAE:
-      self.server = xmlrpclib.ServerProxy('http://%s/interface/xmlrpc' % server,
-                                          gaexmlrpclib.GAEXMLRPCTransport())
+    self.num_workers = num_workers
+    if connection_pool:
+      self.connection_pool = connection_pool
+    elif traffic_dir:
+      self.connection_pool = CachedConnectionPool(
+          traffic_dir, replay, num_connections or num_workers)
     else:
-      self.server = xmlrpclib.ServerProxy('http://%s/interface/xmlrpc' % server)
-    self.url_fetcher = UrlFetcherFactory().newUrlFetcher()
+      self.connection_pool = ConnectionPool(num_connections or num_workers)
+    self.rate_controller = rate_controller or RateController(num_workers)
+    self.url_fetcher = RateControlledUrlFetcher(
+        UrlFetcherFactory(self.connection_pool).newUrlFetcher(),
+        self.rate_controller)
+    self.credentials = LjCredentials(username, password, server,
+                                     self.url_fetcher)
+    self.checkpoint = Checkpoint(checkpoint_file, (server, username))
+    self.sync_state = SyncState(sync_state_file, (server, username))
+    # How far the export got, updated as it progresses
+    self.sync_time = self.sync_state.sync_time
+    self.max_comment_id = self.sync_state.max_comment_id
+    # Turned off for good once the server refuses a system.multicall
+    self.use_multicall = use_multicall
+    # Each thread making XML-RPC calls gets its own server proxy
+    self.thread_state = threading.local()
+    # The number of posts and comments written by Translate
+    self.num_entries = 0
 
   def Translate(self, outfile):
     """Performs the actual translation to a Blogger export format.
 
+    The feed is written up to its closing tag before anything is fetched.
+    Each post and comment is then written as soon as it is translated, so
+    that the export never has to be held in memory.
+
     Args:
       outfile: The output file that should receive the translated document
     """
@@ -197,108 +1297,250 @@ class LiveJournal2Blogger(object):
         atom.Link(href=DUMMY_URI, rel='alternate', link_type=HTML_TYPE))
     feed.updated = atom.Updated(text=self._ToBlogTime(time.gmtime()))
 
-    # Grab the list of posts
-    posts = self._GetPosts()
-    feed.entry.extend(posts)
-
-    # Grab the list of comments
-    comments = self._GetComments()
-    feed.entry.extend(comments)
-
-    # Serialize the feed object
-    outfile.write(str(feed))
-
-  def _GetPosts(self):
-    sync_time = ''
-    posts = []
-    num_failures = 0
-    max_failures = 5
-    while num_failures < max_failures:
+    # Serialize the feed object without entries, and split it before its
+    # closing tag
+    document = str(feed)
+    footer_start = document.rindex('</')
+    outfile.write(document[:footer_start])
 
-      start_time = time.time()
+    # Stream the posts, then the comments.  The generators are closed even
+    # when writing fails, so that their worker threads stop.
+    for GetEntries in [self._GetPosts, self._GetComments]:
+      entries = GetEntries()
       try:
-        # Get the next round of items which contain posts/comments
-        challenge, challenge_response = self._GetAuthTokens()
-        logging.info('Retrieving auth tokens: %d ms' % ((time.time() - start_time) * 1000))
-      except:
-        logging.error(traceback.format_exc())
-        num_failures += 1
-        time.sleep(0.5)
-        continue
+        for entry in entries:
+          outfile.write(self._EntryToString(entry))
+          self.num_entries += 1
+      finally:
+        entries.close()
+
+    outfile.write(document[footer_start:])
+    logging.info(self.rate_controller.Report())
+    self.sync_state.Save(self.sync_time, self.max_comment_id)
+    self.checkpoint.Remove()
+
+  def _EntryToString(self, entry):
+    """Serializes an entry on its own, to be written inside the feed."""
+    return atom.ElementTree.tostring(entry._ToElementTree(), 'utf-8')
+
+  def _IterConcurrently(self, function, items):
+    """Returns IterConcurrently over the items with num_workers workers.
+    App Engine does not allow threads, so there every call is made when its
+    result is needed.
+    """
+    num_workers = self.num_workers
+    if ON_GAE:
+      num_workers = 0
+    return IterConcurrently(function, items, num_workers)
 
-      start_time = time.time()
-      try:
-        response = self.server.LJ.XMLRPC.syncitems({
-            'username': self.username,
-            'ver': 1,
-            'lastsync': sync_time,
-            'auth_method': 'challenge',
-            'auth_challenge': challenge,
-            'auth_response': challenge_response})
-        logging.info('Sync-ing %d items: %d ms' %
-                     (len(response['syncitems']), (time.time() - start_time) * 1000))
-      except:
-        logging.error('Failure after %d ms' % ((time.time() - start_time) * 1000))
-        logging.error(traceback.format_exc())
-        num_failures += 1
-        time.sleep(0.5)
-        continue
+  def _GetPosts(self):
+    """Generates the translated entries for all posts in the journal changed
+    since the last export.
+    """
+    sync_items = self._GetSyncItems()
+
+    # Fetch the events not fetched by an earlier run in batches of
+    # consecutive sync items, with worker threads fetching batches ahead
+    # while the posts of earlier batches are translated.
+    pending = [item for item in sync_items
+               if not self.checkpoint.Has('event', item)]
+    batches = [pending[start:start + EVENTS_PER_REQUEST]
+               for start in range(0, len(pending), EVENTS_PER_REQUEST)]
+    events_by_batch = self._IterConcurrently(self._GetCheckpointedEvents,
+                                             batches)
+
+    events = {}
+    for item in sync_items:
+      if self.checkpoint.Has('event', item):
+        event = self.checkpoint.Get('event', item)
+      else:
+        # The pending items are in order, so an item not in the current
+        # batch is the first of the next one
+        if not events.has_key(item):
+          events = events_by_batch.next()
+        event = events[item]
+      if event:
+        yield self._TranslatePost(event)
+
+  def _GetCheckpointedEvents(self, sync_items):
+    """Fetches the events of a batch of sync items and records them in the
+    checkpoint.  Items without an event are recorded with None.
+
+    Returns:
+      A dictionary of the events by sync item.
+    """
+    events = dict([(item, None) for item in sync_items])
+    sync_times = dict(sync_items)
+    for event in self._GetEvents(sync_items):
+      events[(event['itemid'], sync_times[event['itemid']])] = event
+    self.checkpoint.Add('event', events.items())
+    return events
+
+  def _GetSyncItems(self):
+    """Returns the (item id, sync time) pairs of all journal entries changed
+    since the last export.
+
+    The pairs are ordered by the time each entry was last changed.  An entry
+    changed while the pages were fetched only appears with its last change.
+    """
+    sync_time = self.sync_time
+    sync_times = {}
+    while True:
+      # Pages fetched by an earlier run are taken from the checkpoint
+      response = self.checkpoint.Get('syncitems', sync_time)
+      if response is None:
+        response = self._CallLj('syncitems', {'lastsync': sync_time})
+        if response['syncitems']:
+          self.checkpoint.Add('syncitems', [(sync_time, response)])
+      logging.info('Sync-ing %d items' % len(response['syncitems']))
 
       # Break out if we have no more items
       if len(response['syncitems']) == 0:
         break
 
-      # Loop through the items and get the contents
       for item in response['syncitems']:
         item_type, item_id = item['item'].split('-')
         if item_type == 'L':
+          sync_times[int(item_id)] = max(sync_times.get(int(item_id), ''),
+                                         item['time'])
+        sync_time = item['time']
 
-          while num_failures < max_failures:
-
-            start_time = time.time()
-            try:
-              # Get the next round of items which contain posts/comments
-              challenge, challenge_response = self._GetAuthTokens()
-              logging.info('Retrieving auth tokens: %d ms' % ((time.time() - start_time) * 1000))
-            except:
-              logging.error('Failure after %d ms' % ((time.time() - start_time) * 1000))
-              logging.error(traceback.format_exc())
-              num_failures += 1
-              time.sleep(0.5)
-              continue
-
-            start_time = time.time()
-            try:
-              event = self.server.LJ.XMLRPC.getevents({
-                  'username': self.username,
-                  'ver': 1,
-                  'selecttype': 'one',
-                  'itemid': item_id,
-                  'auth_method': 'challenge',
-                  'auth_challenge': challenge,
-                  'auth_response': challenge_response})
-              logging.info('Retrieved item %s: %d ms' %
-                           (item_id, (time.time() - start_time) * 1000))
-              if len(event['events']) > 0:
-                posts.append(self._TranslatePost(event['events'][0]))
-              break
-
-            except:
-              logging.error('Failure after %d ms' % ((time.time() - start_time) * 1000))
-              logging.error(traceback.format_exc())
-              num_failures += 1
-              time.sleep(0.5)
-              continue
-
-          if num_failures > max_failures:
-            raise 'TooManyFailures'
+    self.sync_time = sync_time
+    sync_items = sync_times.items()
+    sync_items.sort(lambda a, b: cmp(a[1], b[1]) or cmp(a[0], b[0]))
+    return sync_items
 
-        sync_time = item['time']
+  def _GetEvents(self, sync_items):
+    """Returns the events for a run of consecutive sync items, in order.
+
+    A getevents request with the syncitems select type returns the events
+    changed after its lastsync time, so a single request usually covers the
+    whole run.  Events the server leaves out are asked for again, and one at
+    a time if a request brings nothing new, with the single-item requests
+    packed into system.multicall requests.  Items that no longer have an
+    event, such as deleted posts, are skipped.
+    """
+    pending = dict(sync_items)
+    events = {}
+    last_sync = self._BeforeLjTime(sync_items[0][1])
+    while pending:
+      response = self._CallLj('getevents', {'selecttype': 'syncitems',
+                                            'lastsync': last_sync})
+      found = [event for event in response['events']
+               if pending.has_key(event['itemid'])]
+      logging.info('Retrieved %d of %d items' % (len(found), len(pending)))
+
+      if found:
+        sync_times = []
+        for event in found:
+          events[event['itemid']] = event
+          sync_times.append(pending.pop(event['itemid']))
+        last_sync = self._BeforeLjTime(max(sync_times))
+      else:
+        # No progress, so fall back to asking for the remaining items
+        # directly
+        item_ids = [item_id for item_id, sync_time in sync_items
+                    if pending.has_key(item_id)]
+        pending.clear()
+        responses = self._CallLjMulti(
+            'getevents', [{'selecttype': 'one', 'itemid': item_id}
+                          for item_id in item_ids])
+        for item_id, response in zip(item_ids, responses):
+          if len(response['events']) > 0:
+            events[item_id] = response['events'][0]
+
+    return [events[item_id] for item_id, sync_time in sync_items
+            if events.has_key(item_id)]
+
+  def _CallLj(self, method_name, params):
+    """Calls a method of the LiveJournal XML-RPC protocol.
+
+    The call is authenticated with the session cookie, and paced and
+    retried by the rate controller.
+
+    Returns:
+      The response of the server.
+    """
+    server, transport = self._GetServer()
+    method = getattr(server.LJ.XMLRPC, method_name)
+    return self._CallWithSession(method_name, transport, method,
+                                 self._LjRequest(params))
+
+  def _CallLjMulti(self, method_name, params_list):
+    """Calls a method of the LiveJournal XML-RPC protocol once for each of
+    the params.
 
-    if num_failures > max_failures:
-      raise 'TooManyFailures'
+    The calls are packed EVENTS_PER_REQUEST at a time into system.multicall
+    requests.  If the server does not support system.multicall, they are
+    made one by one instead.
 
-    return posts
+    Returns:
+      The responses of the server, in the order of the params.
+    """
+    responses = []
+    for start in range(0, len(params_list), EVENTS_PER_REQUEST):
+      batch = params_list[start:start + EVENTS_PER_REQUEST]
+      if self.use_multicall and len(batch) > 1:
+        server, transport = self._GetServer()
+        calls = [{'methodName': 'LJ.XMLRPC.%s' % method_name,
+                  'params': [self._LjRequest(params)]} for params in batch]
+        try:
+          results = self._CallWithSession('multicall.%s' % method_name,
+                                          transport, self._Multicall, server,
+                                          calls)
+        except xmlrpclib.Fault, f:
+          if f.faultCode in AUTH_FAULT_CODES:
+            raise
+          logging.info('No system.multicall support, calling one by one')
+          self.use_multicall = False
+        else:
+          for result in results:
+            if isinstance(result, dict):
+              raise xmlrpclib.Fault(result['faultCode'], result['faultString'])
+            responses.append(result[0])
+          continue
+      for params in batch:
+        responses.append(self._CallLj(method_name, params))
+    return responses
+
+  def _Multicall(self, server, calls):
+    """Makes a system.multicall request, returning its results.  A call
+    refused for its session is raised as a fault of the whole request, so
+    that it is made again with a new session.
+    """
+    results = server.system.multicall(calls)
+    for result in results:
+      if isinstance(result, dict) and result['faultCode'] in AUTH_FAULT_CODES:
+        raise xmlrpclib.Fault(result['faultCode'], result['faultString'])
+    return results
+
+  def _LjRequest(self, params):
+    """Returns the request struct of a call authenticated with the session
+    cookie.
+    """
+    request = {'username': self.username,
+               'ver': 1,
+               'auth_method': 'cookie'}
+    request.update(params)
+    return request
+
+  def _CallWithSession(self, name, transport, method, *args):
+    """Makes an XML-RPC call with the session cookie, through the rate
+    controller.  A call refused for its session is made once more with a
+    new session.
+    """
+    session = self.credentials.GetSession()
+    transport.headers = self.credentials.GetSessionHeaders(session)
+    try:
+      return self.rate_controller.Call(name, method, *args)
+    except xmlrpclib.Fault, f:
+      if f.faultCode not in AUTH_FAULT_CODES:
+        raise
+      # The session may have expired early, so try once more with a new one
+      self.credentials.ExpireSession(session)
+      session = self.credentials.GetSession()
+      transport.headers = self.credentials.GetSessionHeaders(session)
+      return self.rate_controller.Call(name, method, *args)
 
   def _TranslatePost(self, lj_event):
     post_entry = gdata.GDataEntry()
@@ -343,54 +1585,108 @@ class LiveJournal2Blogger(object):
     return post_entry
 
   def _GetComments(self):
-    current_id = 0
-    max_id = -1
+    """Generates the translated entries for all comments in the journal
+    added since the last export.
+    """
     user_map = UserMap()
-    comments = []
-
-    # First make requests to generate the user map.  This is gathered by requesting for
-    # comment metadata and paging through the responses.  For each request for a page of
-    # comment metadata, add the results to a running UserMap which provides the mapping
-    # from comment identifier to the author's name.
-    while True:
-      session_key = self._GetSessionToken()
-      request_url = ('http://%s/export_comments.bml?get=comment_meta&startid=%d'
-                     % (self.server_name, current_id))
-      response = self.url_fetcher.fetch(
-          request_url, None, headers={'Cookie': 'ljsession=%s' % session_key})
-      response_doc = xml.dom.minidom.parseString(response)
-      user_map.Add(response_doc)
+    first_id = self.max_comment_id + 1
+
+    # The first page of comment metadata gives the largest comment ID, which
+    # splits the remaining comment IDs into ranges of about a page each.  The
+    # pages of all ranges are then fetched ahead by worker threads, while the
+    # calling thread goes through them in order.  App Engine does not allow
+    # threads, so there every page is fetched when it is needed.
+    first_page = self._FetchComments('comment_meta', first_id)
+    if not first_page.comments:
+      return
+    user_map.Add(first_page)
+    max_id = first_page.max_id
+    ranges = []
+    for start_id in range(user_map.GetLargestId() + 1, max_id + 1,
+                          COMMENT_META_PAGE_SIZE):
+      ranges.append(('comment_meta', start_id,
+                     start_id + COMMENT_META_PAGE_SIZE, max_id))
+    for start_id in range(first_id, max_id + 1, COMMENT_BODY_PAGE_SIZE):
+      ranges.append(('comment_body', start_id,
+                     start_id + COMMENT_BODY_PAGE_SIZE, max_id))
+
+    # First go through the comment metadata to generate the user map.  For each
+    # page of comment metadata, add the results to a running UserMap which provides
+    # the mapping from comment identifier to the author's name.  Second, go through
+    # the contents of the comments and use our UserMap to fill in the author of the
+    # comment.  All of the rest of the data is found in the comment response page.
+    pages_by_range = self._IterConcurrently(self._GetCommentRange, ranges)
+    for index, pages in enumerate(pages_by_range):
+      for page in pages:
+        if ranges[index][0] == 'comment_meta':
+          user_map.Add(page)
+          continue
+        for comment in page.comments:
+          # If this has been marked as a deleted comment, do not add it
+          if comment.get('state', None) != 'D':
+            yield self._TranslateComment(comment, user_map)
+
+    self.max_comment_id = max_id
+
+  def _GetCommentRange(self, comment_range):
+    """Fetches the pages of the comment export covering a range of IDs.
 
-      current_id = user_map.GetLargestId()
-      max_id = int(self._GetText(response_doc.getElementsByTagName('maxid')[0]))
-      if max_id >= current_id:
+    Args:
+      comment_range: A tuple of the kind of page, either comment_meta or
+          comment_body, the first ID of the range, the ID after the range,
+          and the largest comment ID of the journal.
+    Returns:
+      The list of CommentPage objects, with only the comments of the range.
+    """
+    get, start_id, end_id, max_id = comment_range
+    pages = []
+    while start_id < end_id:
+      page = self._FetchComments(get, start_id)
+      if not page.comments:
         break
-
-    # Second, loop through the contents of the comments and user our UserMap to fill
-    # in the author of the comment.  All of the rest of the data is found in the
-    # comment response document.
-    current_id = 0
-    while True:
-      session_key = self._GetSessionToken()
-      request_url = ('http://%s/export_comments.bml?get=comment_body&startid=%d'
-                     % (self.server_name, current_id))
-      response = self.url_fetcher.fetch(
-          request_url, None, headers={'Cookie': 'ljsession=%s' % session_key})
-      response_doc = xml.dom.minidom.parseString(response)
-
-      for comment in response_doc.getElementsByTagName('comment'):
-        # If this has been marked as a deleted comment, do not add it
-        if comment.getAttribute('state') != 'D':
-            comments.append(self._TranslateComment(comment, user_map))
-        current_id = int(comment.getAttribute('id'))
-
-      if current_id >= max_id:
+      last_id = int(page.comments[-1]['id'])
+      page.comments = [comment for comment in page.comments
+                       if start_id <= int(comment['id']) < end_id]
+      pages.append(page)
+      if last_id < start_id or last_id >= max_id:
         break
+      start_id = last_id + 1
+    return pages
+
+  def _FetchComments(self, get, start_id):
+    """Fetches and parses a page of the comment export.
 
-    return comments
+    Args:
+      get: The kind of page, either comment_meta or comment_body.
+      start_id: The smallest comment ID the page should contain.
+    Returns:
+      The parsed CommentPage.
+    """
+    # Pages fetched by an earlier run are taken from the checkpoint
+    response = self.checkpoint.Get('comments', (get, start_id))
+    if response is not None:
+      return CommentPage(response)
+
+    request_url = ('http://%s/export_comments.bml?get=%s&startid=%d'
+                   % (self.server_name, get, start_id))
+    session = self.credentials.GetSession()
+    response = self.url_fetcher.fetch(
+        request_url, None, headers={'Cookie': 'ljsession=%s' % session})
+    try:
+      page = CommentPage(response)
+    except expat.ExpatError:
+      # Instead of the export, an expired session gets a login page.  Try
+      # once more with a new session.
+      self.credentials.ExpireSession(session)
+      session = self.credentials.GetSession()
+      response = self.url_fetcher.fetch(
+          request_url, None, headers={'Cookie': 'ljsession=%s' % session})
+      page = CommentPage(response)
+    self.checkpoint.Add('comments', [((get, start_id), response)])
+    return page
 
-  def _TranslateComment(self, xml_comment, user_map):
-    comment_id = xml_comment.getAttribute('id')
+  def _TranslateComment(self, comment, user_map):
+    comment_id = comment['id']
 
     comment_entry = gdata.GDataEntry()
     comment_entry.id = atom.Id(text='comment-%s' % comment_id)
@@ -403,24 +1699,19 @@ class LiveJournal2Blogger(object):
     comment_entry.category.append(
         atom.Category(scheme=CATEGORY_KIND, term=COMMENT_KIND))
 
-    comment_body = self._TranslateContent(
-        self._GetText(xml_comment.getElementsByTagName('body')[0]))
+    comment_body = self._TranslateContent(comment['body'])
     comment_entry.content = atom.Content(
         content_type='html', text=comment_body)
-    comment_entry.published = atom.Published(
-        text=self._GetText(xml_comment.getElementsByTagName('date')[0]))
-    comment_entry.updated = atom.Updated(
-        text=self._GetText(xml_comment.getElementsByTagName('date')[0]))
-
-    subject = xml_comment.getElementsByTagName('subject')
-    if subject:
-      subject = self._GetText(subject[0])
-    else:
+    comment_entry.published = atom.Published(text=comment['date'])
+    comment_entry.updated = atom.Updated(text=comment['date'])
+
+    subject = comment.get('subject', None)
+    if not subject:
       subject = self._CreateSnippet(comment_body)
     comment_entry.title = atom.Title(text=subject)
 
     comment_entry.extension_elements.append(
-        InReplyTo('post-%s' % xml_comment.getAttribute('jitemid')))
+        InReplyTo('post-%s' % comment['jitemid']))
 
     return comment_entry
 
@@ -429,53 +1720,24 @@ class LiveJournal2Blogger(object):
       content = str(content)
     return content.replace('\r\n', '<br/>')
 
-  def _GetAuthTokens(self):
-    """Returns the information necessary to create new requests to the
-    LiveJournal server using XML-RPC.  Returns a tuple containing the challege,
-    and the successful response to the challenge.
-    """
-    response = self.server.LJ.XMLRPC.getchallenge()
-    challenge = response['challenge']
-    return challenge, self._HashChallenge(challenge)
-
-  def _GetSessionToken(self):
-    """Returns the information necessary to create new requests to the
-    LiveJournal server via HTTP.
-    """
-    # Use the flat RPC protocol to generate the session information
-    request_url = 'http://%s/interface/flat' % self.server_name
-
-    # The first request is used to obtain the challenge token
-    response = self.url_fetcher.fetch(request_url, 'mode=getchallenge')
-    challenge = self._ResponseToDict(response)['challenge']
-
-    # The second request is to actually generate the session cookie by
-    # responding to the challenge
-    challenge_response = self._HashChallenge(challenge)
-    response = self.url_fetcher.fetch(
-        request_url, ('mode=sessiongenerate&auth_method=challenge&'
-                      'user=%s&auth_challenge=%s&auth_response=%s' %
-                      (self.username, challenge, challenge_response)))
-    result = self._ResponseToDict(response)
-
-    if result.get('errmsg', None):
-      raise 'Login Unsuccessful'
-    return result['ljsession']
-
-  def _ResponseToDict(self, contents):
-    """Takes the result of a request to the LiveJournal flat XML-RPC
-    protocol and transforms the key/value pairs into a dictionary.
-    """
-    elems = contents.split('\n')
-    # This little bit of Python wizardry turns a list of elements into
-    # key value pairs.
-    return dict(zip(elems[::2], elems[1::2]))
-
-  def _HashChallenge(self, challenge):
-    """Hashes the challege with the password to produce the challenge
-    response.
+  def _GetServer(self):
+    """Returns the XML-RPC server proxy of the calling thread, along with
+    the transport through which it sends its requests.
     """
-    return md5.new(challenge + md5.new(self.password).hexdigest()).hexdigest()
+    server = getattr(self.thread_state, 'server', None)
+    if server is None:
+      url = 'http://%s/interface/xmlrpc' % self.server_name
+      if ON_GAE:
+        transport = gaexmlrpclib.GAEXMLRPCTransport()
+        # urlfetch returns whole responses, but their base64 values can
+        # still be left encoded until they are used
+        transport.getparser = GetResponseParser
+      else:
+        transport = PooledTransport(self.connection_pool)
+      server = xmlrpclib.ServerProxy(url, transport)
+      self.thread_state.server = server
+      self.thread_state.transport = transport
+    return server, self.thread_state.transport
 
   def _CreateSnippet(self, content):
     """Creates a snippet of content.  The maximum size being 53 characters,
@@ -488,30 +1750,246 @@ class LiveJournal2Blogger(object):
       return content
     return content[:49] + '...'
 
-  def _GetText(self, xml_elem):
-    """Assumes the text for the element is the only child of the element."""
-    return xml_elem.firstChild.nodeValue
-
   def _FromLjTime(self, lj_time):
     """Converts the LiveJournal event time to a time/date struct."""
-    return time.strptime(lj_time, '%Y-%m-%d %H:%M:%S')
+    return time.strptime(lj_time, LJ_TIME_FORMAT)
+
+  def _BeforeLjTime(self, lj_time):
+    """Returns the LiveJournal time one second before the given one."""
+    seconds = calendar.timegm(self._FromLjTime(lj_time)) - 1
+    return time.strftime(LJ_TIME_FORMAT, time.gmtime(seconds))
 
   def _ToBlogTime(self, time_tuple):
     """Converts a time struct to a Blogger time/date string."""
     return time.strftime('%Y-%m-%dT%H:%M:%SZ', time_tuple)
 
 
+###########################
+# Bulk export
+###########################
+
+def ReadManifest(infile, default_server='www.livejournal.com'):
+  """Reads the accounts to export from a manifest.
+
+  Each line of the manifest holds a user name, a password and optionally
+  the server of an account, separated by whitespace.  Empty lines and lines
+  starting with # are skipped.
+
+  Returns:
+    A list of (username, password, server) tuples.
+  """
+  accounts = []
+  for line in infile:
+    line = line.strip()
+    if not line or line.startswith('#'):
+      continue
+    fields = line.split()
+    if len(fields) not in [2, 3]:
+      raise ValueError('Invalid manifest line: %s' % line)
+    if len(fields) == 2:
+      fields.append(default_server)
+    accounts.append(tuple(fields))
+  return accounts
+
+
+class CountingFile(object):
+  """Writes to a file, counting the bytes written."""
+
+  def __init__(self, outfile):
+    self.outfile = outfile
+    self.size = 0
+
+  def write(self, data):
+    self.outfile.write(data)
+    self.size += len(data)
+
+
+class BulkExporter(object):
+  """Exports many LiveJournal accounts at once, each to its own file.
+
+  The exports share one connection pool, and the exports from the same
+  server share one RateController, so that no more than server_limit
+  requests are in flight to a server however many of its accounts are
+  exported at once.  Accounts are started alternating between servers.
+
+  Each export is written to <username>@<server>.xml in the output
+  directory, under a temporary name until it is complete.  Accounts whose
+  export file exists are skipped, and an interrupted export resumes from
+  its checkpoint, so a bulk export can be run again after a failure.
+  """
+
+  def __init__(self, output_dir, num_accounts=4, num_workers=1,
+               server_limit=4, num_connections=None, traffic_dir=None,
+               replay=False):
+    """Constructs an exporter.
+
+    Args:
+      output_dir: The directory receiving the export files.
+      num_accounts: The number of accounts exported at once.
+      num_workers: The number of requests each export keeps in flight.
+      server_limit: The number of requests kept in flight to each server.
+      num_connections: The number of persistent connections kept open to
+          each server.  Defaults to server_limit.
+      traffic_dir: The directory in which to record the responses of the
+          servers, or from which to replay them.
+      replay: Whether to replay the responses recorded in traffic_dir.
+    """
+    self.output_dir = output_dir
+    self.num_accounts = num_accounts
+    self.num_workers = num_workers
+    self.server_limit = server_limit
+    if traffic_dir:
+      self.connection_pool = CachedConnectionPool(
+          traffic_dir, replay, num_connections or server_limit)
+    else:
+      self.connection_pool = ConnectionPool(num_connections or server_limit)
+    self.rate_controllers = {}
+
+  def Export(self, accounts):
+    """Exports the accounts.
+
+    Args:
+      accounts: A list of (username, password, server) tuples.
+    Returns:
+      A generator of the reports of the exports, yielded in the order of
+      the accounts, not the order the exports run or complete in.  Each
+      report is a
+      dictionary with the username, server and filename of the account, the
+      number of entries and bytes written, the seconds taken, and the error
+      that stopped the export, if any.  Accounts already exported are
+      reported with skipped set.
+    """
+    if not os.path.isdir(self.output_dir):
+      os.makedirs(self.output_dir)
+    # An account listed twice would be exported twice to the same file
+    unique_accounts = []
+    listed = {}
+    for username, password, server in accounts:
+      if listed.has_key((username, server)):
+        logging.warning('Skipping %s on %s, listed twice' % (username, server))
+        continue
+      listed[(username, server)] = True
+      unique_accounts.append((username, password, server))
+      if not self.rate_controllers.has_key(server):
+        self.rate_controllers[server] = RateController(self.server_limit)
+
+    # Every report is kept until it is its turn, so that a large account
+    # does not keep the exporter from moving on to the next ones
+    accounts = self._AlternateServers(unique_accounts)
+    reports = IterConcurrently(self._ExportAccount, accounts,
+                               self.num_accounts, len(accounts))
+    return self._InOrder(unique_accounts, reports)
+
+  def _AlternateServers(self, accounts):
+    """Orders the accounts so that consecutive accounts are on different
+    servers for as long as possible.
+    """
+    servers = []
+    accounts_by_server = {}
+    for account in accounts:
+      if not accounts_by_server.has_key(account[2]):
+        servers.append(account[2])
+      accounts_by_server.setdefault(account[2], []).append(account)
+    ordered = []
+    while len(ordered) < len(accounts):
+      for server in servers:
+        if accounts_by_server[server]:
+          ordered.append(accounts_by_server[server].pop(0))
+    return ordered
+
+  def _InOrder(self, accounts, reports):
+    """Yields the reports of the given accounts in the order of the accounts,
+    whatever order they were exported in.
+    """
+    pending = {}
+    try:
+      for username, password, server in accounts:
+        while not pending.has_key((username, server)):
+          report = reports.next()
+          pending[(report['username'], report['server'])] = report
+        yield pending.pop((username, server))
+    finally:
+      reports.close()
+
+  def _ExportAccount(self, account):
+    username, password, server = account
+    name = re.sub('[^A-Za-z0-9_.@-]', '_', '%s@%s' % (username, server))
+    filename = os.path.join(self.output_dir, name + '.xml')
+    report = {'username': username, 'server': server, 'filename': filename,
+              'entries': 0, 'bytes': 0, 'seconds': 0, 'error': None,
+              'skipped': False}
+    if os.path.exists(filename):
+      report['skipped'] = True
+      return report
+
+    start_time = time.time()
+    temp_filename = filename + '.tmp'
+    outfile = CountingFile(open(temp_filename, 'wb'))
+    translator = None
+    try:
+      try:
+        translator = LiveJournal2Blogger(
+            username, password, server, self.num_workers,
+            checkpoint_file=os.path.join(self.output_dir,
+                                         name + '.checkpoint'),
+            connection_pool=self.connection_pool,
+            rate_controller=self.rate_controllers[server])
+        translator.Translate(outfile)
+      except:
+        logging.error('Export of %s from %s failed' % (username, server))
+        logging.error(traceback.format_exc())
+        report['error'] = traceback.format_exception_only(
+            *sys.exc_info()[:2])[-1].strip()
+    finally:
+      outfile.outfile.close()
+    if report['error'] is None:
+      os.rename(temp_filename, filename)
+    else:
+      os.remove(temp_filename)
+
+    if translator:
+      report['entries'] = translator.num_entries
+    report['bytes'] = outfile.size
+    report['seconds'] = time.time() - start_time
+    return report
+
+
+def FormatReport(report):
+  """Returns a line summarizing the export of an account."""
+  account = '%s@%s' % (report['username'], report['server'])
+  if report['skipped']:
+    return '%-40s already exported' % account
+  if report['error'] is not None:
+    return '%-40s failed: %s' % (account, report['error'])
+  seconds = max(report['seconds'], 0.001)
+  return '%-40s %8d entries %10d KB %8.1f s %8.1f entries/s %8.1f KB/s' % (
+      account, report['entries'], report['bytes'] / 1024, seconds,
+      report['entries'] / seconds, report['bytes'] / 1024.0 / seconds)
+
+
 def usage():
-  return ('Usage: %s -u <username> -p <password> [-s <server>]\n\n'
-          ' Outputs the converted Blogger export file to standard out.' %
-          os.path.basename(sys.argv[0]))
+  return ('Usage: %s -u <username> -p <password> [-s <server>] '
+          '[-c <concurrency>] [-n <connections>]\n'
+          '       [-k <checkpoint file>] [-d <sync state file>]\n'
+          '       [-r <record dir> | -R <replay dir>]\n'
+          '       %s -m <manifest> -o <output dir> [-a <accounts at once>]\n'
+          '       [-l <requests per server>] [-c <concurrency>] '
+          '[-n <connections>]\n'
+          '       [-r <record dir> | -R <replay dir>]\n\n'
+          ' Outputs the converted Blogger export file to standard out.  With\n'
+          ' a manifest listing "username password [server]" per line, exports\n'
+          ' every account of the manifest to its own file instead.' %
+          (os.path.basename(sys.argv[0]), os.path.basename(sys.argv[0])))
 
 if __name__ == '__main__':
 
   # parse command line options
   try:
     opts, args = getopt.getopt(
-        sys.argv[1:], 'u:p:s:', ['username=', 'password=', 'server='])
+        sys.argv[1:], 'u:p:s:c:n:k:d:r:R:m:o:a:l:',
+        ['username=', 'password=', 'server=', 'concurrency=', 'connections=',
+         'checkpoint=', 'delta=', 'record=', 'replay=', 'manifest=',
+         'output-dir=', 'accounts=', 'server-limit='])
   except getopt.error, msg:
     print usage()
     sys.exit(2)
@@ -520,6 +1998,16 @@ if __name__ == '__main__':
   username = None
   password = None
   server = 'www.livejournal.com'
+  num_workers = 1
+  num_connections = None
+  checkpoint_file = None
+  sync_state_file = None
+  traffic_dir = None
+  replay = False
+  manifest_file = None
+  output_dir = None
+  num_accounts = 4
+  server_limit = 4
 
   # Process options
   for opt, arg in opts:
@@ -529,11 +2017,56 @@ if __name__ == '__main__':
       password = arg
     elif opt in ['-s', '--server']:
       server = arg
+    elif opt in ['-c', '--concurrency']:
+      num_workers = int(arg)
+    elif opt in ['-n', '--connections']:
+      num_connections = int(arg)
+    elif opt in ['-k', '--checkpoint']:
+      checkpoint_file = arg
+    elif opt in ['-d', '--delta']:
+      sync_state_file = arg
+    elif opt in ['-r', '--record']:
+      traffic_dir = arg
+      replay = False
+    elif opt in ['-R', '--replay']:
+      traffic_dir = arg
+      replay = True
+    elif opt in ['-m', '--manifest']:
+      manifest_file = arg
+    elif opt in ['-o', '--output-dir']:
+      output_dir = arg
+    elif opt in ['-a', '--accounts']:
+      num_accounts = int(arg)
+    elif opt in ['-l', '--server-limit']:
+      server_limit = int(arg)
+
+  if manifest_file and output_dir:
+    # Perform the bulk export
+    accounts = ReadManifest(open(manifest_file), server)
+    exporter = BulkExporter(output_dir, num_accounts, num_workers,
+                            server_limit, num_connections, traffic_dir, replay)
+    start_time = time.time()
+    num_accounts = 0
+    num_failed = 0
+    for report in exporter.Export(accounts):
+      print >> sys.stderr, FormatReport(report)
+      num_accounts += 1
+      if report['error'] is not None:
+        num_failed += 1
+    print >> sys.stderr, 'Exported %d accounts in %.1f s, %d failed' % (
+        num_accounts, time.time() - start_time, num_failed)
+    for server_name, rate_controller in exporter.rate_controllers.items():
+      print >> sys.stderr, '%s: %s' % (server_name, rate_controller.Report())
+    sys.exit(num_failed and 1 or 0)
 
   if not username or not password:
     print usage()
     sys.exit(-1)
 
   # Perform the translation
-  translator = LiveJournal2Blogger(username, password, server)
+  translator = LiveJournal2Blogger(username, password, server, num_workers,
+                                   num_connections, checkpoint_file,
+                                   sync_state_file, traffic_dir=traffic_dir,
+                                   replay=replay)
   translator.Translate(sys.stdout)
+  print >> sys.stderr, translator.rate_controller.Report()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+# Copyright 2008 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures the throughput of lj2b against a local stand-in server.
+
+A synthetic journal is served by fakelivejournal with the given latency and
+error rate, and exported with increasing numbers of workers.  Requires
+Python 2.6 or later.
+"""
+
+import getopt
+import os.path
+import sys
+import time
+
+import fakelivejournal
+import lj2b
+
+__author__ = 'JJ Lueck (jlueck@gmail.com)'
+
+# The statistics of the server that are not request counts
+NON_REQUEST_STATS = ['errors', 'throttled', 'compressed', 'bytes', 'peak']
+
+
+class NullFile(object):
+  """Discards what is written to it, counting the bytes."""
+
+  def __init__(self):
+    self.size = 0
+
+  def write(self, data):
+    self.size += len(data)
+
+
+def MeasureExport(journal, num_workers, **server_options):
+  """Exports the journal from a new server with the given options.
+
+  Returns:
+    A tuple of the seconds the export took, the bytes it wrote and the
+    statistics of the server.
+  """
+  server = fakelivejournal.FakeLiveJournalServer(journal, **server_options)
+  server.Start()
+  try:
+    translator = lj2b.LiveJournal2Blogger(journal.username, journal.password,
+                                          server.GetHost(), num_workers)
+    output_file = NullFile()
+    start_time = time.time()
+    translator.Translate(output_file)
+    return time.time() - start_time, output_file.size, server.stats
+  finally:
+    server.Stop()
+
+
+def main(num_posts, num_comments, worker_counts, server_options):
+  journal = fakelivejournal.SyntheticJournal(num_posts=num_posts,
+                                             num_comments=num_comments)
+  print 'Exporting %d posts and %d comments, server options %s' % (
+      num_posts, num_comments, server_options)
+  print '%8s %10s %10s %10s %10s %8s %10s %10s' % (
+      'workers', 'seconds', 'requests', 'req/s', 'entries/s', 'errors',
+      'throttled', 'KB sent')
+  num_entries = num_posts + num_comments
+  for num_workers in worker_counts:
+    seconds, size, stats = MeasureExport(journal, num_workers,
+                                         **server_options)
+    num_requests = sum([count for name, count in stats.items()
+                        if name not in NON_REQUEST_STATS and
+                        not name.startswith('multicall.')])
+    print '%8d %10.2f %10d %10.1f %10.1f %8d %10d %10d' % (
+        num_workers, seconds, num_requests, num_requests / seconds,
+        num_entries / seconds, stats.get('errors', 0),
+        stats.get('throttled', 0), stats.get('bytes', 0) / 1024)
+
+
+def usage():
+  return ('Usage: %s [--posts <count>] [--comments <count>]\n'
+          '       [--workers <count,count,...>] [--latency <seconds>]\n'
+          '       [--error-rate <fraction>] [--max-concurrent <requests>]\n'
+          '       [--compress]' %
+          os.path.basename(sys.argv[0]))
+
+if __name__ == '__main__':
+
+  # parse command line options
+  try:
+    opts, args = getopt.getopt(
+        sys.argv[1:], '',
+        ['posts=', 'comments=', 'workers=', 'latency=', 'error-rate=',
+         'max-concurrent=', 'compress'])
+  except getopt.error, msg:
+    print usage()
+    sys.exit(2)
+
+  num_posts = 1000
+  num_comments = 10000
+  worker_counts = [1, 2, 4, 8]
+  server_options = {'latency': 0.05}
+  for opt, arg in opts:
+    if opt == '--posts':
+      num_posts = int(arg)
+    elif opt == '--comments':
+      num_comments = int(arg)
+    elif opt == '--workers':
+      worker_counts = [int(count) for count in arg.split(',')]
+    elif opt == '--latency':
+      server_options['latency'] = float(arg)
+    elif opt == '--error-rate':
+      server_options['error_rate'] = float(arg)
+    elif opt == '--max-concurrent':
+      server_options['max_concurrent'] = int(arg)
+    elif opt == '--compress':
+      server_options['compress'] = True
+
+  main(num_posts, num_comments, worker_counts, server_options)
@@ -0,0 +1,416 @@
+#!/usr/bin/env python
+
+# Copyright 2008 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0.txt
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gc
+import os
+import shutil
+import StringIO
+import tempfile
+import threading
+import time
+import unittest
+import xmlrpclib
+import xml.dom.minidom
+
+import fakelivejournal
+import lj2b
+
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+
+class TestUserMap(unittest.TestCase):
+
+  def page(self, comments):
+    """Returns a comment_meta page of (comment ID, poster ID) pairs."""
+    lines = ['<livejournal><comments>']
+    for comment_id, poster_id in comments:
+      if poster_id:
+        lines.append('<comment id="%d" posterid="%d"/>' %
+                     (comment_id, poster_id))
+      else:
+        lines.append('<comment id="%d"/>' % comment_id)
+    lines.append('</comments><usermaps>')
+    lines.append('<usermap id="1" user="alice"/>')
+    lines.append('<usermap id="2" user="bob"/>')
+    lines.append('</usermaps></livejournal>')
+    return lj2b.CommentPage(''.join(lines))
+
+  def testGetUser(self):
+    user_map = lj2b.UserMap()
+    user_map.Add(self.page([(5, 1), (6, 2), (7, None), (10, 1)]))
+    user_map.Add(self.page([(3, 2), (12, 2)]))
+    self.assertEquals('bob', user_map.GetUser('3'))
+    self.assertEquals('alice', user_map.GetUser('5'))
+    self.assertEquals('bob', user_map.GetUser('6'))
+    self.assertEquals('Anonymous', user_map.GetUser('7'))
+    self.assertEquals('alice', user_map.GetUser('10'))
+    self.assertEquals('bob', user_map.GetUser('12'))
+    for comment_id in ['1', '4', '8', '13']:
+      self.assertEquals(None, user_map.GetUser(comment_id))
+    self.assertEquals(12, user_map.GetLargestId())
+    # Each name is kept once
+    self.assertEquals(3, len(user_map.names))
+
+
+class TestResponseParser(unittest.TestCase):
+
+  def testLazyBinary(self):
+    event = {'itemid': 1, 'event': xmlrpclib.Binary('caf\xc3\xa9 ' * 1000),
+             'props': {'taglist': 'a, b'}}
+    data = xmlrpclib.dumps(({'events': [event]},), methodresponse=True)
+    parser, unmarshaller = lj2b.GetResponseParser()
+    # Feed the response in small pieces, as if read from a slow connection
+    for start in range(0, len(data), 100):
+      parser.feed(data[start:start + 100])
+    parser.close()
+    parsed = unmarshaller.close()[0]['events'][0]
+
+    self.assert_(isinstance(parsed['event'], xmlrpclib.Binary))
+    self.failIf(parsed['event'].__dict__.has_key('data'))
+    self.assertEquals(event['event'].data, parsed['event'].data)
+    self.assertEquals(event['props'], parsed['props'])
+
+  def testFault(self):
+    data = xmlrpclib.dumps(xmlrpclib.Fault(101, 'Invalid password'),
+                           methodresponse=True)
+    parser, unmarshaller = lj2b.GetResponseParser()
+    parser.feed(data)
+    parser.close()
+    self.assertRaises(xmlrpclib.Fault, unmarshaller.close)
+
+
+class TestRateController(unittest.TestCase):
+
+  def testTooManyFailures(self):
+    def Fail():
+      raise IOError('Connection refused')
+    initial_backoff = lj2b.INITIAL_BACKOFF
+    lj2b.INITIAL_BACKOFF = 0
+    try:
+      controller = lj2b.RateController(1)
+      try:
+        controller.Call('Fail', Fail)
+        self.fail('Expected TooManyFailures')
+      except lj2b.TooManyFailures, e:
+        self.assert_(isinstance(e.error, IOError))
+        self.assert_('Connection refused' in str(e))
+      self.assertEquals(lj2b.MAX_FAILURES, controller.num_failures)
+    finally:
+      lj2b.INITIAL_BACKOFF = initial_backoff
+
+
+class TestLiveJournal2Blogger(unittest.TestCase):
+
+  def setUp(self):
+    self.journal = fakelivejournal.SyntheticJournal(num_posts=250,
+                                                    num_comments=2500)
+    self.server = None
+    self.temp_files = []
+
+  def tearDown(self):
+    if self.server:
+      self.server.Stop()
+    for filename in self.temp_files:
+      if os.path.isdir(filename):
+        shutil.rmtree(filename)
+      elif os.path.exists(filename):
+        os.remove(filename)
+
+  def startServer(self, **kwargs):
+    self.server = fakelivejournal.FakeLiveJournalServer(self.journal, **kwargs)
+    self.server.Start()
+
+  def tempFile(self):
+    handle, filename = tempfile.mkstemp()
+    os.close(handle)
+    os.remove(filename)
+    self.temp_files.append(filename)
+    return filename
+
+  def tempDir(self):
+    directory = tempfile.mkdtemp()
+    self.temp_files.append(directory)
+    return directory
+
+  def translate(self, password=None, **kwargs):
+    """Translates the journal, returning the (ID, author) pairs of the
+    entries of the export.
+    """
+    translator = lj2b.LiveJournal2Blogger(
+        self.journal.username, password or self.journal.password,
+        self.server.GetHost(), **kwargs)
+    output_file = StringIO.StringIO()
+    translator.Translate(output_file)
+    return self.parseEntries(output_file.getvalue())
+
+  def parseEntries(self, document):
+    """Returns the (ID, author) pairs of the entries of an export."""
+    output_dom = xml.dom.minidom.parseString(document)
+    entries = []
+    for entry in output_dom.getElementsByTagNameNS(ATOM_NS, 'entry'):
+      entry_id = entry.getElementsByTagNameNS(ATOM_NS, 'id')[0]
+      author = entry.getElementsByTagNameNS(ATOM_NS, 'name')[0]
+      entries.append((entry_id.firstChild.nodeValue,
+                      author.firstChild.nodeValue))
+    return entries
+
+  def expectedEntries(self, item_ids=None, first_comment_id=1):
+    """Returns the (ID, author) pairs the export of the journal should have.
+
+    Args:
+      item_ids: The IDs of the exported entries, in the order of their
+          last change.  Defaults to all entries.
+      first_comment_id: The ID of the first exported comment.
+    """
+    if item_ids is None:
+      item_ids = self.journal.sync_times.keys()
+      item_ids.sort(lambda a, b: cmp(self.journal.sync_times[a],
+                                     self.journal.sync_times[b]))
+    entries = []
+    for item_id in item_ids:
+      if self.journal.events[item_id]:
+        entries.append(('post-%d' % item_id, self.journal.username))
+    for comment in self.journal.comments[first_comment_id - 1:]:
+      if comment['state'] != 'D':
+        author = self.journal.users.get(comment['posterid'], 'Anonymous')
+        entries.append(('comment-%d' % comment['id'], author))
+    return entries
+
+  def testTranslate(self):
+    self.startServer()
+    self.assertEquals(self.expectedEntries(), self.translate())
+    # A single session serves all requests
+    self.assertEquals(1, self.server.stats['flat.sessiongenerate'])
+
+  def testStreamedOutput(self):
+    self.startServer()
+    server = self.server
+    class RecordingFile(StringIO.StringIO):
+      """Records the number of events fetched before each write."""
+      def __init__(self):
+        StringIO.StringIO.__init__(self)
+        self.fetched = []
+      def write(self, data):
+        self.fetched.append(server.stats.get('LJ.XMLRPC.getevents', 0))
+        StringIO.StringIO.write(self, data)
+    translator = lj2b.LiveJournal2Blogger(
+        self.journal.username, self.journal.password, self.server.GetHost())
+    output_file = RecordingFile()
+    translator.Translate(output_file)
+    # The feed header is written before any event is fetched, and each
+    # entry on its own
+    self.assertEquals(0, output_file.fetched[0])
+    self.assertEquals(len(self.expectedEntries()) + 2,
+                      len(output_file.fetched))
+    xml.dom.minidom.parseString(output_file.getvalue())
+
+  def testAbortedTranslate(self):
+    # Enough batches of posts for the workers to get ahead of the export
+    self.journal = fakelivejournal.SyntheticJournal(num_posts=1000,
+                                                    num_comments=10)
+    self.startServer()
+    num_threads = threading.activeCount()
+
+    class FailingFile(StringIO.StringIO):
+      """Fails to write the first entry of the export."""
+
+      def write(self, data):
+        if self.tell():
+          raise IOError('Disk full')
+        StringIO.StringIO.write(self, data)
+
+    for i in range(5):
+      translator = lj2b.LiveJournal2Blogger(
+          self.journal.username, self.journal.password, self.server.GetHost(),
+          num_workers=2)
+      self.assertRaises(IOError, translator.Translate, FailingFile())
+    # No worker thread was left waiting for the export to go on.  The
+    # server threads serving the connections of the translators end once
+    # the connections are closed along with the translators.
+    del translator
+    gc.collect()
+    deadline = time.time() + 10
+    while threading.activeCount() > num_threads and time.time() < deadline:
+      time.sleep(0.1)
+    self.assertEquals(num_threads, threading.activeCount())
+
+  def testConcurrentTranslate(self):
+    self.startServer(latency=0.005)
+    self.assertEquals(self.expectedEntries(), self.translate(num_workers=4))
+    self.assert_(self.server.stats['peak'] > 1)
+
+  def testCompressedTransfer(self):
+    self.startServer(compress=True)
+    self.assertEquals(self.expectedEntries(), self.translate(num_workers=2))
+    self.assert_(self.server.stats['compressed'] > 0)
+
+  def testMulticall(self):
+    self.startServer()
+    translator = lj2b.LiveJournal2Blogger(
+        self.journal.username, self.journal.password, self.server.GetHost())
+    # Sync times after the last change leave the items out of the getevents
+    # responses for sync items, so that they are asked for one by one
+    sync_items = [(item_id, '2099-01-01 00:00:00') for item_id in range(1, 31)]
+    events = translator._GetEvents(sync_items)
+    self.assertEquals([item_id for item_id in range(1, 31)
+                       if self.journal.events[item_id]],
+                      [event['itemid'] for event in events])
+    self.assertEquals(1, self.server.stats['system.multicall'])
+    self.assertEquals(1, self.server.stats['LJ.XMLRPC.getevents'])
+    self.assertEquals(30, self.server.stats['multicall.LJ.XMLRPC.getevents'])
+
+  def testMulticallFallback(self):
+    self.startServer(multicall=False)
+    translator = lj2b.LiveJournal2Blogger(
+        self.journal.username, self.journal.password, self.server.GetHost())
+    sync_items = [(item_id, '2099-01-01 00:00:00') for item_id in range(1, 31)]
+    self.assertEquals(27, len(translator._GetEvents(sync_items)))
+    self.assertEquals(1, self.server.stats['system.multicall'])
+    self.assertEquals(31, self.server.stats['LJ.XMLRPC.getevents'])
+    self.failIf(translator.use_multicall)
+
+  def testRecordAndReplay(self):
+    self.startServer(compress=True)
+    traffic_dir = self.tempDir()
+    expected_entries = self.expectedEntries()
+    self.assertEquals(expected_entries,
+                      self.translate(num_workers=2, traffic_dir=traffic_dir))
+
+    # Replay without the server, under the same host name, and with changes
+    # to the journal the replay does not see
+    self.server.Stop()
+    self.journal.AddPosts(5)
+    self.assertEquals(expected_entries,
+                      self.translate(num_workers=2, traffic_dir=traffic_dir,
+                                     replay=True))
+    self.server = None
+
+  def testReplayMiss(self):
+    self.startServer()
+    traffic_dir = self.tempDir()
+    open(os.path.join(traffic_dir, 'index'), 'w').close()
+    self.assertRaises(lj2b.ReplayMiss, self.translate,
+                      traffic_dir=traffic_dir, replay=True)
+
+  def testBulkExport(self):
+    self.startServer()
+    other_journal = fakelivejournal.SyntheticJournal(
+        username='otheruser', password='otherpassword', num_posts=20,
+        num_comments=100)
+    other_server = fakelivejournal.FakeLiveJournalServer(other_journal)
+    other_server.Start()
+    try:
+      manifest = StringIO.StringIO(
+          '# Accounts to export\n'
+          'otheruser otherpassword %s\n'
+          'testuser wrongpassword %s\n'
+          '\n'
+          'testuser testpassword\n' % (other_server.GetHost(),
+                                        other_server.GetHost()))
+      accounts = lj2b.ReadManifest(manifest, self.server.GetHost())
+      self.assertEquals(3, len(accounts))
+      output_dir = self.tempDir()
+      exporter = lj2b.BulkExporter(output_dir, num_accounts=3, num_workers=2,
+                                   server_limit=3)
+      reports = list(exporter.Export(accounts))
+
+      # The accounts alternate between the servers as they are exported, but
+      # are reported in the order of the manifest
+      self.assertEquals(['otheruser', 'testuser', 'testuser'],
+                        [report['username'] for report in reports])
+      self.assertEquals(None, reports[0]['error'])
+      self.assert_(reports[1]['error'])
+      self.assertEquals(None, reports[2]['error'])
+      self.assertEquals(self.expectedEntries(), self.parseEntries(
+          open(reports[2]['filename']).read()))
+      self.assertEquals(len(self.expectedEntries()), reports[2]['entries'])
+      other_entries = self.parseEntries(open(reports[0]['filename']).read())
+      self.assertEquals(reports[0]['entries'], len(other_entries))
+      self.failIf(os.path.exists(reports[1]['filename']))
+
+      # Exported accounts are skipped when the export is run again
+      reports = list(exporter.Export(accounts))
+      self.assertEquals([True, False, True],
+                        [report['skipped'] for report in reports])
+    finally:
+      other_server.Stop()
+
+  def testInjectedErrors(self):
+    self.startServer(error_rate=0.3)
+    self.assertEquals(self.expectedEntries(), self.translate(num_workers=2))
+    self.assert_(self.server.stats['errors'] > 0)
+
+  def testThrottling(self):
+    self.startServer(latency=0.005, max_concurrent=2)
+    translator = lj2b.LiveJournal2Blogger(
+        self.journal.username, self.journal.password, self.server.GetHost(),
+        num_workers=6)
+    translator.Translate(StringIO.StringIO())
+    # The concurrency limit was lowered below the number of workers
+    self.assert_(translator.rate_controller.min_limit < 6)
+
+  def testWrongPassword(self):
+    self.startServer()
+    self.assertRaises(xmlrpclib.Fault, self.translate, password='wrong')
+
+  def testExpiredSession(self):
+    self.startServer()
+    translator = lj2b.LiveJournal2Blogger(
+        self.journal.username, self.journal.password, self.server.GetHost())
+    list(translator._GetPosts())
+    self.server.ExpireSessions()
+    list(translator._GetPosts())
+    list(translator._GetComments())
+    self.assertEquals(2, self.server.stats['flat.sessiongenerate'])
+
+  def testResumeFromCheckpoint(self):
+    self.startServer()
+    checkpoint_file = self.tempFile()
+
+    # Fail the first export once the posts are fetched
+    translator = lj2b.LiveJournal2Blogger(
+        self.journal.username, self.journal.password, self.server.GetHost(),
+        checkpoint_file=checkpoint_file)
+    def FailingGetComments():
+      raise IOError('Connection lost')
+    translator._GetComments = FailingGetComments
+    self.assertRaises(IOError, translator.Translate, StringIO.StringIO())
+    num_getevents = self.server.stats['LJ.XMLRPC.getevents']
+
+    self.assertEquals(self.expectedEntries(),
+                      self.translate(checkpoint_file=checkpoint_file))
+    self.assertEquals(num_getevents, self.server.stats['LJ.XMLRPC.getevents'])
+    self.failIf(os.path.exists(checkpoint_file))
+
+  def testDeltaExport(self):
+    self.startServer()
+    sync_state_file = self.tempFile()
+    self.assertEquals(self.expectedEntries(),
+                      self.translate(sync_state_file=sync_state_file))
+
+    first_comment_id = self.journal.GetMaxCommentId() + 1
+    self.journal.EditPost(1)
+    self.journal.AddPosts(5)
+    self.journal.AddComments(30)
+    self.assertEquals(
+        self.expectedEntries([1, 251, 252, 253, 254, 255], first_comment_id),
+        self.translate(sync_state_file=sync_state_file))
+
+    # Nothing changed since
+    self.assertEquals([], self.translate(sync_state_file=sync_state_file))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -36,13 +36,15 @@ class TransformPage(webapp.RequestHandler):
     # All input/output will be in UTF-8
     self.response.charset = 'utf8'
 
-    # Parse the mulit-part form-data part out of the POST
-    input = self.request.get('input-file', allow_multiple=False)
+    # The form parser spools the uploaded file to a temporary file, so hand
+    # that to the translator rather than reading the export into a string
+    input = self.request.POST.get('input-file')
+    input = getattr(input, 'file', None) or StringIO.StringIO(input or '')
 
     # Run the blogger import processor
     translator = mt2b.MovableType2Blogger()
     try:
-      translator.Translate(StringIO.StringIO(input), self.response.out)
+      translator.Translate(input, self.response.out)
       self.response.content_type = 'application/atom+xml'
       self.response.headers['Content-Disposition'] = \
           'attachment;filename=blogger-export.xml'
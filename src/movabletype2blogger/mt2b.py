@@ -86,6 +86,7 @@ class MovableType2Blogger(object):
 
   def __init__(self):
     self.next_id = 1
+    self.num_entries = 0
   
   def Translate(self, infile, outfile):
     """Performs the actual translation to a Blogger export format.
@@ -131,6 +132,7 @@ class MovableType2Blogger(object):
         # Add the post to our feed
         feed.entry.insert(0, post_entry)
         last_entry = post_entry
+        self.num_entries += 1
 
         # Reset the state variables
         post_entry = self._GetNewEntry(POST_KIND)
@@ -155,6 +157,7 @@ class MovableType2Blogger(object):
             text=self._Encode(self._CreateSnippet(tag_contents)))
           comment_entry.extension_elements.append(InReplyTo(post_entry.id.text))
           feed.entry.append(comment_entry)
+          self.num_entries += 1
           comment_entry = None
 
         # Get the contents of the extended body and append it to the
@@ -15,6 +15,7 @@
 # limitations under the License.
 
 import cgi
+import StringIO
 import gdata.service
 import gdata.urlfetch
 from google.appengine.ext import webapp
@@ -34,8 +35,10 @@ class TransformPage(webapp.RequestHandler):
     # All input/output will be in UTF-8
     self.response.charset = 'utf8'
 
-    # Parse the mulit-part form-data part out of the POST
-    input = self.request.get('input-file', allow_multiple=False)
+    # The form parser spools the uploaded file to a temporary file, so hand
+    # that to the translator rather than reading the export into a string
+    input = self.request.POST.get('input-file')
+    input = getattr(input, 'file', None) or StringIO.StringIO(input or '')
 
     # Run the blogger import processor
     translator = wp2b.Wordpress2Blogger()
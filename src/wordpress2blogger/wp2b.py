@@ -17,6 +17,7 @@
 import os.path
 import logging
 import re
+import StringIO
 import sys
 import time
 import urlparse
@@ -48,6 +49,9 @@ ATOM_THREADING_NS = 'http://purl.org/syndication/thread/1.0'
 
 META_DATA_RE = re.compile('<wp:postmeta>.*?</wp:postmeta>', 
                           re.DOTALL | re.MULTILINE)
+META_DATA_START = '<wp:postmeta>'
+# The bytes read from the WXR file at a time
+READ_SIZE = 64 * 1024
 
 WP_YOUTUBE_RE = re.compile('\[youtube=http://www.youtube.com/watch\?v=([^\]]+)\]')
 EMBED_YOUTUBE_FMT = \
@@ -115,6 +119,44 @@ class InReplyTo(atom.ExtensionElement):
     atom.ExtensionElement.__init__(self, 'in-reply-to',
                                    namespace=ATOM_THREADING_NS,
                                    attributes=attrs)
+###########################
+# Helper file class
+###########################
+
+class MetaDataFilter(object):
+  """Reads a WXR file with its <wp:postmeta> elements removed, a chunk at a
+  time, as META_DATA_RE would remove them from the whole document.
+  """
+
+  def __init__(self, infile):
+    self.infile = infile
+    self.pending = ''
+
+  def read(self, size=-1):
+    while True:
+      data = self.infile.read(READ_SIZE)
+      pending = META_DATA_RE.sub('', self.pending + data)
+      if not data:
+        self.pending = ''
+        return pending
+
+      # Hold back an element that has not ended yet, or the start of the
+      # tag opening one
+      end = pending.find(META_DATA_START)
+      if end < 0:
+        end = pending.find('<', max(len(pending) - len(META_DATA_START), 0))
+      if end < 0:
+        end = len(pending)
+      self.pending = pending[end:]
+      if end:
+        return pending[:end]
+
+  def close(self):
+    # The parser closes its input when done, but the file is the caller's
+    # and is read again to report errors
+    pass
+
+
 ###########################
 # Translation class
 ###########################
@@ -125,13 +167,13 @@ class Wordpress2Blogger(xml.sax.handler.ContentHandler):
 
   def __init__(self):
     """Constructs a translator for a wordpress WXR file."""
-    pass
+    self.num_entries = 0
 
   def Translate(self, doc, outfile):
     """Performs the actual translation to a Blogger export format.
 
     Args:
-      doc: The input WXR file as a string
+      doc: The input WXR file, as a file object or as a string
       outfile: The output file that should receive the translated document
     Returns:
       A Blogger export Atom document as a string, or None on error.
@@ -146,8 +188,11 @@ class Wordpress2Blogger(xml.sax.handler.ContentHandler):
     self.is_page = False
     self.categories = set()
     self.comments = []
+    self.num_entries = 0
+    if isinstance(doc, str):
+      doc = StringIO.StringIO(doc)
     try:
-      xml.sax.parseString(self.RemoveMetaData(doc), self)
+      xml.sax.parse(MetaDataFilter(doc), self)
     except xml.sax.SAXParseException, e:
       error_string = self.GetSaxErrorString(doc, e.getLineNumber(), e.getColumnNumber(), ON_GAE)
       if ON_GAE:
@@ -155,9 +200,6 @@ class Wordpress2Blogger(xml.sax.handler.ContentHandler):
       else:
         print error_string
 
-  def RemoveMetaData(self, doc):
-    return META_DATA_RE.sub('', doc)
-
   def GetParentElem(self):
     if self.elem_stack:
       return self.elem_stack[0]
@@ -237,6 +279,7 @@ class Wordpress2Blogger(xml.sax.handler.ContentHandler):
       # Add the comments for this post
       for comment in self.comments:
         self.feed.entry.append(comment)
+      self.num_entries += 1 + len(self.comments)
 
     # Clear the state of the handler to take the next item
     self.categories = set()
@@ -451,8 +494,13 @@ class Wordpress2Blogger(xml.sax.handler.ContentHandler):
     return result.string
 
   def GetSaxErrorString(self, doc, line_num, column_num, html_escape):
-    lines = doc.splitlines()
-    bad_line = lines[line_num - 1]
+    # Read the input again up to the offending line
+    doc.seek(0)
+    bad_line = ''
+    for index, line in enumerate(doc):
+      if index == line_num - 1:
+        bad_line = line.rstrip('\r\n')
+        break
     if len(bad_line) > 60:
       start_column = max(column_num - 30, 0)
       end_column = start_column + 60
@@ -533,7 +581,6 @@ if __name__ == '__main__':
     sys.exit(-1)
     
   wp_xml_file = open(sys.argv[1])
-  wp_xml_doc = wp_xml_file.read()
   translator = Wordpress2Blogger()
-  translator.Translate(wp_xml_doc, sys.stdout)
+  translator.Translate(wp_xml_file, sys.stdout)
   wp_xml_file.close()
@@ -46,6 +46,23 @@ class TestWordpress2Blogger(unittest.TestCase):
                         'Documents differ at line %d: "%s" != "%s"' %
                         (line_num + 1, expected, output))
 
+  def testMetaDataFilter(self):
+    doc = ('<item><wp:postmeta><wp:meta_key>a</wp:meta_key></wp:postmeta>'
+           '<title>b</title><wp:postmeta></wp:postmeta></item>')
+    original_read_size = wp2b.READ_SIZE
+    try:
+      for read_size in [1, 5, 13, len(doc)]:
+        wp2b.READ_SIZE = read_size
+        infile = wp2b.MetaDataFilter(StringIO.StringIO(doc))
+        chunks = []
+        chunk = infile.read()
+        while chunk:
+          chunks.append(chunk)
+          chunk = infile.read()
+        self.assertEquals(wp2b.META_DATA_RE.sub('', doc), ''.join(chunks))
+    finally:
+      wp2b.READ_SIZE = original_read_size
+
   def testFullInputOutput(self):
     for i in xrange(len(self.golden_files)):
       expected_file = open(self.golden_files[i])